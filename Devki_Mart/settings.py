@@ -51,11 +51,13 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # ✅ Must stay above session middleware
+    'store.query_budget.QueryBudgetMiddleware',    # no-op unless QUERY_BUDGET_ENABLED
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'store.middleware.AnonymousCartMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -76,6 +78,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'store.context_processors.business_details',  # Custom context processor
+                'store.context_processors.badge_counts',
             ],
         },
     },
@@ -97,6 +100,38 @@ else:
         'default': dj_database_url.parse(DATABASE_URL, conn_max_age=600, ssl_require=True)
     }
 
+# -----------------------------
+# CACHE (shared across gunicorn workers)
+# Live order streams (SSE, store/order_feed.py) are only served with
+# Redis; on the database cache the pages fall back to 30 s polling.
+# -----------------------------
+REDIS_URL = config("REDIS_URL", default="")
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    # table created by migration store.0013
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'store_cache',
+        }
+    }
+
+# How often a worker re-checks the site settings version key
+SITE_SETTINGS_RECHECK_SECONDS = 30
+
+# Max age of the cached cart / wishlist badge counts (store/badges.py)
+BADGE_COUNTS_TTL = 300
+
+# Logged-out cart cookie lifetime (store/anon_cart.py)
+ANON_CART_COOKIE_AGE = 60 * 60 * 24 * 30
+
 # -----------------------------
 # PASSWORD VALIDATION
 # -----------------------------
@@ -169,6 +204,42 @@ DELIVERY_VERIFY_CODE = config("DELIVERY_VERIFY_CODE")
 # razorpay config
 RAZORPAY_KEY_ID = config("RAZORPAY_KEY_ID_LIVE")
 RAZORPAY_KEY_SECRET = config("RAZORPAY_KEY_SECRET_LIVE")
+RAZORPAY_WEBHOOK_SECRET = config("RAZORPAY_WEBHOOK_SECRET", default="")
+
+# Refund queue (manage.py process_refunds). RAZORPAY_FAKE swaps in the
+# in-memory stand-in from store/razorpay_fake.py for local testing.
+RAZORPAY_FAKE = config("RAZORPAY_FAKE", default=False, cast=bool)
+REFUND_CONCURRENCY = config("REFUND_CONCURRENCY", default=4, cast=int)
+REFUND_MAX_ATTEMPTS = 6
+
+# Assign new orders to delivery staff by zone + open-order load (store/assignment.py)
+AUTO_ASSIGN_ORDERS = config("AUTO_ASSIGN_ORDERS", default=True, cast=bool)
+
+# Timeouts / retries / circuit breaker per provider (store/external.py).
+# timeout_kwarg is the SDK's per-call timeout argument.
+EXTERNAL_SERVICES = {
+    "razorpay": {"connect_timeout": 3, "read_timeout": 10, "retries": 2, "timeout_kwarg": "timeout"},
+    "brevo": {"connect_timeout": 3, "read_timeout": 5, "retries": 1, "timeout_kwarg": "_request_timeout"},
+    # urllib3 takes a single number here; uploads carry the whole image
+    "cloudinary": {"read_timeout": 30, "retries": 1, "timeout_kwarg": "timeout", "timeout_as_tuple": False},
+}
+# Bearer token for /metrics/ (staff users can always read it)
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+
+# Emailed OTPs (store/otp.py). OTP_TRUSTED_PROXIES = proxies in front of
+# gunicorn that append to X-Forwarded-For (1 on Heroku / behind nginx).
+OTP_TTL = 10 * 60
+OTP_MAX_ATTEMPTS = 5
+OTP_RESEND_SECONDS = 60
+OTP_EMAIL_PER_HOUR = 5
+OTP_IP_PER_HOUR = 20
+OTP_TRUSTED_PROXIES = config("OTP_TRUSTED_PROXIES", default=0, cast=int)
+
+# Per-request query counting (store/query_budget.py); stats at /metrics/queries/
+QUERY_BUDGET_ENABLED = config("QUERY_BUDGET_ENABLED", default=False, cast=bool)
+QUERY_BUDGET = 30                  # queries per request before it is reported
+QUERY_BUDGET_MS = 500              # DB time per request before it is reported
+QUERY_BUDGET_VIEWS = {}            # {"url name": budget} overrides
 
 
 # -----------------------------
@@ -181,6 +252,8 @@ RAZORPAY_KEY_SECRET = config("RAZORPAY_KEY_SECRET_LIVE")
 SESSION_COOKIE_AGE = 15 * 24 * 60 * 60     # 15 days in seconds
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False    # Do NOT expire when the browser closes
 SESSION_COOKIE_SECURE = False              # True if using HTTPS
-SESSION_SAVE_EVERY_REQUEST = True          # Refresh expiry every new request
+SESSION_SAVE_EVERY_REQUEST = False         # only changed sessions are written (store/session_store.py)
+SESSION_ENGINE = "store.session_store"     # shared cache + django_session write-through
+SESSION_REFRESH_WITHIN = 7 * 24 * 60 * 60  # re-save (slide expiry) once less than this is left
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_SAMESITE = 'Lax'
@@ -13,10 +13,15 @@ from .models import (
     WishlistItem,
     Order,
     OrderItem,
+    OrderStatusEvent,
     Review,
     CustomUser,
     DeliveryProfile,
     BusinessNameAndLogo,
+    PendingPayment,
+    OrderDailyStats,
+    ServiceArea,
+    RefundRequest,
 )
 
 # ======================================================
@@ -157,12 +162,24 @@ class OrderItemInline(admin.TabularInline):
     readonly_fields = ("product", "variant", "quantity", "price")
 
 
+class OrderStatusEventInline(admin.TabularInline):
+    model = OrderStatusEvent
+    extra = 0
+    can_delete = False
+    fields = ("created_at", "from_status", "to_status", "source", "changed_by")
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 # ======================================================
 # ORDER ADMIN
 # ======================================================
 
 # inside admin.py
 from store.email_service import send_brevo_email
+from store import order_feed
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
@@ -173,7 +190,14 @@ class OrderAdmin(admin.ModelAdmin):
     list_filter = ("order_status", "paid", "payment_method", "created_at")
     search_fields = ("full_name", "user__username", "user__email", "id")
     readonly_fields = ("created_at",)
-    inlines = [OrderItemInline]
+    inlines = [OrderItemInline, OrderStatusEventInline]
+    actions = ["auto_assign"]
+
+    @admin.action(description="Auto-assign selected unassigned orders")
+    def auto_assign(self, request, queryset):
+        from store import assignment
+        assigned = assignment.assign_pending(order_ids=list(queryset.values_list("id", flat=True)))
+        self.message_user(request, f"{len(assigned)} order(s) assigned.")
 
     # Allow only delivery boys
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
@@ -235,6 +259,17 @@ class OrderAdmin(admin.ModelAdmin):
 
         super().save_model(request, obj, form, change)
 
+        if change and "assigned_to" in form.changed_data:
+            # both riders' dashboards changed (live feed)
+            order_feed.notify(obj.pk, obj.assigned_to_id, form.initial.get("assigned_to"))
+
+        # status history: admin edits bypass Order.set_status()
+        if change and "order_status" in form.changed_data:
+            OrderStatusEvent.log(
+                obj, form.initial.get("order_status"), obj.order_status,
+                by=request.user, source=OrderStatusEvent.SOURCE_DJANGO_ADMIN,
+            )
+
 
 # ======================================================
 # REVIEW ADMIN
@@ -264,7 +299,7 @@ class WishlistAdmin(admin.ModelAdmin):
 
 @admin.register(DeliveryProfile)
 class DeliveryProfileAdmin(admin.ModelAdmin):
-    list_display = ("user", "phone", "first_name", "last_name")
+    list_display = ("user", "phone", "first_name", "last_name", "zones")
     search_fields = ("user__username", "phone", "first_name", "last_name")
 
 
@@ -276,3 +311,58 @@ class DeliveryProfileAdmin(admin.ModelAdmin):
 class BusinessNameAndLogoAdmin(admin.ModelAdmin):
     list_display = ("business_name", "logo")
     search_fields = ("business_name",)
+
+
+# ======================================================
+# PENDING RAZORPAY PAYMENTS
+# ======================================================
+
+@admin.register(PendingPayment)
+class PendingPaymentAdmin(admin.ModelAdmin):
+    list_display = ("razorpay_order_id", "user", "amount", "status", "order", "created_at")
+    list_filter = ("status", "created_at")
+    search_fields = ("razorpay_order_id", "payment_id", "user__email")
+    readonly_fields = ("checkout_info", "line_items", "created_at", "updated_at")
+
+
+# ======================================================
+# DAILY SALES ROLLUP
+# ======================================================
+
+@admin.register(OrderDailyStats)
+class OrderDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ("date", "orders", "revenue", "items", "cancellations", "cod_orders", "prepaid_orders")
+    date_hierarchy = "date"
+
+
+# ======================================================
+# SERVICE AREAS (pincodes)
+# ======================================================
+
+@admin.register(ServiceArea)
+class ServiceAreaAdmin(admin.ModelAdmin):
+    list_display = ("pincode", "zone", "delivery_days", "cod_allowed", "fee", "is_active")
+    list_filter = ("zone", "cod_allowed", "is_active")
+    search_fields = ("pincode", "zone")
+    list_editable = ("delivery_days", "cod_allowed", "fee", "is_active")
+
+
+# ======================================================
+# REFUND QUEUE
+# ======================================================
+
+@admin.register(RefundRequest)
+class RefundRequestAdmin(admin.ModelAdmin):
+    list_display = ("order", "amount", "status", "attempts", "refund_id", "next_attempt_at", "updated_at")
+    list_filter = ("status",)
+    search_fields = ("order__id", "payment_id", "refund_id")
+    readonly_fields = ("order", "payment_id", "amount", "refund_id", "last_error", "created_at", "updated_at")
+    actions = ["retry_refunds"]
+
+    @admin.action(description="Retry selected failed refunds")
+    def retry_refunds(self, request, queryset):
+        from django.utils import timezone
+        updated = queryset.filter(status=RefundRequest.STATUS_FAILED).update(
+            status=RefundRequest.STATUS_PENDING, attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f"{updated} refund(s) queued again.")
@@ -0,0 +1,176 @@
+# store/anon_cart.py
+"""
+Cart for logged-out visitors, kept in a signed cookie.
+
+The cookie holds a compact list of [product_id, variant_id, quantity]
+entries - no session row and no CartItem rows are written for anonymous
+users. AnonymousCartMiddleware writes the cookie back when it changed and,
+once the visitor logs in, merges it into CartItem with a handful of bulk
+queries (see merge_into_user).
+
+Line ids shown to the template are 1-based positions in the cookie list.
+"""
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.db.models import F
+
+from store.models import CartItem, Product, ProductVariant
+
+COOKIE_NAME = "anon_cart"
+COOKIE_SALT = "store.anon_cart"
+MAX_LINES = 50                      # keeps the cookie well under 4 KB
+MAX_QUANTITY = 99
+
+
+class AnonymousCart:
+
+    def __init__(self, entries=None):
+        self.entries = entries or []
+        self.modified = False
+
+    # ---------------- reading ----------------
+    def __len__(self):
+        return len(self.entries)
+
+    def __bool__(self):
+        return bool(self.entries)
+
+    def lines(self):
+        """(line_id, product_id, variant_id, quantity) tuples."""
+        return [(i + 1, p, v, q) for i, (p, v, q) in enumerate(self.entries)]
+
+    def _find(self, product_id, variant_id):
+        for i, (p, v, _) in enumerate(self.entries):
+            if p == product_id and v == variant_id:
+                return i
+        return None
+
+    # ---------------- writing ----------------
+    def add(self, product_id, variant_id=None, quantity=1):
+        i = self._find(product_id, variant_id)
+        if i is None:
+            if len(self.entries) >= MAX_LINES:
+                return False
+            self.entries.append([product_id, variant_id, min(quantity, MAX_QUANTITY)])
+        else:
+            self.entries[i][2] = min(self.entries[i][2] + quantity, MAX_QUANTITY)
+        self.modified = True
+        return True
+
+    def change(self, line_id, delta):
+        """Same rules as cart_service.change(): never below 1."""
+        if not 1 <= line_id <= len(self.entries):
+            return 0
+        entry = self.entries[line_id - 1]
+        entry[2] = max(1, min(entry[2] + delta, MAX_QUANTITY))
+        self.modified = True
+        return 1
+
+    def remove(self, line_id):
+        if not 1 <= line_id <= len(self.entries):
+            return 0
+        del self.entries[line_id - 1]
+        self.modified = True
+        return 1
+
+    def clear(self):
+        self.entries = []
+        self.modified = True
+
+
+def _parse(raw):
+    entries = []
+    for entry in raw if isinstance(raw, list) else []:
+        try:
+            p, v, q = entry
+            p, v, q = int(p), (int(v) if v else None), int(q)
+        except (TypeError, ValueError):
+            continue
+        if q > 0:
+            entries.append([p, v, min(q, MAX_QUANTITY)])
+    return entries[:MAX_LINES]
+
+
+def get_cart(request):
+    """The visitor's cart, read from the cookie once per request."""
+    cart = getattr(request, "_anon_cart", None)
+    if cart is None:
+        try:
+            raw = signing.loads(
+                request.COOKIES.get(COOKIE_NAME, ""),
+                salt=COOKIE_SALT,
+                max_age=settings.ANON_CART_COOKIE_AGE,
+            )
+        except signing.BadSignature:
+            raw = []
+        cart = AnonymousCart(_parse(raw))
+        request._anon_cart = cart
+    return cart
+
+
+def save_cart(request, response):
+    cart = getattr(request, "_anon_cart", None)
+    if cart is None or not cart.modified:
+        return
+    if cart.entries:
+        response.set_cookie(
+            COOKIE_NAME,
+            signing.dumps(cart.entries, salt=COOKIE_SALT, compress=True),
+            max_age=settings.ANON_CART_COOKIE_AGE,
+            httponly=True,
+            samesite="Lax",
+            secure=request.is_secure(),
+        )
+    else:
+        response.delete_cookie(COOKIE_NAME, samesite="Lax")
+
+
+def merge_into_user(cart, user):
+    """
+    Fold the anonymous lines into the user's CartItem rows.
+
+    Unknown products / variants are dropped. Existing lines get the
+    quantities added (one bulk UPDATE), the rest are inserted in one
+    bulk INSERT.
+    """
+    if not cart:
+        return 0
+
+    product_ids = {p for p, _, _ in cart.entries}
+    variant_ids = {v for _, v, _ in cart.entries if v}
+    known_products = set(Product.objects.filter(id__in=product_ids).values_list("id", flat=True))
+    known_variants = dict(
+        ProductVariant.objects.filter(id__in=variant_ids).values_list("id", "product_id")
+    )
+
+    wanted = {}
+    for p, v, q in cart.entries:
+        if p not in known_products or (v and known_variants.get(v) != p):
+            continue
+        wanted[(p, v)] = wanted.get((p, v), 0) + q
+
+    with transaction.atomic():
+        existing = {
+            (item.product_id, item.variant_id): item
+            for item in CartItem.objects.select_for_update()
+            .filter(user=user, product_id__in=known_products)
+            .only("id", "product_id", "variant_id", "quantity")
+        }
+
+        to_update, to_create = [], []
+        for (p, v), q in wanted.items():
+            item = existing.get((p, v))
+            if item:
+                item.quantity = F("quantity") + q
+                to_update.append(item)
+            else:
+                to_create.append(CartItem(user=user, product_id=p, variant_id=v, quantity=q))
+
+        if to_update:
+            CartItem.objects.bulk_update(to_update, ["quantity"])
+        if to_create:
+            CartItem.objects.bulk_create(to_create, ignore_conflicts=True)
+
+    cart.clear()
+    return len(wanted)
@@ -0,0 +1,144 @@
+# store/assignment.py
+"""
+Automatic assignment of orders to delivery staff.
+
+plan() is the whole policy and touches no database: for each order
+(oldest first) pick, among the riders covering the order's zone, the one
+with the fewest open orders, ties broken by rider id, then count the new
+order against them. Riders with no zones configured cover every zone and
+are the fallback when nobody covers a zone explicitly; if there are none
+of those either, any rider is used. The same input always gives the same
+plan.
+
+assign_pending() feeds it from the database with a fixed number of
+queries: riders (+ their zones), one grouped COUNT for the load table,
+the unassigned orders (row-locked, SKIP LOCKED so concurrent runs don't
+collide) and one bulk_update.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from store import order_feed, service_areas
+
+OPEN_STATUSES = ("Pending pickup", "Out for delivery")
+DEFAULT_BATCH_SIZE = 500
+
+Rider = namedtuple("Rider", ["id", "zones"])
+
+
+def zone_of(pincode):
+    area = service_areas.lookup(pincode)
+    return area.zone if area else ""
+
+
+# ======================================================
+# POLICY (pure)
+# ======================================================
+def plan(orders, riders, loads, zone_of=zone_of):
+    """
+    orders: objects with .id and .postal_code, in the order to assign them.
+    riders: Rider(id, zones) tuples.
+    loads: {rider_id: open order count}; not modified.
+    Returns [(order, rider_id)].
+    """
+    if not riders:
+        return []
+
+    loads = {rider.id: loads.get(rider.id, 0) for rider in riders}
+    generalists = [rider.id for rider in riders if not rider.zones]
+    everyone = [rider.id for rider in riders]
+    by_zone = {}
+    for rider in riders:
+        for zone in rider.zones:
+            by_zone.setdefault(zone, []).append(rider.id)
+
+    assignments = []
+    for order in orders:
+        candidates = by_zone.get(zone_of(order.postal_code)) or generalists or everyone
+        rider_id = min(candidates, key=lambda rid: (loads[rid], rid))
+        loads[rider_id] += 1
+        assignments.append((order, rider_id))
+    return assignments
+
+
+# ======================================================
+# DATABASE
+# ======================================================
+def load_riders():
+    from store.models import CustomUser
+    rows = (
+        CustomUser.objects.filter(is_delivery_boy=True, is_active=True)
+        .values_list("id", "delivery_profile__zones")
+        .order_by("id")
+    )
+    return [Rider(rider_id, tuple(zones or ())) for rider_id, zones in rows]
+
+
+def load_table(rider_ids):
+    """{rider_id: open orders} from one grouped query."""
+    from store.models import Order
+    rows = (
+        Order.objects.filter(assigned_to_id__in=rider_ids, order_status__in=OPEN_STATUSES)
+        .values("assigned_to_id")
+        .annotate(open_orders=Count("id"))
+        .order_by()
+    )
+    return {row["assigned_to_id"]: row["open_orders"] for row in rows}
+
+
+def assign_pending(order_ids=None, limit=None, dry_run=False):
+    """
+    Assign unassigned open orders (all of them, or just `order_ids`).
+    Returns the [(order, rider_id)] plan that was applied.
+    """
+    from store.models import Order
+
+    riders = load_riders()
+    if not riders:
+        return []
+
+    with transaction.atomic():
+        pending = (
+            Order.objects.select_for_update(skip_locked=True)
+            .filter(assigned_to__isnull=True, order_status="Pending pickup")
+            .only("id", "postal_code", "assigned_to")
+            .order_by("created_at", "id")
+        )
+        if order_ids is not None:
+            pending = pending.filter(id__in=order_ids)
+        pending = list(pending[:limit or DEFAULT_BATCH_SIZE])
+        if not pending:
+            return []
+
+        assignments = plan(pending, riders, load_table([rider.id for rider in riders]))
+        if dry_run:
+            return assignments
+
+        for order, rider_id in assignments:
+            order.assigned_to_id = rider_id
+        Order.objects.bulk_update([order for order, _ in assignments], ["assigned_to"])
+
+        channels = {order_feed.delivery_channel()}
+        for order, rider_id in assignments:
+            channels.update((order_feed.order_channel(order.id), order_feed.delivery_channel(rider_id)))
+        transaction.on_commit(lambda: order_feed.bump(*channels))
+
+    return assignments
+
+
+def assign_new_order(order):
+    """Called at order placement; never lets a failure break checkout."""
+    if not getattr(settings, "AUTO_ASSIGN_ORDERS", True):
+        return None
+    try:
+        assignments = assign_pending(order_ids=[order.id])
+    except Exception as e:
+        print("Auto-assign error:", order.id, e)
+        return None
+    if assignments:
+        order.assigned_to_id = assignments[0][1]
+        return assignments[0][1]
+    return None
@@ -0,0 +1,76 @@
+# store/badges.py
+"""
+Cart / wishlist counts for the nav badges.
+
+The counts live in the shared cache under the user's id - not in the
+session, which would then be re-saved every time they were refreshed
+(store/session_store.py only writes sessions that changed). Views that
+add or remove cart / wishlist lines call invalidate(request), code
+acting for a user outside their own requests (the Razorpay webhook
+clearing the cart) calls invalidate_user(user_id); the next page
+recounts once. Entries also expire after BADGE_COUNTS_TTL seconds as a
+backstop. Logged-out visitors' cart count comes from the cookie cart
+(store/anon_cart.py).
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from store import anon_cart
+from store.models import CartItem, WishlistItem
+
+KEY_PREFIX = "badges:"
+DEFAULT_TTL = 300
+
+
+def _ttl():
+    return getattr(settings, "BADGE_COUNTS_TTL", DEFAULT_TTL)
+
+
+def get_counts(request):
+    """{"cart": <lines>, "wishlist": <items>} for the current user."""
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        return {"cart": len(anon_cart.get_cart(request)), "wishlist": 0}
+
+    cached = cache.get(KEY_PREFIX + str(user.pk))
+    if cached is not None:
+        return cached
+
+    counts = {
+        "cart": CartItem.objects.filter(user=user).count(),
+        "wishlist": WishlistItem.objects.filter(user=user).count(),
+    }
+    cache.set(KEY_PREFIX + str(user.pk), counts, _ttl())
+    return counts
+
+
+def invalidate(request):
+    """Call after a cart or wishlist mutation made by this request's user."""
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        invalidate_user(user.pk)
+
+
+def invalidate_user(user_id):
+    cache.delete(KEY_PREFIX + str(user_id))
+
+
+class BadgeCounts:
+    """Template-facing wrapper: counts are only looked up if a badge is rendered."""
+
+    def __init__(self, request):
+        self._request = request
+        self._counts = None
+
+    def _get(self, name):
+        if self._counts is None:
+            self._counts = get_counts(self._request)
+        return self._counts[name]
+
+    @property
+    def cart(self):
+        return self._get("cart")
+
+    @property
+    def wishlist(self):
+        return self._get("wishlist")
@@ -0,0 +1,57 @@
+# store/cache_utils.py
+"""
+Per-worker in-memory copies of small, rarely-changing tables.
+
+Each worker keeps the loaded value in process memory. A version token in
+the shared cache (Redis / DatabaseCache) is bumped on writes; workers look
+at the token at most every `recheck_seconds` and reload when it changed.
+"""
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+
+
+class VersionedLocalCache:
+
+    def __init__(self, version_key, loader, recheck_seconds=30):
+        self.version_key = version_key
+        self.loader = loader
+        self.recheck_seconds = recheck_seconds
+        self._lock = threading.Lock()
+        self._value = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def _recheck_seconds(self):
+        value = self.recheck_seconds
+        return value() if callable(value) else value
+
+    def _current_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, uuid.uuid4().hex, None)
+            version = cache.get(self.version_key)
+        return version
+
+    def get(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._value is not None and now - self._checked_at < self._recheck_seconds():
+                return self._value
+
+            version = self._current_version()
+            if self._value is None or version != self._version:
+                self._value = self.loader()
+                self._version = version
+            self._checked_at = now
+            return self._value
+
+    def invalidate(self):
+        """Call after the underlying rows change; every worker reloads on its next recheck."""
+        cache.set(self.version_key, uuid.uuid4().hex, None)
+        with self._lock:
+            self._value = None
+            self._version = None
+            self._checked_at = 0.0
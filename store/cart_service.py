@@ -0,0 +1,241 @@
+# store/cart_service.py
+"""
+Cart mutations done as single UPDATE / INSERT statements.
+
+Quantities are changed with F() expressions so two quick taps on "+" both
+count, and the (user, product, variant) unique constraints on CartItem turn
+a racing second insert into an increment instead of a duplicate row.
+Every mutation is followed by one aggregate that returns the line and the
+cart totals together.
+
+get_snapshot() is the read side shared by the cart, checkout and payment
+pages: a fixed number of queries whatever the number of lines.
+"""
+from django.db import IntegrityError, transaction
+from decimal import Decimal
+
+from django.db.models import DecimalField, ExpressionWrapper, F, Prefetch, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from store.models import CartItem, Product, ProductImage, ProductVariant
+
+# variant price overrides product price, same as CartItem.subtotal()
+UNIT_PRICE = Coalesce(
+    "variant__price", "product__price", output_field=DecimalField(max_digits=12, decimal_places=2)
+)
+LINE_TOTAL = ExpressionWrapper(
+    F("quantity") * UNIT_PRICE,
+    output_field=DecimalField(max_digits=12, decimal_places=2),
+)
+
+
+def _line(user, product_id, variant_id):
+    return CartItem.objects.filter(user=user, product_id=product_id, variant_id=variant_id)
+
+
+def _bump(queryset, delta):
+    return queryset.update(quantity=F("quantity") + delta, updated_at=timezone.now())
+
+
+def add(user, product_id, variant_id=None, quantity=1):
+    """Add `quantity` of a product to the cart. Returns True if a new line was created."""
+    line = _line(user, product_id, variant_id)
+    if _bump(line, quantity):
+        return False
+
+    try:
+        with transaction.atomic():
+            CartItem.objects.create(
+                user=user, product_id=product_id, variant_id=variant_id, quantity=quantity
+            )
+        return True
+    except IntegrityError:
+        # a concurrent request inserted the same line first
+        _bump(line, quantity)
+        return False
+
+
+def subtract(user, product_id, variant_id=None, quantity=1):
+    """Take `quantity` off a line; the line is removed if that empties it."""
+    line = _line(user, product_id, variant_id)
+    if not line.filter(quantity__lte=quantity).delete()[0]:
+        _bump(line, -quantity)
+
+
+def change(user, item_id, delta):
+    """Move a line's quantity by `delta`, never below 1. Returns rows updated (0 or 1)."""
+    line = CartItem.objects.filter(id=item_id, user=user)
+    if delta < 0:
+        line = line.filter(quantity__gt=-delta)
+        if not _bump(line, delta):
+            # can't go that low - clamp to 1 if the line exists at all
+            return CartItem.objects.filter(id=item_id, user=user).update(
+                quantity=1, updated_at=timezone.now()
+            )
+        return 1
+    return _bump(line, delta)
+
+
+def set_quantity(user, item_id, quantity):
+    """Set an absolute quantity; 0 or less removes the line."""
+    line = CartItem.objects.filter(id=item_id, user=user)
+    if quantity <= 0:
+        return line.delete()[0]
+    return line.update(quantity=quantity, updated_at=timezone.now())
+
+
+def set_line(user, product_id, variant_id, quantity):
+    """Set the quantity for a (product, variant) line, creating it if needed."""
+    line = _line(user, product_id, variant_id)
+    if quantity <= 0:
+        line.delete()
+        return
+    if line.update(quantity=quantity, updated_at=timezone.now()):
+        return
+    try:
+        with transaction.atomic():
+            CartItem.objects.create(
+                user=user, product_id=product_id, variant_id=variant_id, quantity=quantity
+            )
+    except IntegrityError:
+        line.update(quantity=quantity, updated_at=timezone.now())
+
+
+def remove(user, item_id):
+    return CartItem.objects.filter(id=item_id, user=user).delete()[0]
+
+
+def totals(user, item_id=None):
+    """
+    Cart total and item count, plus quantity/total for `item_id` when given -
+    all from one aggregate query.
+    """
+    aggregates = {
+        "cart_total": Sum(LINE_TOTAL),
+        "cart_count": Sum("quantity"),
+    }
+    if item_id is not None:
+        aggregates["line_quantity"] = Sum("quantity", filter=Q(id=item_id))
+        aggregates["item_total"] = Sum(LINE_TOTAL, filter=Q(id=item_id))
+
+    result = CartItem.objects.filter(user=user).aggregate(**aggregates)
+    for key in ("cart_total", "item_total"):
+        if key in result:
+            result[key] = result[key] or 0
+    result["cart_count"] = result["cart_count"] or 0
+    return result
+
+
+def lines(user):
+    """Every cart line with its total, for JSON responses."""
+    return list(
+        CartItem.objects.filter(user=user)
+        .order_by("id")
+        .values("id", "product_id", "variant_id", "quantity")
+        .annotate(item_total=LINE_TOTAL)
+    )
+
+
+# ===================================================================
+# CART SNAPSHOT (read side)
+# ===================================================================
+class CartSnapshot:
+    """
+    Lines (CartItem instances with .price and .line_total set) and totals.
+
+    For "buy now" the single line is an unsaved CartItem so templates and
+    order creation can treat both cases the same way.
+    """
+
+    def __init__(self, lines, is_buy_now=False):
+        self.lines = lines
+        self.is_buy_now = is_buy_now
+        self.subtotal = sum((line.line_total for line in lines), Decimal("0"))
+        self.item_count = sum(line.quantity for line in lines)
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __bool__(self):
+        return bool(self.lines)
+
+
+def _images_prefetch(lookup):
+    return Prefetch(lookup, queryset=ProductImage.objects.only("id", "product_id", "image", "order"))
+
+
+def _cart_lines(user):
+    """Two queries: lines joined to product/category/variant, then images."""
+    return list(
+        CartItem.objects.filter(user=user, product__isnull=False)
+        .select_related("product__category", "variant")
+        .prefetch_related(_images_prefetch("product__images"))
+        .annotate(price=UNIT_PRICE, line_total=LINE_TOTAL)
+        .order_by("id")
+    )
+
+
+def _buy_now_line(user, buy_now):
+    variant = None
+    if buy_now.get("variant_id"):
+        variant = (
+            ProductVariant.objects.select_related("product__category")
+            .prefetch_related(_images_prefetch("product__images"))
+            .filter(id=buy_now["variant_id"], product_id=buy_now["product_id"])
+            .first()
+        )
+    if variant:
+        product = variant.product
+    else:
+        product = (
+            Product.objects.select_related("category")
+            .prefetch_related(_images_prefetch("images"))
+            .filter(id=buy_now["product_id"])
+            .first()
+        )
+    if product is None:
+        return []
+
+    line = CartItem(user=user, product=product, variant=variant, quantity=1)
+    line.price = variant.display_price() if variant else product.price
+    line.line_total = line.price
+    return [line]
+
+
+def _anonymous_lines(cart):
+    """Unsaved CartItems for a cookie cart (store/anon_cart.py); ids are line positions."""
+    entries = cart.lines()
+    products = Product.objects.select_related("category").prefetch_related(
+        _images_prefetch("images")
+    ).in_bulk({p for _, p, _, _ in entries})
+    variants = ProductVariant.objects.in_bulk({v for _, _, v, _ in entries if v})
+
+    lines = []
+    for line_id, product_id, variant_id, quantity in entries:
+        product = products.get(product_id)
+        if product is None:
+            continue
+        variant = variants.get(variant_id)
+        if variant is not None and variant.product_id != product.id:
+            variant = None
+        if variant is not None:
+            variant.product = product
+
+        line = CartItem(id=line_id, product=product, variant=variant, quantity=quantity)
+        line.price = variant.display_price() if variant else product.price
+        line.line_total = line.price * quantity
+        lines.append(line)
+    return lines
+
+
+def get_snapshot(user, buy_now=None, anonymous_cart=None):
+    """The current cart (or the session's buy-now item) with totals."""
+    if anonymous_cart is not None:
+        return CartSnapshot(_anonymous_lines(anonymous_cart))
+    if buy_now:
+        return CartSnapshot(_buy_now_line(user, buy_now), is_buy_now=True)
+    return CartSnapshot(_cart_lines(user))
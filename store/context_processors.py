@@ -1,6 +1,18 @@
-from store.models import BusinessNameAndLogo
+from django.utils.functional import SimpleLazyObject
+
+from store.badges import BadgeCounts
+from store.site_settings import get_business
+
 
 def business_details(request):
+    # Lazy: pages that never touch business_info never hit the cache/DB
+    return {
+        "business_info": SimpleLazyObject(get_business)
+    }
+
+
+def badge_counts(request):
+    # Lazy: counts come from the cache (store/badges.py), and only when a badge renders
     return {
-        "business_info": BusinessNameAndLogo.objects.first()
+        "badges": BadgeCounts(request)
     }
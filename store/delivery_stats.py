@@ -0,0 +1,64 @@
+# store/delivery_stats.py
+"""
+Delivery dashboard numbers.
+
+The number of delivery staff decides whether a rider sees every order
+(single rider setup) or only the ones assigned to them. It is read on
+every dashboard / detail / stream request, so it is kept per worker in a
+VersionedLocalCache and invalidated from CustomUser.save() / delete().
+
+The dashboard counters and the paginator total come from one
+conditional-aggregate query over the rider's (filtered) orders.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from store.cache_utils import VersionedLocalCache
+
+DEFAULT_RECHECK_SECONDS = 30
+
+
+def _load_staff_count():
+    from store.models import CustomUser
+    return CustomUser.objects.filter(is_delivery_boy=True).count()
+
+
+_staff_cache = VersionedLocalCache(
+    "delivery_staff:version",
+    _load_staff_count,
+    recheck_seconds=lambda: getattr(settings, "DELIVERY_STAFF_RECHECK_SECONDS", DEFAULT_RECHECK_SECONDS),
+)
+
+
+def staff_count():
+    return _staff_cache.get()
+
+
+def invalidate_staff():
+    _staff_cache.invalidate()
+
+
+def scope(user):
+    """None when the rider sees every order, else their user id (for assigned_to filters)."""
+    return None if staff_count() == 1 else user.id
+
+
+def orders_for(user):
+    from store.models import Order
+    rider = scope(user)
+    return Order.objects.all() if rider is None else Order.objects.filter(assigned_to_id=rider)
+
+
+def dashboard_counters(orders):
+    """total / today / delivered_today / pending for `orders`, in one query."""
+    start = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+    today = Q(created_at__gte=start, created_at__lt=start + timedelta(days=1))
+    return orders.aggregate(
+        total=Count("id"),
+        today=Count("id", filter=today),
+        delivered_today=Count("id", filter=today & Q(order_status="Delivered")),
+        pending=Count("id", filter=Q(order_status="Pending pickup")),
+    )
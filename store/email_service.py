@@ -1,14 +1,14 @@
 import os
 from sib_api_v3_sdk import ApiClient, TransactionalEmailsApi, SendSmtpEmail
 from django.conf import settings
-from store.models import BusinessNameAndLogo
+from store import external
+from store.site_settings import get_site_settings
 
 
-StoreName = BusinessNameAndLogo.objects.first().business_name if BusinessNameAndLogo.objects.exists() else "NewWay Online"
-
 def send_brevo_email(to, subject, html_content, text_content=None):
     """Reusable Brevo API email sender"""
-    
+    StoreName = get_site_settings().business_name or "NewWay Online"
+
     client = ApiClient(settings.BREVO_CONFIGURATION)
     api = TransactionalEmailsApi(client)
 
@@ -21,7 +21,7 @@ def send_brevo_email(to, subject, html_content, text_content=None):
     )
 
     try:
-        api.send_transac_email(email)
+        external.call("brevo", "send_transac_email", api.send_transac_email, email)
         return True
     except Exception as e:
         print("Brevo API Email Error:", e)
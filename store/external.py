@@ -0,0 +1,319 @@
+# store/external.py
+"""
+One wrapper for every call to an outside provider (Razorpay, Brevo,
+Cloudinary uploads - see install_cloudinary()):
+
+    external.call("razorpay", "order.create", razorpay_client.order.create, data)
+
+Per service (settings.EXTERNAL_SERVICES):
+- connect/read timeouts, injected into the SDK call's timeout kwarg;
+- retries with full jitter - any transient error for idempotent calls,
+  only connect failures (request never sent) for the rest;
+- a circuit breaker: after `failure_threshold` transient failures in a
+  row the service fails fast with CircuitOpen for `reset_seconds`, then
+  one trial call decides whether it closes again.
+
+Latency / error histograms are kept in process memory and flushed as
+deltas into the shared cache every METRICS_FLUSH_SECONDS, so recording a
+call costs no I/O; metrics_text() renders them for the /metrics/ endpoint.
+"""
+import functools
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+DEFAULT_POLICY = {
+    "connect_timeout": 3.0,
+    "read_timeout": 10.0,
+    "retries": 2,
+    "backoff": 0.3,
+    "failure_threshold": 5,
+    "reset_seconds": 30,
+    "timeout_kwarg": "timeout",
+    "timeout_as_tuple": True,       # (connect, read); False passes just the read timeout
+}
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_FLUSH_SECONDS = 10
+METRICS_KEY = "metrics:external"
+
+
+class CircuitOpen(Exception):
+    """The provider has been failing; call refused without touching the network."""
+
+
+def policy(service):
+    configured = getattr(settings, "EXTERNAL_SERVICES", {}).get(service, {})
+    return {**DEFAULT_POLICY, **configured}
+
+
+# ======================================================
+# ERROR CLASSIFICATION
+# ======================================================
+def _status_code(exc):
+    for attr in ("status", "status_code", "http_status"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def _wrapped(exc):
+    """The transport error behind an SDK's own exception type (Cloudinary re-raises urllib3 errors)."""
+    return exc.__cause__ or exc.__context__
+
+
+def _is_connect_failure(exc):
+    """The request never reached the provider, so repeating it is always safe."""
+    name = type(exc).__name__
+    if name in {"ConnectTimeout", "ConnectTimeoutError", "NewConnectionError"} or (
+        name == "MaxRetryError" and "NewConnectionError" in str(exc)
+    ):
+        return True
+    inner = _wrapped(exc)
+    return inner is not None and _is_connect_failure(inner)
+
+
+def _is_transient(exc):
+    """Worth retrying / counts against the breaker: timeouts, connection errors, 5xx."""
+    if isinstance(exc, (TimeoutError, ConnectionError)) or _is_connect_failure(exc):
+        return True
+    inner = _wrapped(exc)
+    if inner is not None and _is_transient(inner):
+        return True
+    name = type(exc).__name__
+    if name in {"Timeout", "ReadTimeout", "ReadTimeoutError", "ConnectionError",
+                "MaxRetryError", "ProtocolError", "ServerError", "GatewayError"}:
+        return True
+    status = _status_code(exc)
+    return status is not None and status >= 500
+
+
+# ======================================================
+# CIRCUIT BREAKER (per process)
+# ======================================================
+class CircuitBreaker:
+
+    def __init__(self, service):
+        self.service = service
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < policy(self.service)["reset_seconds"] or self.trial_in_flight:
+                raise CircuitOpen(f"{self.service} circuit open")
+            self.trial_in_flight = True       # half-open: let exactly one through
+
+    def record(self, ok):
+        with self._lock:
+            self.trial_in_flight = False
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= policy(self.service)["failure_threshold"]:
+                if self.opened_at is None:
+                    print(f"⚠️ {self.service} circuit opened after {self.failures} failures")
+                self.opened_at = time.monotonic()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self.trial_in_flight else "open"
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(service):
+    with _breakers_lock:
+        if service not in _breakers:
+            _breakers[service] = CircuitBreaker(service)
+        return _breakers[service]
+
+
+# ======================================================
+# METRICS
+# ======================================================
+class _Metrics:
+    """Per-process deltas since the last flush: {(service, op): {...}}."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._flushed_at = time.monotonic()
+
+    def observe(self, service, op, seconds, outcome):
+        with self._lock:
+            series = self._pending.setdefault((service, op), {
+                "buckets": [0] * (len(LATENCY_BUCKETS) + 1),
+                "count": 0, "sum": 0.0, "errors": 0, "rejected": 0,
+            })
+            if outcome == "rejected":
+                series["rejected"] += 1
+            else:
+                series["count"] += 1
+                series["sum"] += seconds
+                index = next((i for i, le in enumerate(LATENCY_BUCKETS) if seconds <= le), len(LATENCY_BUCKETS))
+                series["buckets"][index] += 1
+                if outcome == "error":
+                    series["errors"] += 1
+            due = time.monotonic() - self._flushed_at >= METRICS_FLUSH_SECONDS
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushed_at = time.monotonic()
+        if not pending:
+            return
+        try:
+            stored = cache.get(METRICS_KEY) or {}
+            for (service, op), delta in pending.items():
+                key = f"{service}|{op}"
+                total = stored.setdefault(key, {
+                    "buckets": [0] * (len(LATENCY_BUCKETS) + 1),
+                    "count": 0, "sum": 0.0, "errors": 0, "rejected": 0,
+                })
+                total["buckets"] = [a + b for a, b in zip(total["buckets"], delta["buckets"])]
+                for field in ("count", "sum", "errors", "rejected"):
+                    total[field] += delta[field]
+            # read-modify-write: concurrent flushes from other workers can
+            # drop a few samples, which is fine for dashboards
+            cache.set(METRICS_KEY, stored, None)
+        except Exception as e:
+            print("Metrics flush error:", e)
+
+
+metrics = _Metrics()
+
+
+def metrics_text():
+    """Prometheus text exposition of the shared external-call metrics."""
+    metrics.flush()
+    stored = cache.get(METRICS_KEY) or {}
+    lines = [
+        "# HELP external_call_seconds Latency of calls to external providers.",
+        "# TYPE external_call_seconds histogram",
+    ]
+    for key in sorted(stored):
+        service, op = key.split("|", 1)
+        series = stored[key]
+        labels = f'service="{service}",op="{op}"'
+        running = 0
+        for le, count in zip(LATENCY_BUCKETS + ("+Inf",), series["buckets"]):
+            running += count
+            lines.append(f'external_call_seconds_bucket{{{labels},le="{le}"}} {running}')
+        lines.append(f"external_call_seconds_sum{{{labels}}} {series['sum']:.6f}")
+        lines.append(f"external_call_seconds_count{{{labels}}} {series['count']}")
+
+    lines += ["# HELP external_call_errors_total Failed calls.", "# TYPE external_call_errors_total counter"]
+    for key in sorted(stored):
+        service, op = key.split("|", 1)
+        lines.append(f'external_call_errors_total{{service="{service}",op="{op}"}} {stored[key]["errors"]}')
+
+    lines += ["# HELP external_call_rejected_total Calls refused by an open circuit.",
+              "# TYPE external_call_rejected_total counter"]
+    for key in sorted(stored):
+        service, op = key.split("|", 1)
+        lines.append(f'external_call_rejected_total{{service="{service}",op="{op}"}} {stored[key]["rejected"]}')
+
+    lines += ["# HELP external_circuit_open Circuit state in this worker (1 = open).",
+              "# TYPE external_circuit_open gauge"]
+    for service, b in sorted(_breakers.items()):
+        lines.append(f'external_circuit_open{{service="{service}"}} {0 if b.state == "closed" else 1}')
+
+    return "\n".join(lines) + "\n"
+
+
+# ======================================================
+# THE WRAPPER
+# ======================================================
+def call(service, op, fn, *args, idempotent=False, **kwargs):
+    """
+    Run fn(*args, **kwargs) under the service's timeout / retry / breaker
+    policy. Errors are re-raised unchanged (CircuitOpen when refused).
+    """
+    conf = policy(service)
+    timeout_kwarg = conf["timeout_kwarg"]
+    if timeout_kwarg and timeout_kwarg not in kwargs:
+        kwargs[timeout_kwarg] = (
+            (conf["connect_timeout"], conf["read_timeout"]) if conf["timeout_as_tuple"]
+            else conf["read_timeout"]
+        )
+
+    circuit = breaker(service)
+    attempt = 0
+    while True:
+        try:
+            circuit.before_call()
+        except CircuitOpen:
+            metrics.observe(service, op, 0.0, "rejected")
+            raise
+
+        started = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as exc:
+            elapsed = time.monotonic() - started
+            transient = _is_transient(exc)
+            circuit.record(ok=not transient)
+            metrics.observe(service, op, elapsed, "error")
+
+            retryable = _is_connect_failure(exc) or (idempotent and transient)
+            if not retryable or attempt >= conf["retries"]:
+                raise
+            attempt += 1
+            # full jitter: sleep anywhere in [0, backoff * 2^attempt)
+            time.sleep(random.uniform(0, conf["backoff"] * 2 ** attempt))
+            continue
+
+        circuit.record(ok=True)
+        metrics.observe(service, op, time.monotonic() - started, "ok")
+        return result
+
+
+# ======================================================
+# CLOUDINARY UPLOADS
+# ======================================================
+def install_cloudinary():
+    """
+    Route cloudinary.uploader.upload through call("cloudinary", "upload", ...).
+
+    Image uploads happen inside the SDK - CloudinaryField.pre_save via
+    upload_resource(), and the media storage - and both look upload up on
+    the module at call time, so wrapping it once (from StoreConfig.ready)
+    gives every upload the "cloudinary" timeout, breaker and metrics.
+    Chunked upload_large() for files over 20 MB is left as it is.
+    """
+    from cloudinary import uploader
+
+    upload = uploader.upload
+    if getattr(upload, "external_service", None):
+        return
+
+    def attempt(file, **options):
+        # the SDK reads streams to the end; a retry has to start over
+        if hasattr(file, "seekable") and file.seekable():
+            file.seek(0)
+        return upload(file, **options)
+
+    @functools.wraps(upload)
+    def guarded_upload(file, **options):
+        return call("cloudinary", "upload", attempt, file, **options)
+
+    guarded_upload.external_service = "cloudinary"
+    uploader.upload = guarded_upload
@@ -0,0 +1,152 @@
+# store/idempotency.py
+"""
+Replay-safe order placement.
+
+    @idempotent(lambda request: request.POST.get("razorpay_order_id"), scope="rzp")
+    def payment_verify_view(request): ...
+
+The first request for a key inserts an IdempotencyKey row (the unique
+constraint decides the winner across gunicorn workers), runs the view and
+stores its response. Duplicates inside the TTL get that response back
+without touching the view again.
+
+While the first request runs it holds a short lease (locked_until). A
+duplicate arriving meanwhile polls once and then gets a 409 instead of
+tying up a worker; if the first request died without storing or releasing
+the key, a retry takes the key over once the lease has run out rather
+than being locked out for the whole TTL.
+"""
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import HttpResponse, HttpResponseRedirect
+from django.utils import timezone
+
+from store.models import IdempotencyKey
+
+DEFAULT_TTL = 24 * 60 * 60      # seconds
+DEFAULT_LEASE = 30              # seconds the first request owns an unfinished key
+POLL_INTERVAL = 0.5             # one short wait before a duplicate gets its 409
+
+
+def _ttl():
+    return getattr(settings, "IDEMPOTENCY_KEY_TTL", DEFAULT_TTL)
+
+
+def _lease():
+    return getattr(settings, "IDEMPOTENCY_LEASE_SECONDS", DEFAULT_LEASE)
+
+
+def _claim(key, user):
+    """Return (record, claimed). claimed=False means someone else owns it."""
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=_ttl())
+    locked_until = now + timedelta(seconds=_lease())
+
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                key=key, user=user, expires_at=expires_at, locked_until=locked_until,
+            ), True
+    except IntegrityError:
+        pass
+
+    # Stale key from an earlier TTL window, or an unfinished one whose
+    # owner's lease ran out → take it over (one conditional UPDATE, so
+    # only one retry wins)
+    lapsed = (
+        Q(expires_at__lte=now)
+        | Q(status_code__isnull=True, locked_until__lte=now)
+        | Q(status_code__isnull=True, locked_until__isnull=True, created_at__lte=now - timedelta(seconds=_lease()))
+    )
+    taken = IdempotencyKey.objects.filter(lapsed, key=key).update(
+        user=user, status_code=None, content_type="", location="", body="",
+        created_at=now, expires_at=expires_at, locked_until=locked_until,
+    )
+    record = IdempotencyKey.objects.filter(key=key).first()
+    return record, bool(taken) and record is not None and record.locked_until == locked_until
+
+
+def _owned(record):
+    """The key row, as long as `record`'s lease is still the current one."""
+    return IdempotencyKey.objects.filter(pk=record.pk, locked_until=record.locked_until)
+
+
+def _store(record, response):
+    fields = {
+        "status_code": response.status_code,
+        "content_type": response.get("Content-Type", ""),
+        "location": response.get("Location", ""),
+        "locked_until": None,
+    }
+    if not getattr(response, "streaming", False):
+        fields["body"] = response.content.decode(response.charset or "utf-8", errors="replace")
+    _owned(record).update(**fields)
+
+
+def _release(record):
+    _owned(record).delete()
+
+
+def _replay(record):
+    if record.location:
+        return HttpResponseRedirect(record.location)
+    response = HttpResponse(record.body, status=record.status_code, content_type=record.content_type or None)
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _in_progress():
+    response = HttpResponse("This request is already being processed.", status=409)
+    response["Retry-After"] = "1"
+    return response
+
+
+def idempotent(key_func, scope):
+    """
+    key_func(request) -> str | None. None means "no key", run the view as usual.
+    Keys are namespaced by scope and the user id. Only responses below
+    400 are kept; errors release the key so the client can retry.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, _retried=False, **kwargs):
+            raw_key = key_func(request)
+            if not raw_key:
+                return view_func(request, *args, **kwargs)
+
+            user = request.user if request.user.is_authenticated else None
+            key = f"{scope}:{user.pk if user else 'anon'}:{raw_key}"
+
+            record, claimed = _claim(key, user)
+
+            if not claimed:
+                if record is not None and not record.is_complete():
+                    # a double submit usually finishes within the poll
+                    time.sleep(POLL_INTERVAL)
+                    record = IdempotencyKey.objects.filter(key=key).first()
+                if record is not None and record.is_complete():
+                    return _replay(record)
+                if record is None and not _retried:
+                    # first request failed and released the key → our turn
+                    return wrapper(request, *args, _retried=True, **kwargs)
+                return _in_progress()
+
+            try:
+                response = view_func(request, *args, **kwargs)
+            except Exception:
+                _release(record)
+                raise
+
+            if response.status_code >= 400:
+                _release(record)
+            else:
+                _store(record, response)
+            return response
+
+        return wrapper
+    return decorator
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from store import assignment
+
+
+class Command(BaseCommand):
+    help = (
+        "Assign unassigned pending orders to delivery staff by zone and open-order "
+        "load (store/assignment.py). Safe to run from cron next to order placement."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=assignment.DEFAULT_BATCH_SIZE, help="Orders per batch.")
+        parser.add_argument("--dry-run", action="store_true", help="Print the plan without saving it.")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            assigned = assignment.assign_pending(limit=options["limit"], dry_run=options["dry_run"])
+            for order, rider_id in assigned:
+                self.stdout.write(f"  order #{order.id} ({order.postal_code}) → rider {rider_id}")
+            total += len(assigned)
+            # a dry run would see the same orders again
+            if options["dry_run"] or len(assigned) < options["limit"]:
+                break
+
+        verb = "would be assigned" if options["dry_run"] else "assigned"
+        self.stdout.write(self.style.SUCCESS(f"{total} order(s) {verb}."))
@@ -0,0 +1,53 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from store.models import ORDER_LINE_TOTAL, Order, OrderItem
+
+
+class Command(BaseCommand):
+    help = "Fill Order.subtotal / item_count / total from order items, in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        last_id = 0
+        updated = 0
+
+        while True:
+            orders = list(
+                Order.objects.filter(id__gt=last_id)
+                .order_by("id")
+                .only("id", "delivery_fee")[:chunk_size]
+            )
+            if not orders:
+                break
+
+            # one grouped aggregate per chunk
+            totals = {
+                row["order_id"]: row
+                for row in OrderItem.objects.filter(order_id__in=[o.id for o in orders])
+                .values("order_id")
+                .annotate(subtotal=Sum(ORDER_LINE_TOTAL), item_count=Count("id"))
+            }
+
+            for order in orders:
+                row = totals.get(order.id, {})
+                order.subtotal = row.get("subtotal") or 0
+                order.item_count = row.get("item_count") or 0
+                order.total = order.subtotal + order.delivery_fee
+
+            with transaction.atomic():
+                Order.objects.bulk_update(orders, ["subtotal", "item_count", "total"])
+
+            updated += len(orders)
+            last_id = orders[-1].id
+            self.stdout.write(f"... {updated} orders")
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled totals for {updated} orders."))
+
+        # bulk_update skips Order.save(), so the daily rollup has to follow
+        call_command("rebuild_order_stats", stdout=self.stdout)
@@ -0,0 +1,64 @@
+import csv
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from store import service_areas
+from store.models import ServiceArea
+
+TRUE_VALUES = {"1", "true", "yes", "y"}
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk upsert serviceable pincodes from a CSV with columns "
+        "pincode,zone,delivery_days,cod_allowed,fee (only pincode is required)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_path")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--deactivate-missing",
+            action="store_true",
+            help="Mark pincodes that are not in the file as inactive.",
+        )
+
+    def handle(self, *args, **options):
+        areas = {}
+        try:
+            with open(options["csv_path"], newline="", encoding="utf-8-sig") as fh:
+                for line_no, row in enumerate(csv.DictReader(fh), start=2):
+                    pincode = (row.get("pincode") or "").strip()
+                    if not pincode:
+                        continue
+                    try:
+                        areas[pincode] = ServiceArea(
+                            pincode=pincode,
+                            zone=(row.get("zone") or "").strip(),
+                            delivery_days=int(row.get("delivery_days") or 2),
+                            cod_allowed=(row.get("cod_allowed") or "1").strip().lower() in TRUE_VALUES,
+                            fee=Decimal((row.get("fee") or "0").strip()),
+                            is_active=True,
+                        )
+                    except (ValueError, InvalidOperation) as e:
+                        raise CommandError(f"Line {line_no}: {e}")
+        except OSError as e:
+            raise CommandError(str(e))
+
+        with transaction.atomic():
+            ServiceArea.objects.bulk_create(
+                areas.values(),
+                batch_size=options["batch_size"],
+                update_conflicts=True,
+                unique_fields=["pincode"],
+                update_fields=["zone", "delivery_days", "cod_allowed", "fee", "is_active", "updated_at"],
+            )
+            if options["deactivate_missing"]:
+                ServiceArea.objects.exclude(pincode__in=list(areas)).update(is_active=False)
+
+        # bulk_create skips ServiceArea.save()
+        service_areas.invalidate()
+
+        self.stdout.write(self.style.SUCCESS(f"Imported {len(areas)} pincodes."))
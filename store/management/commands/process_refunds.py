@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store import refund_service
+
+
+class Command(BaseCommand):
+    help = (
+        "Submit queued refunds (RefundRequest) to Razorpay. Runs forever by "
+        "default; use --once from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Drain the due queue and exit.")
+        parser.add_argument("--interval", type=float, default=10, help="Seconds to sleep when idle.")
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=getattr(settings, "REFUND_CONCURRENCY", 4),
+            help="Max Razorpay refund calls in flight.",
+        )
+        parser.add_argument(
+            "--fake",
+            action="store_true",
+            help="Use the in-memory Razorpay stand-in (store/razorpay_fake.py).",
+        )
+
+    def handle(self, *args, **options):
+        if options["fake"]:
+            from store.razorpay_fake import FakeRazorpayClient
+            client = FakeRazorpayClient()
+        else:
+            client = refund_service.get_client()
+
+        totals = {}
+        while True:
+            summary = refund_service.run_batch(client, options["concurrency"])
+            for status, count in summary.items():
+                totals[status] = totals.get(status, 0) + count
+                self.stdout.write(f"... {count} {status}")
+
+            if not summary:
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+
+        done = ", ".join(f"{count} {status}" for status, count in sorted(totals.items())) or "nothing due"
+        self.stdout.write(self.style.SUCCESS(f"Refund queue drained: {done}."))
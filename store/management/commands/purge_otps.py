@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store import otp
+
+
+class Command(BaseCommand):
+    help = "Delete one-time password challenges whose TTL has passed."
+
+    def handle(self, *args, **options):
+        deleted = otp.sweep()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired OTP challenges."))
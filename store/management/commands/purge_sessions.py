@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from store.session_store import DEFAULT_CLEANUP_BATCH, SessionStore
+
+
+class Command(BaseCommand):
+    help = "Delete expired sessions in batches (a batched `clearsessions`)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_CLEANUP_BATCH)
+        parser.add_argument("--sleep", type=float, default=0, help="Seconds to pause between batches.")
+
+    def handle(self, *args, **options):
+        deleted = SessionStore.clear_expired(batch_size=options["batch_size"], pause=options["sleep"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired sessions."))
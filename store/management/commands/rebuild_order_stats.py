@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models.functions import TruncDate
+
+from store.models import Order, OrderDailyStats, daily_stats_aggregates
+
+
+class Command(BaseCommand):
+    help = "Rebuild the OrderDailyStats rollup from orders (one grouped query)."
+
+    def handle(self, *args, **options):
+        rows = (
+            Order.objects.annotate(day=TruncDate("created_at"))
+            .values("day")
+            .annotate(**daily_stats_aggregates())
+            .order_by("day")
+        )
+
+        stats = [
+            OrderDailyStats(
+                date=row["day"],
+                orders=row["orders"],
+                revenue=row["revenue"] or 0,
+                items=row["items"] or 0,
+                cancellations=row["cancellations"],
+                pending=row["pending"],
+                delivered=row["delivered"],
+                cod_orders=row["cod_orders"],
+                prepaid_orders=row["prepaid_orders"],
+            )
+            for row in rows
+        ]
+
+        with transaction.atomic():
+            OrderDailyStats.objects.all().delete()
+            OrderDailyStats.objects.bulk_create(stats, batch_size=500)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt daily stats for {len(stats)} days."))
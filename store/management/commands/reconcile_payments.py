@@ -0,0 +1,172 @@
+from collections import Counter
+from datetime import datetime, timedelta
+
+import razorpay
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from store import external
+from store.models import Order, OrderDailyStats, PendingPayment
+from store.payment_service import finalize_payment
+
+PAGE_SIZE = 100     # Razorpay's max `count` for GET /payments
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare Razorpay payments in a time window with our Orders and report "
+        "(or, with --repair, fix) captured payments without an order, unpaid "
+        "orders whose payment was captured, and paid orders whose payment failed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=int, default=24, help="Window ending now (ignored with --from).")
+        parser.add_argument("--from", dest="start", help="Window start, YYYY-MM-DD or ISO datetime.")
+        parser.add_argument("--to", dest="end", help="Window end, YYYY-MM-DD or ISO datetime (default now).")
+        parser.add_argument("--repair", action="store_true", help="Fix what can be fixed instead of only reporting.")
+        parser.add_argument("--fixture", help="Read payments from a JSON file instead of the Razorpay API.")
+        parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+
+    # ------------------------------------------------------------------
+    def handle(self, *args, **options):
+        start, end = self._window(options)
+        self.repair = options["repair"]
+        self.counts = Counter()
+        self.repaired_days = set()      # .update() skips Order.save(), so refresh the rollup at the end
+
+        if options["fixture"]:
+            from store.razorpay_fake import FakeRazorpayClient
+            client = FakeRazorpayClient.from_fixture(options["fixture"])
+        else:
+            client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
+
+        self.stdout.write(f"Reconciling payments {start:%Y-%m-%d %H:%M} → {end:%Y-%m-%d %H:%M}")
+
+        seen_payment_ids = set()
+        for page in self._pages(client, start, end, options["page_size"]):
+            seen_payment_ids.update(p["id"] for p in page)
+            self._check_page(page)
+
+        self._check_orders_without_payment(start, end, seen_payment_ids)
+        OrderDailyStats.refresh_days(self.repaired_days)
+
+        summary = ", ".join(f"{count} {name}" for name, count in sorted(self.counts.items()))
+        self.stdout.write(self.style.SUCCESS(f"Done. {summary or 'nothing to report'}."))
+
+    def _window(self, options):
+        def parse(value):
+            try:
+                dt = datetime.fromisoformat(value)
+            except ValueError:
+                raise CommandError(f"Bad date: {value}")
+            return timezone.make_aware(dt) if timezone.is_naive(dt) else dt
+
+        end = parse(options["end"]) if options["end"] else timezone.now()
+        start = parse(options["start"]) if options["start"] else end - timedelta(hours=options["hours"])
+        if start >= end:
+            raise CommandError("--from must be before --to.")
+        return start, end
+
+    def _pages(self, client, start, end, page_size):
+        """Yield one page of payment entities at a time - never the whole window."""
+        skip = 0
+        while True:
+            result = external.call("razorpay", "payment.all", client.payment.all, {
+                "from": int(start.timestamp()),
+                "to": int(end.timestamp()),   # fixed upper bound keeps skip-paging stable
+                "count": page_size,
+                "skip": skip,
+            }, idempotent=True)
+            items = result.get("items", [])
+            if not items:
+                return
+            yield items
+            if len(items) < page_size:
+                return
+            skip += len(items)
+
+    # ------------------------------------------------------------------
+    def _check_page(self, payments):
+        """Match one page against Order / PendingPayment with two indexed IN queries."""
+        self.counts["payments"] += len(payments)
+
+        rp_order_ids = {p["order_id"] for p in payments if p.get("order_id")}
+        payment_ids = {p["id"] for p in payments}
+
+        orders = list(
+            Order.objects.filter(Q(razorpay_order_id__in=rp_order_ids) | Q(payment_id__in=payment_ids))
+            .only("id", "razorpay_order_id", "payment_id", "paid", "refunded", "total", "created_at")
+        )
+        by_rp_order = {o.razorpay_order_id: o for o in orders if o.razorpay_order_id}
+        by_payment = {o.payment_id: o for o in orders if o.payment_id}
+        pending = dict(
+            PendingPayment.objects.filter(razorpay_order_id__in=rp_order_ids)
+            .values_list("razorpay_order_id", "status")
+        )
+
+        for payment in payments:
+            status = payment.get("status")
+            order = by_payment.get(payment["id"]) or by_rp_order.get(payment.get("order_id"))
+
+            if status == "captured":
+                self._check_captured(payment, order, pending.get(payment.get("order_id")))
+            elif status == "failed" and order and order.paid and order.payment_id == payment["id"]:
+                self._report("paid_but_failed", payment, order, "order is paid but its payment failed")
+                if self.repair:
+                    Order.objects.filter(pk=order.pk).update(paid=False)
+                    self.repaired_days.add(order.created_day())
+            elif status == "refunded" and order and not order.refunded:
+                self._report("refund_not_recorded", payment, order, "payment refunded, order not marked")
+                if self.repair:
+                    Order.objects.filter(pk=order.pk).update(refunded=True)
+                    self.repaired_days.add(order.created_day())
+
+    def _check_captured(self, payment, order, snapshot_status):
+        if order is None:
+            if snapshot_status is None:
+                self._report("captured_unknown", payment, None, "captured, no order and no checkout snapshot")
+                return
+            if snapshot_status == PendingPayment.STATUS_MISMATCH:
+                self._report("amount_mismatch", payment, None, "captured, checkout snapshot flagged (refund or place by hand)")
+                return
+            self._report("captured_without_order", payment, None, "captured but no order")
+            if self.repair:
+                created_order, _ = finalize_payment(payment["order_id"], payment["id"], payment.get("amount"))
+                if created_order:
+                    self.stdout.write(f"    → created order #{created_order.id}")
+            return
+
+        if not order.paid or order.payment_id != payment["id"]:
+            self._report("unpaid_order", payment, order, "captured but order not marked paid")
+            if self.repair:
+                Order.objects.filter(pk=order.pk).update(paid=True, payment_id=payment["id"])
+                self.repaired_days.add(order.created_day())
+            return
+
+        if int(payment.get("amount", 0)) != int(order.total * 100):
+            self._report("amount_mismatch", payment, order, f"captured {payment.get('amount')} paise, order total {order.total}")
+            return
+
+        self.counts["ok"] += 1
+
+    def _check_orders_without_payment(self, start, end, seen_payment_ids):
+        """Prepaid orders in the window whose payment Razorpay never listed (streamed)."""
+        orders = (
+            Order.objects.filter(created_at__range=(start, end), paid=True)
+            .exclude(payment_method="COD")
+            .values_list("id", "payment_id")
+            .iterator(chunk_size=2000)
+        )
+        for order_id, payment_id in orders:
+            if payment_id not in seen_payment_ids:
+                self.counts["order_without_payment"] += 1
+                self.stdout.write(self.style.WARNING(
+                    f"  order_without_payment: order #{order_id} ({payment_id or 'no payment id'})"
+                ))
+
+    def _report(self, kind, payment, order, message):
+        self.counts[kind] += 1
+        where = f"order #{order.id}" if order else f"rzp order {payment.get('order_id')}"
+        self.stdout.write(self.style.WARNING(f"  {kind}: {payment['id']} / {where}: {message}"))
@@ -0,0 +1,424 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from store import delivery_stats, service_areas
+from store.models import (
+    CartItem,
+    Category,
+    CustomUser,
+    DeliveryProfile,
+    Order,
+    OrderItem,
+    OrderStatusEvent,
+    Product,
+    ProductAttribute,
+    ProductAttributeValue,
+    ProductImage,
+    ProductType,
+    ProductVariant,
+    Review,
+    ServiceArea,
+    WishlistItem,
+)
+from store.utils import format_description
+
+CATEGORY_WORDS = [
+    "Electronics", "Women", "Men", "Kids", "Toys", "Grocery", "Home", "Kitchen", "Beauty",
+    "Sports", "Books", "Footwear", "Accessories", "Stationery", "Garden", "Pets", "Health",
+]
+PRODUCT_WORDS = [
+    "Classic", "Premium", "Everyday", "Smart", "Organic", "Compact", "Deluxe", "Eco", "Pro",
+    "Cotton", "Steel", "Wireless", "Handmade", "Travel", "Family", "Mini",
+]
+PRODUCT_NOUNS = [
+    "Kurta", "Saree", "Shirt", "Bottle", "Lamp", "Speaker", "Backpack", "Notebook", "Blender",
+    "Sandal", "Toy Car", "Puzzle", "Tea", "Rice", "Soap", "Watch", "Cushion", "Mug",
+]
+# product type -> {attribute: choices}
+PRODUCT_TYPES = {
+    "Apparel": {"Material": ["Cotton", "Silk", "Rayon", "Linen"], "Fit": ["Regular", "Slim", "Loose"]},
+    "Electronics": {"Warranty": ["6 months", "1 year", "2 years"], "Power": ["Battery", "USB", "Mains"]},
+    "Grocery": {"Weight": ["250 g", "500 g", "1 kg", "5 kg"], "Diet": ["Veg", "Vegan"]},
+}
+VARIANT_AXES = [("size", ["S", "M", "L", "XL"]), ("color", ["Red", "Blue", "Black", "Green"])]
+
+# (value, weight) tables for the "realistic" shape of the data
+ITEMS_PER_ORDER = [(1, 30), (2, 28), (3, 18), (4, 10), (5, 7), (6, 4), (8, 3)]     # mean ~2.9
+QUANTITY = [(1, 80), (2, 14), (3, 4), (5, 2)]
+RATING = [(1, 5), (2, 7), (3, 15), (4, 33), (5, 40)]
+REVIEW_COMMENTS = ["Good value.", "As described.", "Quality could be better.", "Fast delivery!", "Loved it."]
+# order age in days -> status weights
+STATUS_BY_AGE = [
+    (1, [("Pending pickup", 70), ("Out for delivery", 25), ("Cancelled", 5)]),
+    (3, [("Pending pickup", 15), ("Out for delivery", 30), ("Delivered", 50), ("Cancelled", 5)]),
+    (None, [("Delivered", 92), ("Cancelled", 8)]),
+]
+COD_SHARE = 0.45
+
+
+def _table(pairs):
+    values, weights = zip(*pairs)
+    return list(values), list(accumulate(weights))
+
+
+def _zipf_weights(n, exponent):
+    """Cumulative weights giving rank r a share proportional to 1 / (r + 1) ** exponent."""
+    return list(accumulate(1 / (rank + 1) ** exponent for rank in range(n)))
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let bulk_create keep the datetimes we set instead of auto_now(_add) overwriting them."""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field, _, _ in saved:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a synthetic store for benchmarking: nested categories, products with "
+        "variants / attributes / image references, reviews, customers, carts, wishlists "
+        "and orders. Deterministic for a given --seed. 1M order items: --orders 345000."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=42, help="Random seed (same seed, same data).")
+        parser.add_argument("--prefix", default="seed", help="Marks generated users, slugs and SKUs.")
+        parser.add_argument("--categories", type=int, default=40)
+        parser.add_argument("--products", type=int, default=2000)
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument("--riders", type=int, default=8)
+        parser.add_argument("--pincodes", type=int, default=20)
+        parser.add_argument("--orders", type=int, default=20000)
+        parser.add_argument("--reviews", type=float, default=4, help="Average reviews per product.")
+        parser.add_argument("--days", type=int, default=365, help="Orders are spread over this many days.")
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Rows per bulk_create batch.")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.prefix = slugify(options["prefix"]) or "seed"
+        self.chunk = options["chunk_size"]
+        self.now = timezone.now()
+
+        if CustomUser.objects.filter(username__startswith=f"{self.prefix}_").exists():
+            raise CommandError(f"Data with prefix '{self.prefix}' already exists; pass another --prefix.")
+        if min(options["users"], options["products"], options["categories"], options["pincodes"]) < 1:
+            raise CommandError("--users, --products, --categories and --pincodes must be at least 1.")
+
+        started = time.monotonic()
+        with transaction.atomic():
+            self._seed_areas(options["pincodes"])
+            self._seed_users(options["users"], options["riders"])
+            self._seed_categories(options["categories"])
+            self._seed_products(options["products"], options["days"])
+            self._seed_reviews(options["reviews"])
+            self._seed_carts_and_wishlists()
+        self._seed_orders(options["orders"], options["days"])
+
+        call_command("rebuild_order_stats", stdout=self.stdout)
+        delivery_stats.invalidate_staff()
+        service_areas.invalidate()
+
+        self.stdout.write(self.style.SUCCESS(f"Seeded '{self.prefix}' in {time.monotonic() - started:.0f}s."))
+
+    def _log(self, message):
+        self.stdout.write(f"  {message}")
+
+    # ------------------------------------------------------------------
+    def _seed_areas(self, count):
+        zones = [f"Zone {chr(65 + i)}" for i in range(max(1, count // 5))]
+        areas = [
+            ServiceArea(
+                pincode=str(560001 + i), zone=zones[i % len(zones)],
+                delivery_days=1 + i % 3, cod_allowed=i % 7 != 0, fee=Decimal(20 + 10 * (i % 4)),
+            )
+            for i in range(count)
+        ]
+        ServiceArea.objects.bulk_create(areas, ignore_conflicts=True)
+        self.areas = list(
+            ServiceArea.objects.filter(pincode__in=[a.pincode for a in areas]).values_list("pincode", "zone", "fee")
+        )
+        self.zones = sorted({zone for _, zone, _ in self.areas})
+        self._log(f"{len(self.areas)} service areas in {len(self.zones)} zones")
+
+    def _seed_users(self, count, riders):
+        password = make_password(f"{self.prefix}-password")     # hashing once keeps this fast
+        users = [
+            CustomUser(
+                username=f"{self.prefix}_user{i}", email=f"{self.prefix}.user{i}@example.com",
+                password=password, is_verified=True,
+                date_joined=self.now - timedelta(days=self.rng.randint(0, 720)),
+            )
+            for i in range(count)
+        ]
+        users += [
+            CustomUser(
+                username=f"{self.prefix}_rider{i}", email=f"{self.prefix}.rider{i}@example.com",
+                password=password, is_verified=True, is_delivery_boy=True,
+            )
+            for i in range(riders)
+        ]
+        created = CustomUser.objects.bulk_create(users, batch_size=self.chunk)
+        self.customer_ids = [u.id for u in created[:count]]
+        rider_ids = [u.id for u in created[count:]]
+
+        DeliveryProfile.objects.bulk_create([
+            DeliveryProfile(user_id=rider_id, first_name=f"Rider {i}", zones=[self.zones[i % len(self.zones)]])
+            for i, rider_id in enumerate(rider_ids)
+        ])
+        self.riders_by_zone = {}
+        for i, rider_id in enumerate(rider_ids):
+            self.riders_by_zone.setdefault(self.zones[i % len(self.zones)], []).append(rider_id)
+
+        # repeat customers: a few users place most of the orders
+        self.rng.shuffle(self.customer_ids)
+        self.customer_weights = _zipf_weights(len(self.customer_ids), 0.8)
+        self._log(f"{count} customers, {riders} riders")
+
+    def _seed_categories(self, count):
+        """Roots first, then children and grandchildren under random earlier categories."""
+        roots = max(1, count // 5)
+        categories = []
+        depth = {}
+        for i in range(count):
+            word = CATEGORY_WORDS[i % len(CATEGORY_WORDS)]
+            parent = None
+            if i >= roots:
+                candidates = [c for c in categories if depth[c.slug] < 2]
+                parent = self.rng.choice(candidates)
+            category = Category(
+                name=f"{word} {i} ({self.prefix})", slug=f"{self.prefix}-{slugify(word)}-{i}",
+                parent=parent, description=f"All things {word.lower()}.",
+            )
+            depth[category.slug] = 0 if parent is None else depth[parent.slug] + 1
+            # children need their parent's id, so save one level at a time
+            category.save()
+            categories.append(category)
+        # products go to leaves mostly, like a real catalogue
+        parents = {c.parent_id for c in categories if c.parent_id}
+        self.leaf_categories = [c for c in categories if c.id not in parents]
+        self.categories = categories
+        self._log(f"{count} categories ({roots} top level, {len(self.leaf_categories)} leaves)")
+
+    def _seed_products(self, count, days):
+        types = {}
+        for type_name, attributes in PRODUCT_TYPES.items():
+            product_type, _ = ProductType.objects.get_or_create(name=type_name)
+            types[type_name] = (product_type, [
+                (ProductAttribute.objects.get_or_create(
+                    name=attr_name, product_type=product_type,
+                    defaults={"slug": slugify(attr_name), "attribute_type": "choice", "choices": ", ".join(choices)},
+                )[0], choices)
+                for attr_name, choices in attributes.items()
+            ])
+
+        products = []
+        for i in range(count):
+            rng = self.rng
+            category = rng.choice(self.leaf_categories) if rng.random() < 0.85 else rng.choice(self.categories)
+            name = f"{rng.choice(PRODUCT_WORDS)} {rng.choice(PRODUCT_NOUNS)} {i}"
+            price = Decimal(round(rng.lognormvariate(6, 0.8))).quantize(Decimal("1")) + Decimal("0.99")
+            description = f"{name}\nKey Features:\nDurable build\nEasy to use"
+            created_at = self.now - timedelta(days=rng.uniform(0, days * 1.5))
+            products.append(Product(
+                name=name, slug=f"{self.prefix}-{i}-{slugify(name)}", sku=f"{self.prefix}-P{i}",
+                category=category, product_type=types[rng.choice(list(types))][0],
+                description=description, description_html=format_description(description),
+                price=price, old_price=(price * Decimal("1.25")).quantize(Decimal("0.01")) if rng.random() < 0.3 else None,
+                featured=rng.random() < 0.03, available_stock=0 if rng.random() < 0.1 else rng.randint(1, 200),
+                created_at=created_at, updated_at=created_at,
+            ))
+        with explicit_timestamps(Product._meta.get_field("created_at"), Product._meta.get_field("updated_at")):
+            products = Product.objects.bulk_create(products, batch_size=self.chunk)
+
+        images, variants, values = [], [], []
+        type_attributes = {product_type.id: attrs for product_type, attrs in types.values()}
+        for product in products:
+            rng = self.rng
+            for position in range(rng.randint(1, 4)):
+                images.append(ProductImage(
+                    product=product, image=f"{self.prefix}/product-{product.id}-{position}",
+                    alt_text=product.name, order=position, is_primary=position == 0,
+                ))
+            if rng.random() < 0.6:
+                axis, options = rng.choice(VARIANT_AXES)
+                for option in rng.sample(options, rng.randint(2, len(options))):
+                    variants.append(ProductVariant(
+                        product=product, sku=f"{self.prefix}-P{product.id}-{option}",
+                        variant_options={axis: option}, stock=rng.randint(0, 50),
+                        price=product.price + (Decimal(rng.choice([0, 0, 50, 100])) if axis == "size" else 0),
+                    ))
+            for attribute, choices in type_attributes[product.product_type_id]:
+                values.append(ProductAttributeValue(product=product, attribute=attribute, value=rng.choice(choices)))
+
+        ProductImage.objects.bulk_create(images, batch_size=self.chunk)
+        variants = ProductVariant.objects.bulk_create(variants, batch_size=self.chunk)
+        ProductAttributeValue.objects.bulk_create(values, batch_size=self.chunk)
+
+        # (product id, price, [(variant id, price)]), most popular first
+        variants_by_product = {}
+        for variant in variants:
+            variants_by_product.setdefault(variant.product_id, []).append((variant.id, variant.price))
+        self.products = [(p.id, p.price, variants_by_product.get(p.id, [])) for p in products]
+        self.rng.shuffle(self.products)
+        self.product_weights = _zipf_weights(len(self.products), 1.05)
+        self._log(f"{count} products, {len(images)} images, {len(variants)} variants, {len(values)} attribute values")
+
+    def _seed_reviews(self, average):
+        ratings, rating_weights = _table(RATING)
+        reviews = []
+        total = 0
+        # popular products (front of self.products) collect more reviews
+        for rank, (product_id, _, _) in enumerate(self.products):
+            expected = average * 2 / (1 + rank / max(1, len(self.products) / 10))
+            k = min(len(self.customer_ids), int(self.rng.expovariate(1 / expected)) if expected else 0)
+            for user_id in self.rng.sample(self.customer_ids, k):
+                reviews.append(Review(
+                    user_id=user_id, product_id=product_id,
+                    rating=self.rng.choices(ratings, cum_weights=rating_weights)[0],
+                    comment=self.rng.choice(REVIEW_COMMENTS),
+                    created_at=self.now - timedelta(days=self.rng.uniform(0, 365)),
+                ))
+            if len(reviews) >= self.chunk:
+                total += self._flush_reviews(reviews)
+        total += self._flush_reviews(reviews)
+        self._log(f"{total} reviews")
+
+    def _flush_reviews(self, reviews):
+        with explicit_timestamps(Review._meta.get_field("created_at")):
+            Review.objects.bulk_create(reviews, batch_size=self.chunk)
+        count = len(reviews)
+        reviews.clear()
+        return count
+
+    def _seed_carts_and_wishlists(self):
+        carts, wishlists = [], []
+        for user_id in self.customer_ids:
+            rng = self.rng
+            if rng.random() < 0.2:
+                for product_id, _, product_variants in self._pick_products(rng.randint(1, 4)):
+                    variant_id = rng.choice(product_variants)[0] if product_variants else None
+                    carts.append(CartItem(user_id=user_id, product_id=product_id, variant_id=variant_id,
+                                          quantity=rng.choice([1, 1, 1, 2])))
+            if rng.random() < 0.3:
+                for product_id, _, _ in self._pick_products(rng.randint(1, 6)):
+                    wishlists.append(WishlistItem(user_id=user_id, product_id=product_id))
+        CartItem.objects.bulk_create(carts, batch_size=self.chunk)
+        WishlistItem.objects.bulk_create(wishlists, batch_size=self.chunk)
+        self._log(f"{len(carts)} cart lines, {len(wishlists)} wishlist items")
+
+    def _pick_products(self, k):
+        """k distinct products, popular ones more likely."""
+        picked = {}
+        for product in self.rng.choices(self.products, cum_weights=self.product_weights, k=k * 2):
+            picked.setdefault(product[0], product)
+        return list(picked.values())[:k]
+
+    # ------------------------------------------------------------------
+    def _status_for(self, age_days):
+        for max_age, weights in STATUS_BY_AGE:
+            if max_age is None or age_days < max_age:
+                statuses, cum = _table(weights)
+                return self.rng.choices(statuses, cum_weights=cum)[0]
+
+    def _seed_orders(self, count, days):
+        """Orders oldest first (ids grow with time), volume growing towards today."""
+        counts, count_weights = _table(ITEMS_PER_ORDER)
+        quantities, quantity_weights = _table(QUANTITY)
+        timestamp_fields = (Order._meta.get_field("created_at"), OrderStatusEvent._meta.get_field("created_at"))
+        done = items_done = 0
+        started = time.monotonic()
+
+        while done < count:
+            size = min(self.chunk, count - done)
+            rng = self.rng
+            customers = rng.choices(self.customer_ids, cum_weights=self.customer_weights, k=size)
+            orders, lines = [], []
+            for n in range(size):
+                # cumulative volume ~ t^2: the newest days are the busiest
+                position = ((done + n + rng.random()) / count) ** 0.5
+                age_days = days * (1 - position)
+                pincode, zone, fee = rng.choice(self.areas)
+                status = self._status_for(age_days)
+                cod = rng.random() < COD_SHARE
+                riders = self.riders_by_zone.get(zone)
+                assigned = rng.choice(riders) if riders and (status != "Pending pickup" or rng.random() < 0.5) else None
+
+                order_lines = []
+                for product_id, product_price, product_variants in self._pick_products(
+                    rng.choices(counts, cum_weights=count_weights)[0]
+                ):
+                    variant_id, price = rng.choice(product_variants) if product_variants else (None, product_price)
+                    quantity = rng.choices(quantities, cum_weights=quantity_weights)[0]
+                    order_lines.append((product_id, variant_id, quantity, price))
+
+                subtotal = sum(quantity * price for _, _, quantity, price in order_lines)
+                orders.append(Order(
+                    user_id=customers[n],
+                    full_name=f"Customer {customers[n]}",
+                    address=f"{rng.randint(1, 400)}, {rng.choice(['MG Road', 'Market Street', 'Lake View', 'Station Road'])}",
+                    city="Bengaluru", postal_code=pincode, phone_number=f"9{rng.randint(100000000, 999999999)}",
+                    payment_method="COD" if cod else "card/upi",
+                    paid=status == "Delivered" if cod else True,
+                    payment_id=None if cod else f"pay_{self.prefix}{done + n}",
+                    refunded=not cod and status == "Cancelled",
+                    order_status=status, assigned_to_id=assigned,
+                    subtotal=subtotal, item_count=len(order_lines),
+                    delivery_fee=fee, total=subtotal + fee,
+                    created_at=self.now - timedelta(days=age_days),
+                ))
+                lines.append(order_lines)
+
+            with transaction.atomic(), explicit_timestamps(*timestamp_fields):
+                orders = Order.objects.bulk_create(orders, batch_size=self.chunk)
+                items, events = [], []
+                for order, order_lines in zip(orders, lines):
+                    items.extend(
+                        OrderItem(order_id=order.id, product_id=product_id, variant_id=variant_id,
+                                  quantity=quantity, price=price)
+                        for product_id, variant_id, quantity, price in order_lines
+                    )
+                    events.extend(self._status_events(order))
+                OrderItem.objects.bulk_create(items, batch_size=self.chunk)
+                OrderStatusEvent.objects.bulk_create(events, batch_size=self.chunk)
+
+            done += size
+            items_done += len(items)
+            rate = items_done / max(time.monotonic() - started, 0.001)
+            self._log(f"orders {done}/{count}, {items_done} items ({rate:,.0f} items/s)")
+
+    def _status_events(self, order):
+        """The status history a real order would have left behind."""
+        path = {
+            "Out for delivery": ["Out for delivery"],
+            "Delivered": ["Out for delivery", "Delivered"],
+            "Cancelled": ["Cancelled"],
+        }.get(order.order_status, [])
+        events, previous, at = [], "Pending pickup", order.created_at
+        for status in path:
+            at = min(at + timedelta(hours=self.rng.uniform(2, 30)), self.now)
+            cancelled = status == "Cancelled"
+            events.append(OrderStatusEvent(
+                order_id=order.id, from_status=previous, to_status=status,
+                changed_by_id=order.user_id if cancelled else order.assigned_to_id,
+                source=OrderStatusEvent.SOURCE_CUSTOMER if cancelled else OrderStatusEvent.SOURCE_DELIVERY,
+                created_at=at,
+            ))
+            previous = status
+        return events
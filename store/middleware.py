@@ -0,0 +1,26 @@
+# store/middleware.py
+
+from store import anon_cart, badges
+
+
+class AnonymousCartMiddleware:
+    """
+    Persists the cookie cart for logged-out visitors and merges it into the
+    user's CartItem rows on the first request after login.
+
+    Requests without the cookie are untouched (no user lookup, no query).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if anon_cart.COOKIE_NAME in request.COOKIES and request.user.is_authenticated:
+            cart = anon_cart.get_cart(request)
+            if anon_cart.merge_into_user(cart, request.user):
+                badges.invalidate(request)
+            cart.modified = True        # drop the cookie even if nothing merged
+
+        response = self.get_response(request)
+        anon_cart.save_cart(request, response)
+        return response
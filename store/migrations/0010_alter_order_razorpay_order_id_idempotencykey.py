@@ -0,0 +1,51 @@
+# Generated by Django 5.2 on 2026-10-19 16:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def clear_duplicate_razorpay_ids(apps, schema_editor):
+    """Keep the earliest order per razorpay_order_id so the unique index can be built."""
+    Order = apps.get_model('store', 'Order')
+    Order.objects.filter(razorpay_order_id='').update(razorpay_order_id=None)
+
+    seen = set()
+    for pk, rp_id in (
+        Order.objects.exclude(razorpay_order_id__isnull=True)
+        .order_by('id')
+        .values_list('id', 'razorpay_order_id')
+    ):
+        if rp_id in seen:
+            Order.objects.filter(pk=pk).update(razorpay_order_id=None)
+        seen.add(rp_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_pendingpayment'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_duplicate_razorpay_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='order',
+            name='razorpay_order_id',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('content_type', models.CharField(blank=True, default='', max_length=100)),
+                ('location', models.CharField(blank=True, default='', max_length=500)),
+                ('body', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
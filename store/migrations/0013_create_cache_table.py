@@ -0,0 +1,20 @@
+# Creates the DatabaseCache table used when REDIS_URL is not set.
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    # no-op for non-database backends (e.g. Redis)
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_orderdailystats_order_store_order_created_4ba192_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-19 16:46
+
+from django.db import migrations, models
+
+
+def copy_allowed_pincodes(apps, schema_editor):
+    """Seed ServiceArea from the old BusinessNameAndLogo.allowed_pincodes list."""
+    BusinessNameAndLogo = apps.get_model('store', 'BusinessNameAndLogo')
+    ServiceArea = apps.get_model('store', 'ServiceArea')
+
+    business = BusinessNameAndLogo.objects.first()
+    pincodes = {str(p).strip() for p in (business.allowed_pincodes or [])} if business else set()
+    pincodes.discard('')
+    ServiceArea.objects.bulk_create(
+        [ServiceArea(pincode=p) for p in sorted(pincodes)],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_create_cache_table'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServiceArea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('pincode', models.CharField(max_length=10, unique=True)),
+                ('zone', models.CharField(blank=True, default='', max_length=60)),
+                ('delivery_days', models.PositiveSmallIntegerField(default=2)),
+                ('cod_allowed', models.BooleanField(default=True)),
+                ('fee', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+            options={
+                'ordering': ['pincode'],
+            },
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='delivery_fee',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.RunPython(copy_allowed_pincodes, migrations.RunPython.noop),
+    ]
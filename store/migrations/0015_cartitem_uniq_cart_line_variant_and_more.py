@@ -0,0 +1,40 @@
+# Generated by Django 5.2 on 2026-10-19 16:48
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    """Fold duplicate cart rows into the oldest one before adding the constraints."""
+    CartItem = apps.get_model('store', 'CartItem')
+
+    dupes = (
+        CartItem.objects.values('user_id', 'product_id', 'variant_id')
+        .annotate(rows=Count('id'), keep_id=Min('id'), quantity=Sum('quantity'))
+        .filter(rows__gt=1)
+    )
+    for row in dupes:
+        lines = CartItem.objects.filter(
+            user_id=row['user_id'], product_id=row['product_id'], variant_id=row['variant_id'],
+        )
+        lines.filter(id=row['keep_id']).update(quantity=row['quantity'])
+        lines.exclude(id=row['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_servicearea_order_delivery_fee'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('variant__isnull', False)), fields=('user', 'product', 'variant'), name='uniq_cart_line_variant'),
+        ),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('variant__isnull', True)), fields=('user', 'product'), name='uniq_cart_line_no_variant'),
+        ),
+    ]
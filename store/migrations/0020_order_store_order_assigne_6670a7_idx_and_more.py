@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-19 17:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0019_orderstatusevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['assigned_to', 'created_at'], name='store_order_assigne_6670a7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['order_status', 'created_at'], name='store_order_order_s_444491_idx'),
+        ),
+    ]
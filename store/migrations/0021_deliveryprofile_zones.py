@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 17:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0020_order_store_order_assigne_6670a7_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliveryprofile',
+            name='zones',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-19 17:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0021_deliveryprofile_zones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OTPChallenge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('purpose', models.CharField(choices=[('signup', 'Signup'), ('reset', 'Password reset')], max_length=20)),
+                ('email', models.EmailField(max_length=254)),
+                ('code_hash', models.CharField(max_length=64)),
+                ('username', models.CharField(blank=True, default='', max_length=150)),
+                ('password_hash', models.CharField(blank=True, default='', max_length=128)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('purpose', 'email'), name='unique_otp_per_email')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 17:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0022_otpchallenge'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pendingpayment',
+            name='status',
+            field=models.CharField(choices=[('created', 'Created'), ('captured', 'Captured'), ('failed', 'Failed'), ('mismatch', 'Amount mismatch')], default='created', max_length=20),
+        ),
+    ]
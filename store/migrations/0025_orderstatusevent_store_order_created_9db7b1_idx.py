@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-19 17:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0024_idempotencykey_locked_until'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='orderstatusevent',
+            index=models.Index(fields=['created_at'], name='store_order_created_9db7b1_idx'),
+        ),
+    ]
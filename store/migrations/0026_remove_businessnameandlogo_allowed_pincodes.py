@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-19 17:48
+
+from django.db import migrations
+
+
+def copy_allowed_pincodes(apps, schema_editor):
+    """Pincodes added to the old list since 0014 seeded ServiceArea; existing rows are kept as they are."""
+    BusinessNameAndLogo = apps.get_model('store', 'BusinessNameAndLogo')
+    ServiceArea = apps.get_model('store', 'ServiceArea')
+
+    pincodes = set()
+    for allowed in BusinessNameAndLogo.objects.values_list('allowed_pincodes', flat=True):
+        pincodes.update(str(p).strip() for p in (allowed or []))
+    pincodes.discard('')
+    ServiceArea.objects.bulk_create(
+        [ServiceArea(pincode=p) for p in sorted(pincodes)],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0025_orderstatusevent_store_order_created_9db7b1_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_allowed_pincodes, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='businessnameandlogo',
+            name='allowed_pincodes',
+        ),
+    ]
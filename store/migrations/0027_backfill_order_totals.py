@@ -0,0 +1,80 @@
+# Generated by Django 5.2 on 2026-10-19 18:40
+
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+
+CHUNK_SIZE = 1000
+
+
+def backfill_order_totals(apps, schema_editor):
+    """
+    Orders placed before 0011 still have subtotal/item_count/total at 0,
+    so refunds and revenue read them as free. Fill them from their lines
+    (same as manage.py backfill_order_totals) and correct the revenue and
+    item counts of their days in the dashboard rollup.
+    """
+    Order = apps.get_model('store', 'Order')
+    OrderItem = apps.get_model('store', 'OrderItem')
+    OrderDailyStats = apps.get_model('store', 'OrderDailyStats')
+
+    line_total = models.ExpressionWrapper(
+        F('quantity') * F('price'),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+    )
+    missing = Order.objects.filter(item_count=0, items__isnull=False).distinct()
+
+    last_id = 0
+    days = set()
+    while True:
+        orders = list(missing.filter(id__gt=last_id).order_by('id').only('id', 'delivery_fee')[:CHUNK_SIZE])
+        if not orders:
+            break
+
+        totals = {
+            row['order_id']: row
+            for row in OrderItem.objects.filter(order_id__in=[o.id for o in orders])
+            .values('order_id')
+            .annotate(subtotal=Sum(line_total), item_count=Count('id'))
+        }
+        for order in orders:
+            row = totals[order.id]
+            order.subtotal = row['subtotal'] or 0
+            order.item_count = row['item_count']
+            order.total = order.subtotal + order.delivery_fee
+        Order.objects.bulk_update(orders, ['subtotal', 'item_count', 'total'])
+
+        days.update(
+            Order.objects.filter(id__in=[o.id for o in orders])
+            .annotate(day=TruncDate('created_at'))
+            .values_list('day', flat=True)
+        )
+        last_id = orders[-1].id
+
+    if not days:
+        return
+
+    # only revenue and items depend on the totals; days without a rollup
+    # row yet are left to manage.py rebuild_order_stats
+    rows = (
+        Order.objects.annotate(day=TruncDate('created_at'))
+        .filter(day__in=sorted(days))
+        .values('day')
+        .annotate(revenue=Sum('total', filter=Q(paid=True)), items=Sum('item_count'))
+        .order_by('day')
+    )
+    for row in rows:
+        OrderDailyStats.objects.filter(date=row['day']).update(
+            revenue=row['revenue'] or 0, items=row['items'] or 0,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0026_remove_businessnameandlogo_allowed_pincodes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_order_totals, migrations.RunPython.noop),
+    ]
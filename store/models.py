@@ -1,7 +1,10 @@
 # store/models.py
-from django.db import models
+from datetime import datetime, time, timedelta
+
+from django.db import models, transaction
 from django.conf import settings
-from django.db.models import Avg
+from django.db.models import Avg, Count, DateTimeField, DecimalField, ExpressionWrapper, F, Q, Subquery, Sum
+from django.utils import timezone
 from cloudinary.models import CloudinaryField
 from django.utils.text import slugify
 from django.contrib.postgres.fields import JSONField  # If using Postgres. If not, use models.JSONField (Django 3.1+)
@@ -106,7 +109,12 @@ class Product(TimestampedModel):
     def get_primary_image_url(self):
         if self.main_image:
             return getattr(self.main_image, 'url', '')
-        first = self.images.order_by('order').first()
+        if 'images' in getattr(self, '_prefetched_objects_cache', {}):
+            # prefetched (already ordered by Meta.ordering) - no extra query
+            images = self.images.all()
+            first = images[0] if images else None
+        else:
+            first = self.images.order_by('order').first()
         if first:
             return getattr(first.image, 'url', '')
         return ""
@@ -234,6 +242,20 @@ class CustomUser(AbstractUser):
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username"]
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # e.g. last_login updates don't change the delivery staff count
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "is_delivery_boy" in update_fields:
+            from store import delivery_stats
+            delivery_stats.invalidate_staff()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        from store import delivery_stats
+        delivery_stats.invalidate_staff()
+        return result
+
     def __str__(self):
         return f"{self.username} - {self.email}"
 
@@ -245,9 +267,27 @@ class CartItem(TimestampedModel):
     variant = models.ForeignKey(ProductVariant, null=True, blank=True, on_delete=models.SET_NULL)
     quantity = models.PositiveIntegerField(default=1)
     added_at = models.DateTimeField(auto_now_add=True)
-    
+
+    class Meta:
+        # one row per (user, product, variant); NULL variants need their own
+        # constraint because NULLs never collide in a plain unique index
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "product", "variant"],
+                condition=Q(variant__isnull=False),
+                name="uniq_cart_line_variant",
+            ),
+            models.UniqueConstraint(
+                fields=["user", "product"],
+                condition=Q(variant__isnull=True),
+                name="uniq_cart_line_no_variant",
+            ),
+        ]
 
     def subtotal(self):
+        # cart_service.get_snapshot() annotates the line total in SQL
+        if getattr(self, "line_total", None) is not None:
+            return self.line_total
         price = self.variant.display_price() if self.variant else (self.product.price if self.product else 0)
         return price * self.quantity
     def total_price(self):
@@ -294,6 +334,13 @@ ORDER_STATUS_CHOICES = [
     ('Cancelled', 'Cancelled'),
 ]
 
+# quantity * price snapshot of one OrderItem, usable inside Sum()
+ORDER_LINE_TOTAL = models.ExpressionWrapper(
+    F("quantity") * F("price"),
+    output_field=DecimalField(max_digits=12, decimal_places=2),
+)
+
+
 class Order(models.Model):
 
     PAYMENT_METHOD_CHOICES = [
@@ -310,8 +357,8 @@ class Order(models.Model):
     postal_code = models.CharField(max_length=15)
     phone_number = models.CharField(max_length=15)
 
-    razorpay_order_id = models.CharField(max_length=255, blank=True, null=True)
-    payment_id = models.CharField(max_length=255, blank=True, null=True)
+    razorpay_order_id = models.CharField(max_length=255, blank=True, null=True, unique=True)
+    payment_id = models.CharField(max_length=255, blank=True, null=True, db_index=True)
 
     # Refund tracking
     refund_id = models.CharField(max_length=100, null=True, blank=True)
@@ -332,16 +379,170 @@ class Order(models.Model):
         User, on_delete=models.SET_NULL, null=True, blank=True, related_name="delivery_orders"
     )
 
+    # Stored at placement and kept in sync by OrderItem.save()/delete(),
+    # so lists and revenue reports read a column instead of summing items.
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0)
+    delivery_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"]),
+            models.Index(fields=["user", "created_at"]),    # my orders, keyset paged
+            models.Index(fields=["assigned_to", "created_at"]),     # rider dashboard
+            models.Index(fields=["order_status", "created_at"]),
+        ]
+
     def __str__(self):
         return f"Order #{self.pk} by {self.user.username}"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        OrderDailyStats.schedule_refresh(self.created_day())
+        # any edit (address, phone, paid...) can change the rider's route sheet
+        from store import order_feed
+        order_feed.notify(self.pk, self.assigned_to_id)
+
+    def delete(self, *args, **kwargs):
+        day = self.created_day()
+        result = super().delete(*args, **kwargs)
+        OrderDailyStats.schedule_refresh(day)
+        return result
+
+    def created_day(self):
+        return timezone.localtime(self.created_at).date()
+
     def total_amount(self):
-        return sum(item.total_price() for item in self.items.all())
+        return self.total
+
+    def recalculate_totals(self):
+        """Recompute subtotal/item_count/total from the items in one query."""
+        totals = self.items.aggregate(subtotal=Sum(ORDER_LINE_TOTAL), item_count=Count("id"))
+        self.subtotal = totals["subtotal"] or 0
+        self.item_count = totals["item_count"] or 0
+        self.total = self.subtotal + self.delivery_fee
+        Order.objects.filter(pk=self.pk).update(
+            subtotal=self.subtotal,
+            item_count=self.item_count,
+            total=self.total,
+        )
+        OrderDailyStats.schedule_refresh(self.created_day())
+        from store import order_feed
+        order_feed.notify(self.pk, self.assigned_to_id)
 
     def get_delivery_days(self):
-        return 2
+        from store.service_areas import get_delivery_days
+        return get_delivery_days(self.postal_code)
+
+    def set_status(self, new_status, by=None, source=""):
+        """
+        Change order_status, save the order and append an OrderStatusEvent
+        (only when the status actually changes). Other pending field
+        changes on the instance are saved with it.
+        """
+        old_status = self.order_status
+        self.order_status = new_status
+        with transaction.atomic():
+            self.save()
+            if old_status != new_status:
+                OrderStatusEvent.log(self, old_status, new_status, by=by, source=source)
+
+
+
+
+def daily_stats_aggregates():
+    """Conditional aggregates over Order rows that make up one OrderDailyStats row."""
+    return {
+        "orders": Count("id"),
+        "revenue": Sum("total", filter=Q(paid=True)),
+        "items": Sum("item_count"),
+        "cancellations": Count("id", filter=Q(order_status="Cancelled")),
+        "pending": Count("id", filter=Q(order_status="Pending pickup")),
+        "delivered": Count("id", filter=Q(order_status="Delivered")),
+        "cod_orders": Count("id", filter=Q(payment_method="COD")),
+        "prepaid_orders": Count("id", filter=~Q(payment_method="COD")),
+    }
+
+
+class OrderDailyStats(models.Model):
+    """
+    Per-day sales rollup for the admin dashboard.
+    The row for a day is recomputed (one indexed aggregate over that day's
+    orders) after a transaction that saved one of its orders commits, so
+    the dashboard never scans the whole order history. Rebuild with
+    `manage.py rebuild_order_stats`.
+    """
+    date = models.DateField(unique=True)
+    orders = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # paid orders only
+    items = models.PositiveIntegerField(default=0)
+    cancellations = models.PositiveIntegerField(default=0)
+    pending = models.PositiveIntegerField(default=0)
+    delivered = models.PositiveIntegerField(default=0)
+    cod_orders = models.PositiveIntegerField(default=0)
+    prepaid_orders = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        ordering = ["-date"]
+        verbose_name_plural = "Order daily stats"
+
+    @classmethod
+    def schedule_refresh(cls, day):
+        """
+        refresh_day(day) once the current transaction commits (right away
+        outside one). A placement saves its order several times; the day
+        is only queued once per transaction.
+        """
+        connection = transaction.get_connection()
+        if connection.in_atomic_block and any(
+            getattr(func, "stats_day", None) == day and not func.done
+            for _, func, _ in connection.run_on_commit
+        ):
+            return
+
+        def refresh():
+            refresh.done = True
+            cls.refresh_day(day)
+
+        refresh.stats_day = day
+        refresh.done = False
+        transaction.on_commit(refresh)
+
+    @classmethod
+    def refresh_day(cls, day):
+        """
+        Recompute one day. The row is locked before aggregating, so two
+        refreshes for the same day run one after the other and the later
+        one counts every order committed before it - never a stale total.
+        """
+        start = timezone.make_aware(datetime.combine(day, time.min))
+        end = start + timedelta(days=1)
+        with transaction.atomic():
+            stats, _ = cls.objects.select_for_update().get_or_create(date=day)
+            row = (
+                Order.objects.filter(created_at__gte=start, created_at__lt=end)
+                .aggregate(**daily_stats_aggregates())
+            )
+            if not row["orders"]:
+                stats.delete()
+                return None
+            row["revenue"] = row["revenue"] or 0
+            row["items"] = row["items"] or 0
+            for field, value in row.items():
+                setattr(stats, field, value)
+            stats.save()
+        return stats
+
+    @classmethod
+    def refresh_days(cls, days):
+        """schedule_refresh() for each day, e.g. after a queryset .update() that skipped Order.save()."""
+        for day in sorted(set(days)):
+            cls.schedule_refresh(day)
 
+    def __str__(self):
+        return f"{self.date}: {self.orders} orders"
 
 
 class OrderItem(models.Model):
@@ -353,6 +554,16 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)  # snapshot of price at purchase
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.order.recalculate_totals()
+
+    def delete(self, *args, **kwargs):
+        order = self.order
+        result = super().delete(*args, **kwargs)
+        order.recalculate_totals()
+        return result
+
     def total_price(self):
         return self.quantity * self.price
 
@@ -393,6 +604,8 @@ class DeliveryProfile(models.Model):
     phone = models.CharField(max_length=15, blank=True, null=True)
     first_name = models.CharField(max_length=50, blank=True, null=True)
     last_name = models.CharField(max_length=50, blank=True, null=True)
+    # ServiceArea zones this rider covers (auto-assignment); empty = any zone
+    zones = models.JSONField(default=list, blank=True)
 
     def __str__(self):
         return f"{self.user.username} Profile"
@@ -404,7 +617,292 @@ class BusinessNameAndLogo(models.Model):
     address = models.TextField(blank=True, null=True)
     contact_email = models.EmailField(blank=True, null=True)
     contact_phone = models.CharField(max_length=15, blank=True, null=True)
-    allowed_pincodes = models.JSONField(default=list, blank=True, null=True)
+    # serviceable pincodes live in ServiceArea (admin "Service areas")
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        from store import site_settings
+        site_settings.invalidate()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        from store import site_settings
+        site_settings.invalidate()
+        return result
 
     def __str__(self):
         return self.business_name
+
+
+# ======================================================
+# PENDING RAZORPAY PAYMENTS
+# ======================================================
+class PendingPayment(TimestampedModel):
+    """
+    Snapshot of a checkout taken when the Razorpay order is created.
+    Lets the browser callback *or* the webhook build the Order later,
+    even if the customer's tab (and session) is gone by then.
+    """
+    STATUS_CREATED = "created"
+    STATUS_CAPTURED = "captured"
+    STATUS_FAILED = "failed"
+    STATUS_MISMATCH = "mismatch"
+    STATUS_CHOICES = [
+        (STATUS_CREATED, "Created"),
+        (STATUS_CAPTURED, "Captured"),
+        (STATUS_FAILED, "Failed"),
+        (STATUS_MISMATCH, "Amount mismatch"),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="pending_payments")
+    razorpay_order_id = models.CharField(max_length=255, unique=True)
+    payment_id = models.CharField(max_length=255, blank=True, null=True)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+
+    # checkout_info dict from the session + [{product_id, variant_id, quantity, price, cart_item_id}]
+    checkout_info = models.JSONField(default=dict)
+    line_items = models.JSONField(default=list)
+    is_buy_now = models.BooleanField(default=False)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_CREATED)
+    order = models.OneToOneField(Order, null=True, blank=True, on_delete=models.SET_NULL, related_name="pending_payment")
+
+    def __str__(self):
+        return f"{self.razorpay_order_id} ({self.status})"
+
+
+# ======================================================
+# IDEMPOTENCY KEYS (order placement)
+# ======================================================
+class IdempotencyKey(models.Model):
+    """
+    First response for a given key (checkout token / Razorpay order id).
+    The unique key is what makes the claim race-safe across workers;
+    duplicates within the TTL get the stored response replayed.
+    locked_until is the first request's lease on an unfinished key.
+    """
+    key = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.CASCADE)
+
+    # empty until the first request finishes
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    content_type = models.CharField(max_length=100, blank=True, default="")
+    location = models.CharField(max_length=500, blank=True, default="")
+    body = models.TextField(blank=True, default="")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+
+    def is_complete(self):
+        return self.status_code is not None
+
+    def __str__(self):
+        return self.key
+
+
+# ======================================================
+# ONE-TIME PASSWORDS (signup / password reset)
+# ======================================================
+class OTPChallenge(models.Model):
+    """
+    An emailed code waiting to be entered (store.otp). Lives in the DB so
+    any worker can verify what another one sent; the code and the pending
+    signup password are only kept hashed.
+    """
+    PURPOSE_SIGNUP = "signup"
+    PURPOSE_RESET = "reset"
+    PURPOSE_CHOICES = [
+        (PURPOSE_SIGNUP, "Signup"),
+        (PURPOSE_RESET, "Password reset"),
+    ]
+
+    purpose = models.CharField(max_length=20, choices=PURPOSE_CHOICES)
+    email = models.EmailField()
+    code_hash = models.CharField(max_length=64)
+
+    # signup only: applied to the account once the code checks out
+    username = models.CharField(max_length=150, blank=True, default="")
+    password_hash = models.CharField(max_length=128, blank=True, default="")
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["purpose", "email"], name="unique_otp_per_email"),
+        ]
+
+    def __str__(self):
+        return f"{self.purpose}: {self.email}"
+
+
+# ======================================================
+# SERVICEABLE PINCODES
+# ======================================================
+class ServiceArea(TimestampedModel):
+    """
+    One serviceable pincode. Read through store.service_areas, which keeps
+    the whole table in memory per worker; saves invalidate that copy.
+    Bulk load with `manage.py import_service_areas file.csv`.
+    """
+    pincode = models.CharField(max_length=10, unique=True)
+    zone = models.CharField(max_length=60, blank=True, default="")
+    delivery_days = models.PositiveSmallIntegerField(default=2)
+    cod_allowed = models.BooleanField(default=True)
+    fee = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ["pincode"]
+
+    def save(self, *args, **kwargs):
+        self.pincode = str(self.pincode).strip()
+        super().save(*args, **kwargs)
+        from store import service_areas
+        service_areas.invalidate()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        from store import service_areas
+        service_areas.invalidate()
+        return result
+
+    def __str__(self):
+        return f"{self.pincode} ({self.zone or 'default'})"
+
+
+# ======================================================
+# ORDER STATUS HISTORY
+# ======================================================
+class OrderStatusEvent(models.Model):
+    """
+    Append-only log of order status changes, written by Order.set_status()
+    and OrderAdmin. The auto-increment id doubles as a cursor: pollers keep
+    the last id they saw and ask for changes_since(it) - see its docstring
+    for when a cursor can skip an event.
+    """
+    SOURCE_CUSTOMER = "customer"
+    SOURCE_DELIVERY = "delivery"
+    SOURCE_ADMIN_PANEL = "admin_panel"
+    SOURCE_DJANGO_ADMIN = "django_admin"
+    SOURCE_CHOICES = [
+        (SOURCE_CUSTOMER, "Customer"),
+        (SOURCE_DELIVERY, "Delivery"),
+        (SOURCE_ADMIN_PANEL, "Admin dashboard"),
+        (SOURCE_DJANGO_ADMIN, "Django admin"),
+    ]
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="status_events")
+    from_status = models.CharField(max_length=20, blank=True, default="")
+    to_status = models.CharField(max_length=20, choices=ORDER_STATUS_CHOICES)
+    changed_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["order", "created_at"]),
+            models.Index(fields=["created_at"]),    # changes_since(overlap=...)
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("OrderStatusEvent rows are append-only.")
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def log(cls, order, from_status, to_status, by=None, source=""):
+        from store import order_feed
+
+        user = by if by is not None and by.is_authenticated else None
+        event = cls.objects.create(
+            order=order, from_status=from_status or "", to_status=to_status,
+            changed_by=user, source=source,
+        )
+        order_feed.notify(order.pk, order.assigned_to_id)
+        return event
+
+    @classmethod
+    def changes_since(cls, cursor=0, overlap=0, **filters):
+        """
+        Events after `cursor` (an event id), oldest first, e.g.
+        changes_since(last_id, order=order) or changes_since(last_id, order__user=user).
+        Served by the primary key (plus the (order, created_at) index when
+        filtered by order), so polling with an up-to-date cursor is cheap.
+
+        Ids are handed out at INSERT, not at commit. For one order that is
+        fine: set_status() / OrderAdmin save the order row first, so writers
+        to the same order are serialized and commit in id order. Across
+        orders a lower id can commit after a poller already read a higher
+        one; overlap=N also returns events created up to N seconds before
+        the cursor event, and the caller drops the ids it already has.
+        """
+        events = cls.objects.filter(**filters)
+        if cursor and overlap:
+            cursor_at = Subquery(cls.objects.filter(id=cursor).values("created_at")[:1])
+            window_start = ExpressionWrapper(cursor_at - timedelta(seconds=overlap), output_field=DateTimeField())
+            events = events.filter(Q(id__gt=cursor) | Q(created_at__gte=window_start))
+        else:
+            events = events.filter(id__gt=cursor or 0)
+        return events.order_by("id")
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "order_id": self.order_id,
+            "from": self.from_status,
+            "to": self.to_status,
+            "source": self.source,
+            "at": self.created_at.isoformat(),
+        }
+
+    def __str__(self):
+        return f"Order #{self.order_id}: {self.from_status or '—'} → {self.to_status}"
+
+
+# ======================================================
+# REFUND QUEUE (prepaid cancellations)
+# ======================================================
+class RefundRequest(TimestampedModel):
+    """
+    A refund owed for a cancelled prepaid order. Created in the same
+    transaction as the cancellation; `manage.py process_refunds` submits it
+    to Razorpay (store.refund_service) and copies the result onto the Order.
+    """
+    STATUS_PENDING = "pending"
+    STATUS_PROCESSING = "processing"
+    STATUS_SUBMITTED = "submitted"
+    STATUS_PROCESSED = "processed"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_PROCESSING, "Processing"),
+        (STATUS_SUBMITTED, "Submitted"),
+        (STATUS_PROCESSED, "Processed"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name="refund_request")
+    payment_id = models.CharField(max_length=255)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # when a pending job is next due / when a processing lease runs out
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    refund_id = models.CharField(max_length=100, blank=True, default="")
+    last_error = models.TextField(blank=True, default="")
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+
+    def amount_paise(self):
+        return int(self.amount * 100)
+
+    def __str__(self):
+        return f"Refund for order #{self.order_id} ({self.status})"
@@ -0,0 +1,164 @@
+# store/order_feed.py
+"""
+Live order updates for the tracking page and the delivery dashboard.
+
+Every channel ("order:<id>", "delivery:<user id>", "delivery:all") has a
+version token in the shared cache, replaced whenever an order on it
+changes status, is assigned or is placed. Readers never scan orders:
+
+- the SSE streams check the token every POLL_SECONDS and only query
+  OrderStatusEvent (by id cursor) when it moved;
+- the polling endpoints use the token as their ETag, so an unchanged
+  feed answers 304 to If-None-Match without touching the orders.
+
+Delivery channels span many orders, so their events are read with an
+OVERLAP_SECONDS window before the cursor (see
+OrderStatusEvent.changes_since) and streams skip ids they already sent;
+the polling fallback's page script does the same.
+
+Streams are async generators and end after STREAM_SECONDS; EventSource
+reconnects by itself and resumes from Last-Event-ID. Run the site under
+ASGI (see Procfile) so an open stream doesn't pin a worker.
+
+Streams need Redis (REDIS_URL): on the DatabaseCache fallback each open
+tab would cost a query every POLL_SECONDS. Without it streams_enabled()
+is False, the pages use the 30 s polling fallback and the stream
+endpoints answer 204, which tells EventSource not to reconnect.
+"""
+import asyncio
+import json
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import StreamingHttpResponse
+
+KEY_PREFIX = "order_feed:"
+POLL_SECONDS = 2
+HEARTBEAT_SECONDS = 15
+STREAM_SECONDS = 300
+RETRY_MS = 5000
+MAX_EVENTS = 100
+OVERLAP_SECONDS = 5
+
+_UNSET = object()
+
+
+def streams_enabled():
+    """SSE only where a token check is cheap: a Redis default cache."""
+    return settings.CACHES["default"]["BACKEND"].endswith("RedisCache")
+
+
+def order_channel(order_id):
+    return f"order:{order_id}"
+
+
+def delivery_channel(user_id=None):
+    """Channel of one delivery user, or of every order (user_id=None)."""
+    return f"delivery:{user_id or 'all'}"
+
+
+# ======================================================
+# VERSION TOKENS
+# ======================================================
+def version(channel):
+    token = cache.get(KEY_PREFIX + channel)
+    if token is None:
+        cache.add(KEY_PREFIX + channel, str(time.time_ns()), None)
+        token = cache.get(KEY_PREFIX + channel)
+    return token
+
+
+def bump(*channels):
+    token = str(time.time_ns())
+    cache.set_many({KEY_PREFIX + channel: token for channel in channels}, None)
+
+
+def notify(order_id, *delivery_user_ids):
+    """An order changed: move its channel and the delivery channels watching it (after commit)."""
+    channels = [order_channel(order_id), delivery_channel()]
+    channels += [delivery_channel(user_id) for user_id in delivery_user_ids if user_id]
+    transaction.on_commit(lambda: bump(*channels))
+
+
+# ======================================================
+# QUERIES
+# ======================================================
+def order_events(order_id, cursor):
+    from store.models import OrderStatusEvent
+    return list(OrderStatusEvent.changes_since(cursor, order_id=order_id)[:MAX_EVENTS])
+
+
+def delivery_events(user_id, cursor):
+    """Events on the user's assigned orders; user_id=None for every order (single rider setup)."""
+    from store.models import OrderStatusEvent
+    filters = {"order__assigned_to_id": user_id} if user_id else {}
+    return list(OrderStatusEvent.changes_since(cursor, overlap=OVERLAP_SECONDS, **filters)[:MAX_EVENTS])
+
+
+def parse_cursor(value):
+    try:
+        return max(int(value or 0), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+# ======================================================
+# SERVER-SENT EVENTS
+# ======================================================
+def _sse(event, data, event_id=None):
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream(channel, fetch, cursor):
+    """
+    Yield SSE frames for `channel`. fetch(cursor) returns the events after
+    `cursor`; it runs only when the channel's token changed (and once on
+    connect, to catch up from Last-Event-ID).
+    """
+    fetch = sync_to_async(fetch)
+    deadline = time.monotonic() + STREAM_SECONDS
+    last_write = time.monotonic()
+    seen = _UNSET
+    sent = {}           # id -> created_at of events fetch() may return again
+    resumed_at = cursor
+    caught_up = False
+
+    yield f"retry: {RETRY_MS}\n\n"
+    while time.monotonic() < deadline:
+        token = await cache.aget(KEY_PREFIX + channel)
+        if token != seen:
+            events = await fetch(cursor)
+            # the client already has everything up to the cursor it connected with
+            fresh = [e for e in events if e.id not in sent and (caught_up or e.id > resumed_at)]
+            caught_up = True
+            for event in fresh:
+                yield _sse("status", event.as_dict(), event.id)
+            if events:
+                cursor = max(cursor, events[-1].id)
+                sent.update((e.id, e.created_at) for e in events)
+                if cursor in sent:
+                    horizon = sent[cursor] - timedelta(seconds=OVERLAP_SECONDS)
+                    sent = {i: at for i, at in sent.items() if at >= horizon}
+            if not fresh and seen is not _UNSET:
+                # assignment / new order: nothing in the status log, list changed anyway
+                yield _sse("refresh", {"channel": channel})
+            # a full batch may have left more behind: fetch again next tick
+            seen = token if len(events) < MAX_EVENTS else _UNSET
+            last_write = time.monotonic()
+        elif time.monotonic() - last_write >= HEARTBEAT_SECONDS:
+            yield ": ping\n\n"
+            last_write = time.monotonic()
+
+        await asyncio.sleep(POLL_SECONDS)
+
+
+def sse_response(events):
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"      # nginx: don't buffer the stream
+    return response
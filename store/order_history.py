@@ -0,0 +1,116 @@
+# store/order_history.py
+"""
+Customer order history ("My Orders").
+
+The list page shows one card per order built from a summary projection:
+item count and total are the denormalised Order columns, and the first
+item's product name, quantity and thumbnail come from correlated
+subqueries - one query per page, no item or image rows loaded.
+
+Pages are keyset-paginated on (created_at, id) newest first, which the
+(user, created_at) index serves directly however deep the history goes.
+Full item detail is fetched per order only when a card is expanded.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from cloudinary.models import CloudinaryField
+from django.db.models import CharField, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, NullIf
+from django.urls import reverse
+
+from store.models import Order, OrderItem, ProductImage
+
+PAGE_SIZE = 20
+
+
+def encode_cursor(order):
+    micros = int(order.created_at.timestamp() * 1_000_000)
+    return f"{micros}_{order.id}"
+
+
+def decode_cursor(cursor):
+    """(created_at, id) from a cursor string, or None if it is missing / malformed."""
+    try:
+        micros, order_id = cursor.split("_", 1)
+        created_at = datetime.fromtimestamp(int(micros) / 1_000_000, tz=dt_timezone.utc)
+        return created_at, int(order_id)
+    except (AttributeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def summaries(user, cursor=None, limit=PAGE_SIZE):
+    """
+    One page of order summaries, newest first.
+    Returns (orders, next_cursor); next_cursor is None on the last page.
+    """
+    first_item = OrderItem.objects.filter(order=OuterRef("pk")).order_by("id")
+    first_image = ProductImage.objects.filter(product=OuterRef("product_id")).order_by("order", "id")
+    thumbnail = Coalesce(
+        NullIf("product__main_image", Value("")),
+        Subquery(first_image.values("image")[:1]),
+        output_field=CharField(),
+    )
+
+    orders = (
+        Order.objects.filter(user=user)
+        .only("id", "created_at", "order_status", "payment_method", "paid", "total", "item_count")
+        .annotate(
+            first_product_id=Subquery(first_item.values("product_id")[:1], output_field=IntegerField()),
+            first_product_name=Subquery(first_item.values("product__name")[:1], output_field=CharField()),
+            first_quantity=Subquery(first_item.values("quantity")[:1], output_field=IntegerField()),
+            first_thumbnail=Subquery(
+                first_item.annotate(thumb=thumbnail).values("thumb")[:1],
+                output_field=CloudinaryField(),
+            ),
+        )
+        .order_by("-created_at", "-id")
+    )
+
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        created_at, order_id = position
+        orders = orders.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=order_id))
+
+    page = list(orders[:limit + 1])
+    next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+    page = page[:limit]
+    for order in page:
+        order.thumbnail_url = getattr(order.first_thumbnail, "url", "") if order.first_thumbnail else ""
+    return page, next_cursor
+
+
+def item_details(order):
+    """Every line of one order, for the expanded card."""
+    items = (
+        order.items.select_related("product", "variant")
+        .only(
+            "id", "order", "quantity", "price",
+            "product__id", "product__name", "product__slug", "product__main_image",
+            "variant__id", "variant__variant_options",
+        )
+        .order_by("id")
+    )
+    images = {}
+    for image in ProductImage.objects.filter(
+        product_id__in={item.product_id for item in items}
+    ).order_by("-order", "-id").only("product_id", "image"):
+        images[image.product_id] = image        # ends on the lowest `order` per product
+
+    details = []
+    for item in items:
+        product = item.product
+        image = product.main_image or getattr(images.get(product.id), "image", None)
+        details.append({
+            "id": item.id,
+            "product_id": product.id,
+            "name": product.name,
+            "url": reverse("product_detail", args=[product.id, product.slug]),
+            "variant": ", ".join(
+                f"{k}: {v}" for k, v in (item.variant.variant_options or {}).items()
+            ) if item.variant else "",
+            "quantity": item.quantity,
+            "price": str(item.price),
+            "total": str(item.total_price()),
+            "image": getattr(image, "url", "") if image else "",
+        })
+    return details
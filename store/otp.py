@@ -0,0 +1,172 @@
+# store/otp.py
+"""
+Emailed one-time codes for signup and password reset.
+
+    code = otp.issue(OTPChallenge.PURPOSE_SIGNUP, email, request, username=..., password=...)
+    challenge = otp.verify(OTPChallenge.PURPOSE_SIGNUP, email, entered_code)
+
+Challenges are OTPChallenge rows, so the worker that checks a code never
+has to be the one that sent it (try `gunicorn -w 4` locally: every
+verify lands somewhere else). A row holds an HMAC of the code and, for
+signups, the password already run through make_password(); it expires
+after OTP_TTL and is deleted after OTP_MAX_ATTEMPTS wrong guesses or on
+first use. `manage.py purge_otps` sweeps the expired ones.
+
+Sends are throttled in the shared cache: a resend cooldown and an hourly
+cap per email, and an hourly cap per client IP, so a refresh loop can't
+turn into a stream of Brevo calls.
+"""
+import hashlib
+import hmac
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from store.models import OTPChallenge
+
+DEFAULT_TTL = 10 * 60               # seconds a code stays valid
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RESEND_SECONDS = 60
+DEFAULT_EMAIL_PER_HOUR = 5
+DEFAULT_IP_PER_HOUR = 20
+
+KEY_PREFIX = "otp:"
+
+
+class OTPError(Exception):
+    """Base for the errors below; str() is safe to show to the customer."""
+
+
+class Throttled(OTPError):
+    pass
+
+
+class InvalidCode(OTPError):
+    pass
+
+
+class Expired(OTPError):
+    pass
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def ttl():
+    return _setting("OTP_TTL", DEFAULT_TTL)
+
+
+def _normalize(email):
+    return (email or "").strip().lower()
+
+
+def _hash_code(email, code):
+    message = f"{email}:{code}".encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def client_ip(request):
+    """
+    Client address for throttling. Behind OTP_TRUSTED_PROXIES proxies the
+    last hop they appended to X-Forwarded-For is the one to believe.
+    """
+    proxies = _setting("OTP_TRUSTED_PROXIES", 0)
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR", "")
+    if proxies and forwarded:
+        hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+        if len(hops) >= proxies:
+            return hops[-proxies]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+# ======================================================
+# THROTTLES (shared cache)
+# ======================================================
+def _hit(key, limit, window):
+    """Count one event in a fixed window; False once the window's limit is used up."""
+    key = KEY_PREFIX + key
+    cache.add(key, 0, window)
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        # expired between add() and incr()
+        cache.set(key, 1, window)
+        count = 1
+    return count <= limit
+
+
+def _check_throttles(purpose, email, ip):
+    cooldown = f"{KEY_PREFIX}cooldown:{purpose}:{email}"
+    if not cache.add(cooldown, 1, _setting("OTP_RESEND_SECONDS", DEFAULT_RESEND_SECONDS)):
+        raise Throttled("A code was just sent. Please wait a minute before asking again.")
+    try:
+        if not _hit(f"email:{email}", _setting("OTP_EMAIL_PER_HOUR", DEFAULT_EMAIL_PER_HOUR), 60 * 60):
+            raise Throttled("Too many codes requested for this email. Please try again later.")
+        if ip and not _hit(f"ip:{ip}", _setting("OTP_IP_PER_HOUR", DEFAULT_IP_PER_HOUR), 60 * 60):
+            raise Throttled("Too many codes requested. Please try again later.")
+    except Throttled:
+        cache.delete(cooldown)      # nothing was sent, so no cooldown either
+        raise
+
+
+# ======================================================
+# ISSUE / VERIFY
+# ======================================================
+def issue(purpose, email, request, username="", password=""):
+    """
+    Create (or replace) the challenge for purpose/email and return the
+    plain code for the email. Raises Throttled instead of sending again.
+    """
+    email = _normalize(email)
+    _check_throttles(purpose, email, client_ip(request))
+
+    code = f"{secrets.randbelow(10 ** 6):06d}"
+    OTPChallenge.objects.update_or_create(
+        purpose=purpose,
+        email=email,
+        defaults={
+            "code_hash": _hash_code(email, code),
+            "username": username or "",
+            "password_hash": make_password(password) if password else "",
+            "attempts": 0,
+            "expires_at": timezone.now() + timedelta(seconds=ttl()),
+        },
+    )
+    return code
+
+
+def verify(purpose, email, code):
+    """
+    Consume the challenge if `code` matches and return it. Raises Expired
+    (nothing pending / used up) or InvalidCode (wrong guess, attempt counted).
+    """
+    email = _normalize(email)
+    challenge = OTPChallenge.objects.filter(
+        purpose=purpose, email=email, expires_at__gt=timezone.now()
+    ).first()
+    if challenge is None:
+        raise Expired("OTP expired or invalid. Please request a new one.")
+
+    if not hmac.compare_digest(challenge.code_hash, _hash_code(email, (code or "").strip())):
+        OTPChallenge.objects.filter(pk=challenge.pk).update(attempts=F("attempts") + 1)
+        if challenge.attempts + 1 >= _setting("OTP_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS):
+            OTPChallenge.objects.filter(pk=challenge.pk).delete()
+            raise Expired("Too many incorrect attempts. Please request a new OTP.")
+        raise InvalidCode("Incorrect OTP. Please try again.")
+
+    # single use: of two workers verifying at once, only one deletes the row
+    if not OTPChallenge.objects.filter(pk=challenge.pk, code_hash=challenge.code_hash).delete()[0]:
+        raise Expired("OTP expired or invalid. Please request a new one.")
+    return challenge
+
+
+def sweep():
+    """Delete expired challenges. Returns how many."""
+    deleted, _ = OTPChallenge.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
@@ -0,0 +1,223 @@
+# store/payment_service.py
+"""
+Razorpay order finalization shared by the browser callback and the webhook.
+
+Whichever of the two arrives first creates the Order; the other one sees
+the PendingPayment already linked to it and does nothing. The order is
+built from the checkout snapshot at the prices shown at checkout, and
+only if they match what the customer was charged.
+"""
+import logging
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from store import assignment, badges, cart_service
+from store.models import (
+    CartItem,
+    Order,
+    OrderDailyStats,
+    OrderItem,
+    PendingPayment,
+    Product,
+    ProductVariant,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def snapshot_checkout(user, razorpay_order_id, checkout_info, buy_now=None):
+    """Store the checkout (address + lines at their checkout prices) against the Razorpay order id."""
+    snapshot = cart_service.get_snapshot(user, buy_now)
+    line_items = []
+    for line in snapshot:
+        item = {
+            "product_id": line.product_id,
+            "variant_id": line.variant_id,
+            "quantity": line.quantity,
+            "price": str(line.price),
+        }
+        if not snapshot.is_buy_now:
+            item["cart_item_id"] = line.id
+        line_items.append(item)
+
+    pending, _ = PendingPayment.objects.update_or_create(
+        razorpay_order_id=razorpay_order_id,
+        defaults={
+            "user": user,
+            "amount": Decimal(str(checkout_info["total"])),
+            "checkout_info": checkout_info,
+            "line_items": line_items,
+            "is_buy_now": bool(buy_now),
+        },
+    )
+    return pending
+
+
+def _resolve_lines(line_items):
+    """(product, variant, quantity, unit price, cart_item_id) per snapshot line still in the catalogue."""
+    products = Product.objects.in_bulk({line["product_id"] for line in line_items})
+    variants = ProductVariant.objects.in_bulk({line["variant_id"] for line in line_items if line.get("variant_id")})
+
+    resolved = []
+    for line in line_items:
+        product = products.get(line["product_id"])
+        if product is None:
+            continue
+        variant = variants.get(line.get("variant_id"))
+        if "price" in line:
+            price = Decimal(line["price"])
+        else:
+            # snapshot taken before prices were recorded
+            price = variant.display_price() if variant else product.price
+        resolved.append((product, variant, line["quantity"], price, line.get("cart_item_id")))
+    return resolved
+
+
+def take_stock(product, variant, quantity):
+    """Decrement stock in the database (F() expression), so concurrent orders never overwrite each other."""
+    if variant:
+        ProductVariant.objects.filter(pk=variant.pk).update(
+            stock=F("stock") - quantity, updated_at=timezone.now()
+        )
+    else:
+        Product.objects.filter(pk=product.pk).update(
+            available_stock=F("available_stock") - quantity, updated_at=timezone.now()
+        )
+
+
+def finalize_payment(razorpay_order_id, payment_id, captured_paise=None):
+    """
+    Create the Order for a paid Razorpay order exactly once.
+
+    Lines are charged at the unit price recorded at checkout. If they no
+    longer add up to the amount the Razorpay order was created for - or
+    Razorpay reports a different captured amount - no order is created and
+    the PendingPayment is marked "mismatch" for staff to sort out.
+
+    Returns (order, created). order is None if we never saw this
+    Razorpay order (not created through our checkout) or it was flagged.
+    """
+    with transaction.atomic():
+        pending = (
+            PendingPayment.objects.select_for_update()
+            .filter(razorpay_order_id=razorpay_order_id)
+            .first()
+        )
+        if pending is None:
+            return None, False
+
+        if pending.order_id:
+            return pending.order, False
+
+        # Order.razorpay_order_id is unique; an order placed before this
+        # snapshot existed still counts as the finalized one.
+        existing = Order.objects.filter(razorpay_order_id=razorpay_order_id).first()
+        if existing:
+            pending.order = existing
+            pending.status = PendingPayment.STATUS_CAPTURED
+            pending.save(update_fields=["order", "status", "updated_at"])
+            return existing, False
+
+        if pending.status == PendingPayment.STATUS_MISMATCH:
+            return None, False
+
+        info = pending.checkout_info
+        delivery_fee = Decimal(str(info.get("delivery_fee", 0)))
+        lines = _resolve_lines(pending.line_items)
+        expected = sum((price * qty for _, _, qty, price, _ in lines), delivery_fee)
+
+        mismatch = None
+        if expected != pending.amount:
+            mismatch = f"lines add up to {expected}, checkout total {pending.amount}"
+        elif captured_paise is not None and int(captured_paise) != int(pending.amount * 100):
+            mismatch = f"captured {captured_paise} paise, checkout total {pending.amount}"
+        if mismatch:
+            logger.error("Payment amount mismatch for %s (payment %s): %s", razorpay_order_id, payment_id, mismatch)
+            pending.payment_id = payment_id
+            pending.status = PendingPayment.STATUS_MISMATCH
+            pending.save(update_fields=["payment_id", "status", "updated_at"])
+            return None, False
+
+        order = Order.objects.create(
+            user_id=pending.user_id,
+            full_name=info["full_name"],
+            address=info["address"],
+            city=info["city"],
+            postal_code=info["postal_code"],
+            phone_number=info["phone_number"],
+            delivery_fee=delivery_fee,
+            payment_method="card/upi",
+            paid=True,
+            razorpay_order_id=razorpay_order_id,
+            payment_id=payment_id,
+        )
+
+        order_items = []
+        cart_item_ids = []
+        for product, variant, qty, price, cart_item_id in lines:
+            order_items.append(OrderItem(order=order, product=product, variant=variant, quantity=qty, price=price))
+
+            take_stock(product, variant, qty)
+
+            if cart_item_id:
+                cart_item_ids.append(cart_item_id)
+
+        OrderItem.objects.bulk_create(order_items)
+        order.recalculate_totals()
+        assignment.assign_new_order(order)
+
+        if cart_item_ids:
+            CartItem.objects.filter(id__in=cart_item_ids, user_id=pending.user_id).delete()
+            user_id = pending.user_id
+            transaction.on_commit(lambda: badges.invalidate_user(user_id))
+
+        pending.order = order
+        pending.payment_id = payment_id
+        pending.status = PendingPayment.STATUS_CAPTURED
+        pending.save(update_fields=["order", "payment_id", "status", "updated_at"])
+
+    return order, True
+
+
+def mark_payment_failed(razorpay_order_id, payment_id):
+    PendingPayment.objects.filter(
+        razorpay_order_id=razorpay_order_id,
+        order__isnull=True,
+    ).exclude(status=PendingPayment.STATUS_MISMATCH).update(status=PendingPayment.STATUS_FAILED, payment_id=payment_id)
+
+
+def mark_refund_processed(payment_id, refund_id):
+    from store import refund_service
+    orders = Order.objects.filter(payment_id=payment_id)
+    days = [order.created_day() for order in orders.only("created_at")]
+    orders.update(refund_id=refund_id, refunded=True)
+    OrderDailyStats.refresh_days(days)
+    refund_service.mark_processed(payment_id, refund_id)
+
+
+def handle_razorpay_event(event):
+    """
+    Apply one decoded webhook body. Pure DB work, no network, so recorded
+    payloads can be replayed against it directly.
+
+    Returns (order, created) for payment.captured, otherwise (None, False).
+    """
+    name = event.get("event")
+    payload = event.get("payload") or {}
+
+    if name == "payment.captured":
+        payment = payload["payment"]["entity"]
+        return finalize_payment(payment.get("order_id"), payment["id"], payment.get("amount"))
+
+    if name == "payment.failed":
+        payment = payload["payment"]["entity"]
+        mark_payment_failed(payment.get("order_id"), payment["id"])
+
+    elif name == "refund.processed":
+        refund = payload["refund"]["entity"]
+        mark_refund_processed(refund["payment_id"], refund["id"])
+
+    return None, False
@@ -0,0 +1,232 @@
+# store/query_budget.py
+"""
+Per-request query accounting (QueryBudgetMiddleware + connection.execute_wrapper).
+
+With QUERY_BUDGET_ENABLED the middleware wraps every request and records:
+- how many queries ran and their total DB time;
+- duplicate queries, by fingerprint (SQL with literals / IN lists folded),
+  each with where it first ran: the template and line when a template
+  tag triggered it, else the first frame in our own code.
+
+A request over QUERY_BUDGET queries (QUERY_BUDGET_VIEWS overrides it per
+URL name) or QUERY_BUDGET_MS of DB time is printed with its duplicates.
+Per-view totals are kept in process memory and flushed as deltas into
+the shared cache every FLUSH_SECONDS, like store.external's metrics;
+stats() backs the staff-only /metrics/queries/ endpoint.
+
+Disabled, the middleware raises MiddlewareNotUsed at startup, so Django
+drops it from the chain and requests pay nothing.
+"""
+import hashlib
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+DEFAULT_BUDGET = 30
+DEFAULT_BUDGET_MS = 500
+FLUSH_SECONDS = 10
+STATS_KEY = "metrics:queries"
+TOP_DUPLICATES = 10
+
+_IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+
+_BASE_DIR = str(settings.BASE_DIR)
+_TEMPLATE_BASE = os.path.join("django", "template", "base.py")
+
+
+def enabled():
+    return getattr(settings, "QUERY_BUDGET_ENABLED", False)
+
+
+def budget_for(view_name):
+    overrides = getattr(settings, "QUERY_BUDGET_VIEWS", {})
+    return overrides.get(view_name, getattr(settings, "QUERY_BUDGET", DEFAULT_BUDGET))
+
+
+def fingerprint(sql):
+    normalized = _NUMBER.sub("N", _STRING.sub("?", _IN_LIST.sub("IN (...)", sql)))
+    return hashlib.md5(normalized.encode()).hexdigest()[:12], normalized
+
+
+def _origin():
+    """Innermost template node rendering right now, else our closest own frame."""
+    code_line = None
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.endswith(_TEMPLATE_BASE) and frame.f_code.co_name == "render_annotated":
+            node = frame.f_locals.get("self")
+            origin = getattr(node, "origin", None)
+            token = getattr(node, "token", None)
+            if origin is not None and token is not None:
+                return f"{origin.template_name}:{token.lineno}"
+        elif (
+            code_line is None
+            and filename.startswith(_BASE_DIR)
+            and "site-packages" not in filename
+            and not filename.endswith("query_budget.py")
+        ):
+            code_line = f"{os.path.relpath(filename, _BASE_DIR)}:{frame.f_lineno}"
+        frame = frame.f_back
+    return code_line or "?"
+
+
+# ======================================================
+# ONE REQUEST
+# ======================================================
+class QueryRecorder:
+    """execute_wrapper callable; one per request."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints = Counter()
+        self.samples = {}           # fingerprint -> (sql, origin) of its first run
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            key, normalized = fingerprint(sql)
+            if key not in self.samples:
+                self.samples[key] = (normalized[:300], _origin())
+            self.fingerprints[key] += 1
+
+    def duplicates(self):
+        """[(fingerprint, times, sql, origin)] for queries that ran more than once, most first."""
+        return [
+            (key, times, *self.samples[key])
+            for key, times in self.fingerprints.most_common()
+            if times > 1
+        ]
+
+
+# ======================================================
+# AGGREGATE (per process, flushed to the shared cache)
+# ======================================================
+def _empty_view():
+    return {"requests": 0, "queries": 0, "max_queries": 0, "seconds": 0.0,
+            "over_budget": 0, "duplicates": {}}
+
+
+class _Stats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._flushed_at = time.monotonic()
+
+    def observe(self, view_name, recorder, over_budget):
+        with self._lock:
+            view = self._pending.setdefault(view_name, _empty_view())
+            view["requests"] += 1
+            view["queries"] += recorder.count
+            view["max_queries"] = max(view["max_queries"], recorder.count)
+            view["seconds"] += recorder.seconds
+            view["over_budget"] += int(over_budget)
+            for key, times, sql, origin in recorder.duplicates()[:TOP_DUPLICATES]:
+                seen = view["duplicates"].get(key)
+                if seen is None or times > seen["times"]:
+                    view["duplicates"][key] = {"times": times, "sql": sql, "origin": origin}
+            due = time.monotonic() - self._flushed_at >= FLUSH_SECONDS
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushed_at = time.monotonic()
+        if not pending:
+            return
+        try:
+            stored = cache.get(STATS_KEY) or {}
+            for view_name, delta in pending.items():
+                total = stored.setdefault(view_name, _empty_view())
+                for field in ("requests", "queries", "seconds", "over_budget"):
+                    total[field] += delta[field]
+                total["max_queries"] = max(total["max_queries"], delta["max_queries"])
+                merged = {**total["duplicates"]}
+                for key, dup in delta["duplicates"].items():
+                    if key not in merged or dup["times"] > merged[key]["times"]:
+                        merged[key] = dup
+                top = sorted(merged.items(), key=lambda item: -item[1]["times"])[:TOP_DUPLICATES]
+                total["duplicates"] = dict(top)
+            # read-modify-write, same trade-off as store.external's metrics
+            cache.set(STATS_KEY, stored, None)
+        except Exception as e:
+            print("Query stats flush error:", e)
+
+
+_stats = _Stats()
+
+
+def stats():
+    """Per-view totals across workers, heaviest (average queries) first."""
+    _stats.flush()
+    stored = cache.get(STATS_KEY) or {}
+    views = []
+    for view_name, view in stored.items():
+        requests = view["requests"] or 1
+        views.append({
+            "view": view_name,
+            "requests": view["requests"],
+            "avg_queries": round(view["queries"] / requests, 1),
+            "max_queries": view["max_queries"],
+            "avg_db_ms": round(view["seconds"] * 1000 / requests, 1),
+            "over_budget": view["over_budget"],
+            "budget": budget_for(view_name),
+            "duplicates": [{"fingerprint": key, **dup} for key, dup in view["duplicates"].items()],
+        })
+    views.sort(key=lambda v: -v["avg_queries"])
+    return {"enabled": enabled(), "views": views}
+
+
+def reset():
+    _stats.flush()
+    cache.delete(STATS_KEY)
+
+
+# ======================================================
+# MIDDLEWARE
+# ======================================================
+class QueryBudgetMiddleware:
+
+    def __init__(self, get_response):
+        if not enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+
+        match = getattr(request, "resolver_match", None)
+        view_name = (match.view_name if match else None) or request.path
+        budget = budget_for(view_name)
+        max_ms = getattr(settings, "QUERY_BUDGET_MS", DEFAULT_BUDGET_MS)
+        over_budget = recorder.count > budget or recorder.seconds * 1000 > max_ms
+
+        if over_budget:
+            print(
+                f"⚠️ Query budget: {request.method} {request.path} ({view_name}) ran "
+                f"{recorder.count} queries / {recorder.seconds * 1000:.0f} ms (budget {budget} / {max_ms} ms)"
+            )
+            for key, times, sql, origin in recorder.duplicates()[:5]:
+                print(f"    {times}x at {origin}: {sql[:160]}")
+
+        _stats.observe(view_name, recorder, over_budget)
+        return response
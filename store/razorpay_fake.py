@@ -0,0 +1,104 @@
+# store/razorpay_fake.py
+"""
+In-process stand-in for the parts of razorpay.Client the refund and
+reconciliation jobs use.
+
+Enabled with RAZORPAY_FAKE=True (see refund_service.get_client) or passed
+in directly from tests / the `process_refunds --fake` command. Refunds are
+kept in memory, so a second refund for the same payment is rejected the
+way Razorpay does once the captured amount is used up.
+
+Payments for `reconcile_payments --fixture` come from a JSON file holding
+a list of payment entities (or Razorpay's {"items": [...]} collection).
+"""
+import itertools
+import json
+import threading
+import time
+
+from razorpay.errors import BadRequestError, ServerError
+
+
+class _Payments:
+
+    def __init__(self, client):
+        self._client = client
+
+    def refund(self, payment_id, data=None, **kwargs):
+        return self._client._create_refund(payment_id, data or {})
+
+    def all(self, data=None, **kwargs):
+        """GET /payments with from / to (unix seconds), count and skip."""
+        data = data or {}
+        start = int(data.get("from", 0))
+        end = int(data.get("to", 2 ** 63))
+        count = min(int(data.get("count", 10)), 100)
+        skip = int(data.get("skip", 0))
+
+        # newest first, like the real API
+        matching = sorted(
+            (p for p in self._client.payments if start <= p.get("created_at", 0) <= end),
+            key=lambda p: p.get("created_at", 0),
+            reverse=True,
+        )
+        items = matching[skip:skip + count]
+        return {"entity": "collection", "count": len(items), "items": items}
+
+    def fetch_multiple_refund(self, payment_id, data=None, **kwargs):
+        items = [r for r in self._client.refunds.values() if r["payment_id"] == payment_id]
+        return {"entity": "collection", "count": len(items), "items": items}
+
+
+class FakeRazorpayClient:
+    """
+    fail_times: the first N refund calls raise ServerError (retry path).
+    latency: seconds each call sleeps, to exercise the concurrency limit.
+    """
+
+    def __init__(self, fail_times=0, latency=0.0, captured=None, payments=None):
+        self.refunds = {}
+        self.payments = list(payments or [])
+        self.captured = captured or {}      # payment_id -> paise; unlimited if missing
+        self.fail_times = fail_times
+        self.latency = latency
+        self.calls = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.payment = _Payments(self)
+
+    @classmethod
+    def from_fixture(cls, path, **kwargs):
+        with open(path, encoding="utf-8") as fh:
+            data = json.load(fh)
+        payments = data.get("items", []) if isinstance(data, dict) else data
+        return cls(payments=payments, **kwargs)
+
+    def _create_refund(self, payment_id, data):
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self._lock:
+            self.calls += 1
+            if self.fail_times > 0:
+                self.fail_times -= 1
+                raise ServerError("Simulated Razorpay outage")
+
+            amount = int(data.get("amount", 0))
+            already = sum(r["amount"] for r in self.refunds.values() if r["payment_id"] == payment_id)
+            limit = self.captured.get(payment_id)
+            if limit is not None and already + amount > limit:
+                raise BadRequestError("The total refund amount is greater than the refund payment amount")
+
+            refund_id = f"rfnd_fake{next(self._ids):06d}"
+            refund = {
+                "id": refund_id,
+                "entity": "refund",
+                "payment_id": payment_id,
+                "amount": amount,
+                "receipt": data.get("receipt"),
+                "notes": data.get("notes") or {},
+                "speed_requested": data.get("speed", "normal"),
+                "status": "processed",
+            }
+            self.refunds[refund_id] = refund
+            return refund
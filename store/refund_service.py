@@ -0,0 +1,248 @@
+# store/refund_service.py
+"""
+Refund queue for cancelled prepaid orders.
+
+cancel_order only records a RefundRequest (same transaction as the status
+change). `manage.py process_refunds` claims due requests, submits them to
+Razorpay on a small thread pool, retries transient failures with backoff,
+and copies refund_id / refunded back onto the Order.
+
+Claims use SELECT ... FOR UPDATE SKIP LOCKED plus a lease (next_attempt_at
+on a "processing" row), so several workers can run side by side and a job
+whose worker died is picked up again once the lease runs out. Before a
+retry - or a re-claim of a lapsed lease, which has no attempt recorded -
+we ask Razorpay for refunds already made on the payment, and again when
+Razorpay rejects a refund, so a crash between Razorpay accepting the
+refund and us saving it never refunds twice or ends up as "failed".
+"""
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import razorpay
+from decouple import config
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from razorpay.errors import BadRequestError
+
+from store import external
+from store.models import Order, RefundRequest
+
+LEASE_SECONDS = 300
+BACKOFF_BASE_SECONDS = 60
+BACKOFF_MAX_SECONDS = 60 * 60
+
+_fake_client = None
+
+
+def get_client():
+    """Razorpay client for refunds, or the in-memory stand-in when RAZORPAY_FAKE is set."""
+    global _fake_client
+    if getattr(settings, "RAZORPAY_FAKE", False):
+        if _fake_client is None:
+            from store.razorpay_fake import FakeRazorpayClient
+            _fake_client = FakeRazorpayClient()
+        return _fake_client
+    # same account cancel_order refunded through before the queue existed
+    return razorpay.Client(auth=(config("RAZORPAY_KEY_ID_TEST"), config("RAZORPAY_KEY_SECRET_TEST")))
+
+
+def _max_attempts():
+    return getattr(settings, "REFUND_MAX_ATTEMPTS", 6)
+
+
+def _receipt(refund):
+    return f"order-{refund.order_id}"
+
+
+# ======================================================
+# ENQUEUE (called from cancel_order)
+# ======================================================
+def queue_refund(order):
+    """Record the refund owed for a prepaid order. Call inside the cancel transaction."""
+    refund, _ = RefundRequest.objects.get_or_create(
+        order=order,
+        defaults={"payment_id": order.payment_id or "", "amount": order.total},
+    )
+    return refund
+
+
+# ======================================================
+# WORKER
+# ======================================================
+def claim_due(limit):
+    """Lock up to `limit` due requests and lease them to this worker."""
+    now = timezone.now()
+    with transaction.atomic():
+        due = list(
+            RefundRequest.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=RefundRequest.STATUS_PENDING) | Q(status=RefundRequest.STATUS_PROCESSING),
+                next_attempt_at__lte=now,
+            )
+            .order_by("next_attempt_at")[:limit]
+        )
+        # decided before the update below: a "processing" row is a lapsed
+        # lease, and its worker may have got as far as Razorpay
+        for refund in due:
+            refund.resumed = refund.status == RefundRequest.STATUS_PROCESSING or refund.attempts > 0
+        RefundRequest.objects.filter(id__in=[r.id for r in due]).update(
+            status=RefundRequest.STATUS_PROCESSING,
+            next_attempt_at=now + timedelta(seconds=LEASE_SECONDS),
+        )
+    return due
+
+
+def _existing_refund(refund, client):
+    """A refund Razorpay already holds for this order (from an earlier, unrecorded attempt)."""
+    result = external.call(
+        "razorpay", "payment.fetch_refunds", client.payment.fetch_multiple_refund,
+        refund.payment_id, idempotent=True,
+    )
+    for item in result.get("items", []):
+        notes = item.get("notes") or {}
+        if item.get("receipt") == _receipt(refund) or str(notes.get("order_id")) == str(refund.order_id):
+            return item
+    return None
+
+
+def _call_razorpay(refund, client):
+    """Network part of a submission - no DB access, safe to run on the pool. Returns (result, error)."""
+    try:
+        # rows that didn't come through claim_due() are checked as well
+        existing = _existing_refund(refund, client) if getattr(refund, "resumed", True) else None
+        if existing:
+            return existing, None
+        try:
+            result = external.call("razorpay", "payment.refund", client.payment.refund, refund.payment_id, {
+                "amount": refund.amount_paise(),
+                "speed": "normal",
+                "receipt": _receipt(refund),
+                "notes": {"order_id": str(refund.order_id)},
+            })
+        except BadRequestError:
+            # "already fully refunded" may be our own earlier, unrecorded refund
+            existing = _existing_refund(refund, client)
+            if existing:
+                return existing, None
+            raise
+        return result, None
+    except Exception as e:
+        return None, e
+
+
+def record(refund, result, error):
+    """Store the outcome of _call_razorpay(). Returns the new status."""
+    if error is not None:
+        return _record_failure(refund, error)
+    return _record_success(refund, result)
+
+
+def submit(refund, client):
+    """Submit one claimed request. Returns the new status."""
+    return record(refund, *_call_razorpay(refund, client))
+
+
+def _record_success(refund, result):
+    refund.refund_id = result.get("id", "")
+    refund.status = (
+        RefundRequest.STATUS_PROCESSED if result.get("status") == "processed"
+        else RefundRequest.STATUS_SUBMITTED
+    )
+    refund.attempts += 1
+    refund.last_error = ""
+
+    with transaction.atomic():
+        refund.save(update_fields=["refund_id", "status", "attempts", "last_error", "updated_at"])
+        Order.objects.filter(pk=refund.order_id).update(refund_id=refund.refund_id, refunded=True)
+
+    send_refund_email(refund)
+    return refund.status
+
+
+def _record_failure(refund, error):
+    print("Refund Error:", refund.order_id, error)
+
+    refund.attempts += 1
+    refund.last_error = str(error)[:2000]
+    # 4xx from Razorpay (bad payment id, nothing left to refund...) won't fix itself
+    if isinstance(error, BadRequestError) or refund.attempts >= _max_attempts():
+        refund.status = RefundRequest.STATUS_FAILED
+    else:
+        delay = min(BACKOFF_BASE_SECONDS * 2 ** (refund.attempts - 1), BACKOFF_MAX_SECONDS)
+        refund.status = RefundRequest.STATUS_PENDING
+        refund.next_attempt_at = timezone.now() + timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+    refund.save(update_fields=["attempts", "last_error", "status", "next_attempt_at", "updated_at"])
+    return refund.status
+
+
+def run_batch(client=None, concurrency=None):
+    """
+    Claim and submit one batch; at most `concurrency` Razorpay calls in flight.
+    Returns {status: count}.
+    """
+    client = client or get_client()
+    concurrency = concurrency or getattr(settings, "REFUND_CONCURRENCY", 4)
+
+    claimed = claim_due(concurrency)
+    if not claimed:
+        return {}
+
+    # Razorpay calls run in parallel; DB writes stay on this thread's connection
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(lambda r: _call_razorpay(r, client), claimed))
+    statuses = [record(refund, *outcome) for refund, outcome in zip(claimed, outcomes)]
+
+    summary = {}
+    for status in statuses:
+        summary[status] = summary.get(status, 0) + 1
+    return summary
+
+
+def mark_processed(payment_id, refund_id):
+    """refund.processed webhook: Razorpay has paid the money back."""
+    RefundRequest.objects.filter(payment_id=payment_id).exclude(
+        status=RefundRequest.STATUS_FAILED
+    ).update(status=RefundRequest.STATUS_PROCESSED, refund_id=refund_id, updated_at=timezone.now())
+
+
+# ======================================================
+# 📩 CUSTOMER EMAIL
+# ======================================================
+def send_refund_email(refund):
+    from store.email_service import send_brevo_email
+
+    order = Order.objects.select_related("user").get(pk=refund.order_id)
+    customer_email = order.user.email
+    if not customer_email:
+        return
+
+    html_msg = f"""
+    <div style='font-family:Arial;padding:20px;background:#fff7e6;'>
+        <h2 style='color:#d9534f;'>Order Cancelled — #{order.id}</h2>
+        <p>Hello <strong>{order.full_name}</strong>,</p>
+        <p>Your prepaid order has been successfully cancelled.</p>
+        <p>Refund of <strong>₹{refund.amount}</strong> has been initiated.</p>
+        <p>It will be credited back to your original payment method within
+        <strong>2–7 working days</strong> by Razorpay.</p>
+        <p>Thank you for shopping with us!</p>
+    </div>
+    """
+
+    text_msg = (
+        f"Order #{order.id} cancelled.\n"
+        f"Refund ₹{refund.amount} initiated and will be credited within 2–7 working days."
+    )
+
+    try:
+        send_brevo_email(
+            to=customer_email,
+            subject=f"Order Cancelled — #{order.id}",
+            html_content=html_msg,
+            text_content=text_msg,
+        )
+    except Exception as e:
+        print("Refund email error:", e)
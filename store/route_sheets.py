@@ -0,0 +1,115 @@
+# store/route_sheets.py
+"""
+Route sheets: a rider's open orders grouped into stops by pincode, then
+ordered by address, with every item and product image loaded up front.
+
+build() costs three queries whatever the number of orders (orders +
+customers, items + products + variants, images). The same Sheet renders
+the printable page and the JSON manifest; both carry the rider's live-feed
+token (order_feed) as ETag, so a phone that already holds the sheet gets
+a 304 until an order on it changes.
+"""
+from itertools import groupby
+
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from store import delivery_stats, order_feed, service_areas
+from store.models import OrderItem, ProductImage
+
+OPEN_STATUSES = ("Pending pickup", "Out for delivery")
+NO_IMAGE = "/static/images/no-image.png"
+
+
+class Stop:
+
+    def __init__(self, pincode, orders):
+        self.pincode = pincode
+        area = service_areas.lookup(pincode)
+        self.zone = area.zone if area else ""
+        self.orders = orders
+
+    @property
+    def cash_due(self):
+        return sum((amount_due(order) for order in self.orders), 0)
+
+
+class Sheet:
+
+    def __init__(self, rider, stops):
+        self.rider = rider
+        self.stops = stops
+        self.generated_at = timezone.now()
+
+    @property
+    def order_count(self):
+        return sum(len(stop.orders) for stop in self.stops)
+
+    @property
+    def cash_due(self):
+        return sum((stop.cash_due for stop in self.stops), 0)
+
+
+def amount_due(order):
+    """Cash the rider collects at the door."""
+    return order.total if order.payment_method == "COD" and not order.paid else 0
+
+
+def etag(user):
+    return f"{user.id}-{order_feed.version(order_feed.delivery_channel(delivery_stats.scope(user)))}"
+
+
+def build(user):
+    orders = (
+        delivery_stats.orders_for(user)
+        .filter(order_status__in=OPEN_STATUSES)
+        .select_related("user")
+        .prefetch_related(
+            Prefetch("items", queryset=OrderItem.objects.select_related("product", "variant").order_by("id")),
+            Prefetch("items__product__images", queryset=ProductImage.objects.only("id", "product_id", "image", "order")),
+        )
+        .order_by("postal_code", "address", "id")
+    )
+    stops = [Stop(pincode, list(group)) for pincode, group in groupby(orders, key=lambda o: o.postal_code)]
+    return Sheet(user, stops)
+
+
+def manifest(sheet):
+    """Compact JSON-ready dict of the sheet (no images)."""
+    return {
+        "rider": sheet.rider.username,
+        "generated_at": sheet.generated_at.isoformat(),
+        "orders": sheet.order_count,
+        "cash_due": str(sheet.cash_due),
+        "stops": [
+            {
+                "pincode": stop.pincode,
+                "zone": stop.zone,
+                "orders": [
+                    {
+                        "id": order.id,
+                        "status": order.order_status,
+                        "name": order.full_name,
+                        "phone": order.phone_number,
+                        "address": order.address,
+                        "city": order.city,
+                        "payment": order.payment_method,
+                        "paid": order.paid,
+                        "due": str(amount_due(order)),
+                        "items": [
+                            [item.product.name, _variant_label(item.variant), item.quantity]
+                            for item in order.items.all()
+                        ],
+                    }
+                    for order in stop.orders
+                ],
+            }
+            for stop in sheet.stops
+        ],
+    }
+
+
+def _variant_label(variant):
+    if variant is None:
+        return ""
+    return ", ".join(f"{k}: {v}" for k, v in (variant.variant_options or {}).items()) or variant.sku or ""
@@ -0,0 +1,74 @@
+# store/service_areas.py
+"""
+In-memory registry of serviceable pincodes (ServiceArea table).
+
+Lookups are a dict hit; the table is loaded once per worker and reloaded
+when a ServiceArea is saved (see cache_utils.VersionedLocalCache).
+"""
+from collections import namedtuple
+from decimal import Decimal
+
+from django.conf import settings
+
+from store.cache_utils import VersionedLocalCache
+
+DEFAULT_DELIVERY_DAYS = 2
+
+Area = namedtuple("Area", ["pincode", "zone", "delivery_days", "cod_allowed", "fee"])
+
+
+class Registry:
+
+    def __init__(self, areas):
+        self.by_pincode = {a.pincode: a for a in areas}
+        self.pincodes = frozenset(self.by_pincode)
+
+    def lookup(self, pincode):
+        return self.by_pincode.get(normalize(pincode))
+
+
+def normalize(pincode):
+    return str(pincode or "").strip()
+
+
+def _load():
+    from store.models import ServiceArea
+    rows = (
+        ServiceArea.objects.filter(is_active=True)
+        .values_list("pincode", "zone", "delivery_days", "cod_allowed", "fee")
+    )
+    return Registry(Area(*row) for row in rows)
+
+
+_cache = VersionedLocalCache(
+    "service_areas:version",
+    _load,
+    recheck_seconds=lambda: getattr(settings, "SITE_SETTINGS_RECHECK_SECONDS", 30),
+)
+
+
+def get_registry():
+    return _cache.get()
+
+
+def lookup(pincode):
+    """Area for a pincode, or None if we don't deliver there."""
+    return get_registry().lookup(pincode)
+
+
+def is_serviceable(pincode):
+    return normalize(pincode) in get_registry().pincodes
+
+
+def get_delivery_days(pincode):
+    area = lookup(pincode)
+    return area.delivery_days if area else DEFAULT_DELIVERY_DAYS
+
+
+def get_delivery_fee(pincode):
+    area = lookup(pincode)
+    return area.fee if area else Decimal("0")
+
+
+def invalidate():
+    _cache.invalidate()
@@ -0,0 +1,78 @@
+# store/session_store.py
+"""
+Session engine (SESSION_ENGINE = "store.session_store").
+
+Django's cached_db store - reads come from the shared cache, writes go to
+django_session and the cache together - with SESSION_SAVE_EVERY_REQUEST
+off, so a request that doesn't change its session writes nothing.
+Anonymous visitors browsing the catalogue have no session at all (the
+cart lives in a cookie) and are never saved.
+
+Without the per-request save, an active user's expiry would no longer
+slide forward, so each save stamps the time into the session and load()
+marks the session modified once less than SESSION_REFRESH_WITHIN seconds
+of its lifetime are left; SessionMiddleware then saves it and re-sends
+the cookie. A user who visits daily costs one write every
+(age - SESSION_REFRESH_WITHIN) instead of one per page view.
+
+clear_expired() (used by `manage.py clearsessions` and
+`manage.py purge_sessions`) deletes in primary-key batches so the
+cleanup never holds one long lock on the table.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.utils import timezone
+
+SAVED_AT_KEY = "_session_saved_at"
+DEFAULT_REFRESH_WITHIN = 24 * 60 * 60
+DEFAULT_CLEANUP_BATCH = 1000
+
+
+class SessionStore(CachedDBStore):
+
+    def load(self):
+        data = super().load()
+        if self._needs_refresh(data):
+            self.modified = True
+        return data
+
+    def save(self, must_create=False):
+        self._session[SAVED_AT_KEY] = int(time.time())
+        super().save(must_create=must_create)
+
+    @staticmethod
+    def _needs_refresh(data):
+        if not data:
+            return False
+        saved_at = data.get(SAVED_AT_KEY)
+        if saved_at is None:
+            return True         # written before this engine; stamp it once
+
+        expiry = data.get("_session_expiry")
+        if expiry is None or expiry == 0:
+            age = settings.SESSION_COOKIE_AGE
+        elif isinstance(expiry, int):
+            age = expiry
+        else:
+            return False        # fixed expiry date: saving wouldn't move it
+
+        refresh_within = getattr(settings, "SESSION_REFRESH_WITHIN", DEFAULT_REFRESH_WITHIN)
+        return time.time() - saved_at >= age - refresh_within
+
+    @classmethod
+    def clear_expired(cls, batch_size=DEFAULT_CLEANUP_BATCH, pause=0):
+        """Delete expired sessions batch_size rows at a time. Returns how many."""
+        model = cls.get_model_class()
+        deleted = 0
+        while True:
+            keys = list(
+                model.objects.filter(expire_date__lt=timezone.now())
+                .values_list("session_key", flat=True)[:batch_size]
+            )
+            if not keys:
+                return deleted
+            deleted += model.objects.filter(session_key__in=keys).delete()[0]
+            if pause:
+                time.sleep(pause)
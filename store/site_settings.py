@@ -0,0 +1,46 @@
+# store/site_settings.py
+"""
+Cached access to the single BusinessNameAndLogo row.
+
+Every worker keeps its own copy in memory (see cache_utils); saving the
+row bumps the shared version key so the others reload within
+SITE_SETTINGS_RECHECK_SECONDS.
+"""
+from django.conf import settings
+
+from store.cache_utils import VersionedLocalCache
+
+DEFAULT_RECHECK_SECONDS = 30
+
+
+class SiteSettings:
+    """Read-only snapshot of BusinessNameAndLogo."""
+
+    def __init__(self, business):
+        self.business = business
+        self.business_name = business.business_name if business else None
+
+
+def _load():
+    from store.models import BusinessNameAndLogo
+    return SiteSettings(BusinessNameAndLogo.objects.first())
+
+
+_cache = VersionedLocalCache(
+    "site_settings:version",
+    _load,
+    recheck_seconds=lambda: getattr(settings, "SITE_SETTINGS_RECHECK_SECONDS", DEFAULT_RECHECK_SECONDS),
+)
+
+
+def get_site_settings():
+    return _cache.get()
+
+
+def get_business():
+    """The BusinessNameAndLogo instance (or None) — what templates expect."""
+    return get_site_settings().business
+
+
+def invalidate():
+    _cache.invalidate()
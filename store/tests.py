@@ -1,3 +1,811 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import io
+import json
+from datetime import timedelta
+from decimal import Decimal
+from collections import namedtuple
+from itertools import count
+from unittest import mock
 
-# Create your tests here.
+import cloudinary.uploader
+from cloudinary.exceptions import Error as CloudinaryError
+from urllib3.exceptions import NewConnectionError
+from django.core.cache import cache
+from django.db import transaction
+from django.contrib.auth.hashers import check_password
+from django.contrib.auth.models import AnonymousUser
+from django.core import signing
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from store import anon_cart, assignment, badges, external, idempotency, otp, payment_service, refund_service
+from store.middleware import AnonymousCartMiddleware
+from store.models import (
+    CartItem,
+    Category,
+    CustomUser,
+    DeliveryProfile,
+    IdempotencyKey,
+    Order,
+    OrderDailyStats,
+    OrderItem,
+    OTPChallenge,
+    PendingPayment,
+    Product,
+    ProductAttribute,
+    ProductAttributeValue,
+    ProductImage,
+    ProductType,
+    ProductVariant,
+    RefundRequest,
+    Review,
+    ServiceArea,
+    WishlistItem,
+)
+
+from store.razorpay_fake import FakeRazorpayClient
+
+_seq = count(1)
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+# ======================================================
+# SEED DATA
+# ======================================================
+def seed_catalog(scale, customer, rider, reviewers):
+    """
+    Add `scale` units of a representative store: per unit one parent
+    category with two children, six products (images, variants, an
+    attribute value, reviews), six orders for `customer` assigned to
+    `rider` with two lines each, and a cart / wishlist line.
+    """
+    product_type, _ = ProductType.objects.get_or_create(name="Apparel")
+    size, _ = ProductAttribute.objects.get_or_create(name="Material", product_type=product_type)
+
+    for _ in range(scale):
+        n = next(_seq)
+        parent = Category.objects.create(name=f"Parent {n}")
+        children = [Category.objects.create(name=f"Child {n}-{i}", parent=parent) for i in range(2)]
+
+        products = []
+        for i in range(6):
+            product = Product.objects.create(
+                name=f"Product {n}-{i}",
+                category=children[i % 2] if i % 3 else parent,
+                product_type=product_type,
+                price=Decimal("100.00") + i,
+                old_price=Decimal("150.00"),
+                featured=i == 0,
+            )
+            products.append(product)
+            for position in range(2):
+                ProductImage.objects.create(product=product, image=f"products/p{n}-{i}-{position}")
+            for label in ("S", "M"):
+                ProductVariant.objects.create(
+                    product=product, sku=f"SKU-{n}-{i}-{label}",
+                    variant_options={"size": label}, price=product.price, stock=10,
+                )
+            ProductAttributeValue.objects.create(product=product, attribute=size, value="Cotton")
+            for reviewer in reviewers:
+                Review.objects.create(user=reviewer, product=product, rating=4, comment="Nice")
+
+        now = timezone.now()
+        for i in range(6):
+            order = Order.objects.create(
+                user=customer,
+                full_name="Test Customer",
+                address=f"{i} Market Road",
+                city="Town",
+                postal_code="560001",
+                phone_number="9876543210",
+                payment_method="COD" if i % 2 else "card/upi",
+                paid=not i % 2,
+                assigned_to=rider,
+            )
+            for product in products[i % 3:i % 3 + 2]:
+                OrderItem.objects.create(
+                    order=order, product=product, variant=product.variants.first(),
+                    quantity=1, price=product.price,
+                )
+            order.recalculate_totals()
+            if i == 0:
+                order.set_status("Delivered", by=rider)
+            Order.objects.filter(pk=order.pk).update(created_at=now - timedelta(hours=i))
+
+        CartItem.objects.create(user=customer, product=products[1], variant=products[1].variants.first(), quantity=2)
+        WishlistItem.objects.create(user=customer, product=products[2])
+
+
+# ======================================================
+# QUERY BUDGETS PER VIEW
+# ======================================================
+@override_settings(CACHES=LOCMEM_CACHE, AUTO_ASSIGN_ORDERS=False, QUERY_BUDGET_ENABLED=False)
+class ViewQueryBudgetTests(TestCase):
+    """
+    Each page runs a fixed number of queries, measured on a warm worker
+    (per-process caches filled, session already saved), and the number
+    stays the same when the data grows tenfold. If a change legitimately
+    needs another query, raise the budget in the same commit.
+    """
+
+    GROWTH = 9      # units added on top of the first one: 10x data
+
+    def setUp(self):
+        cache.clear()
+        for target in (
+            "store.email_service.send_brevo_email",
+            "razorpay.Client",
+            "cloudinary.uploader.upload",
+        ):
+            patcher = mock.patch(target)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.customer = CustomUser.objects.create_user(username="customer", email="customer@example.com", password="x")
+        self.staff = CustomUser.objects.create_user(username="staff", email="staff@example.com", password="x", is_staff=True)
+        self.rider = CustomUser.objects.create_user(
+            username="rider", email="rider@example.com", password="x", is_delivery_boy=True,
+        )
+        DeliveryProfile.objects.create(user=self.rider, zones=["Central"])
+        ServiceArea.objects.create(pincode="560001", zone="Central", fee=Decimal("30.00"))
+        self.reviewers = [
+            CustomUser.objects.create_user(username=f"reviewer{i}", email=f"reviewer{i}@example.com", password="x")
+            for i in range(2)
+        ]
+        seed_catalog(1, self.customer, self.rider, self.reviewers)
+
+    def grow(self):
+        seed_catalog(self.GROWTH, self.customer, self.rider, self.reviewers)
+
+    # ------------------------------------------------------------------
+    def customer_client(self):
+        self.client.force_login(self.customer)
+        return self.client
+
+    def admin_client(self):
+        self.client.force_login(self.staff)
+        session = self.client.session
+        session["admin_verified"] = True
+        session.save()
+        return self.client
+
+    def delivery_client(self):
+        self.client.force_login(self.rider)
+        session = self.client.session
+        session["delivery_verified"] = True
+        session.save()
+        self.client.cookies["delivery_tab_verified"] = "yes"
+        return self.client
+
+    def assertQueryBudget(self, budget, client, url):
+        """`url` takes exactly `budget` queries, before and after the data grows 10x."""
+        for grown in (False, True):
+            if grown:
+                self.grow()
+            target = url() if callable(url) else url
+            client.get(target)      # warm-up: per-process caches, session save
+            with self.subTest(grown=grown), self.assertNumQueries(budget):
+                response = client.get(target)
+            self.assertEqual(response.status_code, 200)
+
+    # ------------------------------------------------------------------
+    def test_home(self):
+        self.assertQueryBudget(7, self.customer_client(), reverse("home"))
+
+    def test_shop(self):
+        self.assertQueryBudget(6, self.customer_client(), reverse("shop"))
+
+    def test_product_detail(self):
+        product = Product.objects.order_by("id").first()
+        self.assertQueryBudget(7, self.customer_client(), reverse("product_detail", args=[product.id, product.slug]))
+
+    def test_view_cart(self):
+        self.assertQueryBudget(3, self.customer_client(), reverse("view_cart"))
+
+    def test_checkout(self):
+        self.assertQueryBudget(3, self.customer_client(), reverse("checkout"))
+
+    def test_my_orders(self):
+        self.assertQueryBudget(2, self.customer_client(), reverse("my_orders"))
+
+    def test_track_order(self):
+        order = Order.objects.filter(user=self.customer).order_by("id").first()
+        self.assertQueryBudget(7, self.customer_client(), reverse("track_order", args=[order.id]))
+
+    def test_admin_dashboard(self):
+        self.assertQueryBudget(8, self.admin_client(), reverse("admin_dashboard"))
+
+    def test_delivery_dashboard(self):
+        self.assertQueryBudget(4, self.delivery_client(), reverse("delivery_dashboard"))
+
+    def test_delivery_order_history(self):
+        self.assertQueryBudget(3, self.delivery_client(), reverse("delivery_order_history"))
+
+
+# ======================================================
+# REFUND QUEUE
+# ======================================================
+@override_settings(CACHES=LOCMEM_CACHE, AUTO_ASSIGN_ORDERS=False)
+class RefundQueueTests(TestCase):
+    """A refund Razorpay already holds is recorded, never submitted twice or failed."""
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch("store.email_service.send_brevo_email")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        customer = CustomUser.objects.create_user(username="customer", email="customer@example.com", password="x")
+        self.order = Order.objects.create(
+            user=customer, full_name="Test Customer", address="1 Market Road", city="Town",
+            postal_code="560001", phone_number="9876543210", payment_method="card/upi",
+            paid=True, payment_id="pay_test1", total=Decimal("250.00"), order_status="Cancelled",
+        )
+        self.refund = refund_service.queue_refund(self.order)
+        self.client_ = FakeRazorpayClient(captured={"pay_test1": 25000})
+
+    def expire_lease(self):
+        RefundRequest.objects.filter(pk=self.refund.pk).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+
+    def assertRefunded(self, status):
+        self.refund.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual(self.refund.status, status)
+        self.assertEqual(len(self.client_.refunds), 1)
+        self.assertEqual(self.refund.refund_id, next(iter(self.client_.refunds)))
+        self.assertTrue(self.order.refunded)
+        self.assertEqual(self.order.refund_id, self.refund.refund_id)
+
+    def test_reclaimed_lease_records_the_earlier_refund(self):
+        # worker claims, Razorpay accepts, worker dies before recording it
+        (claimed,) = refund_service.claim_due(1)
+        refund_service._call_razorpay(claimed, self.client_)
+        self.assertEqual(RefundRequest.objects.get(pk=self.refund.pk).attempts, 0)
+
+        self.assertEqual(refund_service.run_batch(self.client_, 1), {}, "lease still held")
+        self.expire_lease()
+        self.assertEqual(refund_service.run_batch(self.client_, 1), {RefundRequest.STATUS_PROCESSED: 1})
+        self.assertEqual(self.client_.calls, 1)
+        self.assertRefunded(RefundRequest.STATUS_PROCESSED)
+
+    def test_rejected_refund_checks_for_an_existing_one(self):
+        self.client_.payment.refund("pay_test1", {
+            "amount": 25000, "receipt": f"order-{self.order.id}", "notes": {"order_id": str(self.order.id)},
+        })
+        self.assertEqual(refund_service.run_batch(self.client_, 1), {RefundRequest.STATUS_PROCESSED: 1})
+        self.assertRefunded(RefundRequest.STATUS_PROCESSED)
+
+    def test_rejected_refund_without_existing_one_fails(self):
+        self.client_.captured["pay_test1"] = 0
+        self.assertEqual(refund_service.run_batch(self.client_, 1), {RefundRequest.STATUS_FAILED: 1})
+        self.order.refresh_from_db()
+        self.assertFalse(self.order.refunded)
+
+    def test_transient_error_retries_with_backoff(self):
+        self.client_.fail_times = 1
+        self.assertEqual(refund_service.run_batch(self.client_, 1), {RefundRequest.STATUS_PENDING: 1})
+        self.expire_lease()
+        self.assertEqual(refund_service.run_batch(self.client_, 1), {RefundRequest.STATUS_PROCESSED: 1})
+        self.assertRefunded(RefundRequest.STATUS_PROCESSED)
+
+
+# ======================================================
+# RAZORPAY WEBHOOK / ORDER FINALIZATION
+# ======================================================
+WEBHOOK_SECRET = "whsec_test"
+
+
+@override_settings(CACHES=LOCMEM_CACHE, AUTO_ASSIGN_ORDERS=False, RAZORPAY_WEBHOOK_SECRET=WEBHOOK_SECRET)
+class PaymentWebhookTests(TestCase):
+    """payment.captured creates the order once, at checkout prices, for the amount charged."""
+
+    RZP_ORDER = "order_test1"
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch("store.email_service.send_brevo_email")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.customer = CustomUser.objects.create_user(username="customer", email="customer@example.com", password="x")
+        self.product = Product.objects.create(name="Kurta", price=Decimal("100.00"), available_stock=10)
+        self.variant = ProductVariant.objects.create(
+            product=self.product, sku="KURTA-M", variant_options={"size": "M"}, price=Decimal("120.00"), stock=5,
+        )
+        CartItem.objects.create(user=self.customer, product=self.product, quantity=2)
+        CartItem.objects.create(user=self.customer, product=self.product, variant=self.variant, quantity=1)
+
+        # 2 x 100 + 1 x 120 + 30 delivery
+        self.checkout_info = {
+            "full_name": "Test Customer", "address": "1 Market Road", "city": "Town",
+            "postal_code": "560001", "phone_number": "9876543210",
+            "delivery_fee": 30.0, "total": 350.0,
+        }
+        payment_service.snapshot_checkout(self.customer, self.RZP_ORDER, self.checkout_info)
+
+    def captured_event(self, amount=35000, payment_id="pay_test1"):
+        return {
+            "event": "payment.captured",
+            "payload": {"payment": {"entity": {
+                "id": payment_id, "order_id": self.RZP_ORDER, "amount": amount, "status": "captured",
+            }}},
+        }
+
+    def post_webhook(self, event):
+        body = json.dumps(event)
+        signature = hmac.new(WEBHOOK_SECRET.encode(), body.encode(), hashlib.sha256).hexdigest()
+        return self.client.post(
+            reverse("razorpay_webhook"), body, content_type="application/json",
+            HTTP_X_RAZORPAY_SIGNATURE=signature,
+        )
+
+    def test_replayed_capture_creates_one_order(self):
+        event = self.captured_event()
+        for _ in range(3):
+            self.assertEqual(self.post_webhook(event).status_code, 200)
+
+        order = Order.objects.get()
+        self.assertEqual(order.total, Decimal("350.00"))
+        self.assertTrue(order.paid)
+        self.assertEqual(order.items.count(), 2)
+        self.assertFalse(CartItem.objects.filter(user=self.customer).exists())
+
+        self.product.refresh_from_db()
+        self.variant.refresh_from_db()
+        self.assertEqual(self.product.available_stock, 8)
+        self.assertEqual(self.variant.stock, 4)
+
+        pending = PendingPayment.objects.get()
+        self.assertEqual((pending.order, pending.status), (order, PendingPayment.STATUS_CAPTURED))
+
+    def test_bad_signature_is_rejected(self):
+        response = self.client.post(
+            reverse("razorpay_webhook"), json.dumps(self.captured_event()), content_type="application/json",
+            HTTP_X_RAZORPAY_SIGNATURE="0" * 64,
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_price_change_after_checkout_keeps_snapshot_price(self):
+        Product.objects.filter(pk=self.product.pk).update(price=Decimal("500.00"))
+        order, created = payment_service.handle_razorpay_event(self.captured_event())
+        self.assertTrue(created)
+        self.assertEqual(order.total, Decimal("350.00"))
+        self.assertEqual(
+            sorted(order.items.values_list("price", flat=True)), [Decimal("100.00"), Decimal("120.00")],
+        )
+
+    def test_captured_amount_mismatch_is_flagged(self):
+        event = self.captured_event(amount=30000)
+        with self.assertLogs("store.payment_service", "ERROR") as logs:
+            for _ in range(2):
+                self.assertEqual(payment_service.handle_razorpay_event(event), (None, False))
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("captured 30000 paise", logs.output[0])
+
+        self.assertFalse(Order.objects.exists())
+        pending = PendingPayment.objects.get()
+        self.assertEqual((pending.status, pending.payment_id), (PendingPayment.STATUS_MISMATCH, "pay_test1"))
+        self.assertEqual(CartItem.objects.filter(user=self.customer).count(), 2)
+
+    def test_snapshot_not_matching_checkout_total_is_flagged(self):
+        PendingPayment.objects.update(amount=Decimal("300.00"))
+        with self.assertLogs("store.payment_service", "ERROR"):
+            self.assertEqual(payment_service.finalize_payment(self.RZP_ORDER, "pay_test1"), (None, False))
+        self.assertEqual(PendingPayment.objects.get().status, PendingPayment.STATUS_MISMATCH)
+
+    def test_stock_is_taken_from_the_current_row(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        Product.objects.filter(pk=self.product.pk).update(available_stock=7)  # another order got there first
+        payment_service.take_stock(stale, None, 2)
+        payment_service.take_stock(stale, self.variant, 1)
+
+        self.product.refresh_from_db()
+        self.variant.refresh_from_db()
+        self.assertEqual((self.product.available_stock, self.variant.stock), (5, 4))
+
+
+# ======================================================
+# IDEMPOTENT ORDER PLACEMENT
+# ======================================================
+class IdempotencyTests(TestCase):
+    """A key runs its view once; duplicates replay, wait their turn, or take over a dead lease."""
+
+    def setUp(self):
+        self.customer = CustomUser.objects.create_user(username="customer", email="customer@example.com", password="x")
+        self.calls = 0
+
+        @idempotency.idempotent(lambda request: request.GET.get("token"), scope="test")
+        def place(request):
+            self.calls += 1
+            return HttpResponse(f"order {self.calls}", status=201)
+
+        self.view = place
+        sleep = mock.patch("store.idempotency.time.sleep")
+        sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def request(self, token="tok1"):
+        request = RequestFactory().post(f"/place/?token={token}")
+        request.user = self.customer
+        return request
+
+    def key(self, **fields):
+        now = timezone.now()
+        fields.setdefault("expires_at", now + timedelta(days=1))
+        return IdempotencyKey.objects.create(key=f"test:{self.customer.pk}:tok1", user=self.customer, **fields)
+
+    def test_completed_key_replays_the_first_response(self):
+        first = self.view(self.request())
+        second = self.view(self.request())
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual((second.status_code, second.content), (201, b"order 1"))
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertNotIn("Idempotent-Replayed", first)
+        self.assertIsNone(IdempotencyKey.objects.get().locked_until)
+
+    def test_in_flight_key_gets_409(self):
+        self.key(locked_until=timezone.now() + timedelta(seconds=30))
+
+        response = self.view(self.request())
+
+        self.assertEqual(self.calls, 0)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response["Retry-After"], "1")
+
+    def test_lapsed_lease_is_taken_over(self):
+        record = self.key(locked_until=timezone.now() - timedelta(seconds=1))
+
+        response = self.view(self.request())
+
+        self.assertEqual((self.calls, response.status_code), (1, 201))
+        record.refresh_from_db()
+        self.assertEqual((record.status_code, record.body), (201, "order 1"))
+        self.assertEqual(self.view(self.request())["Idempotent-Replayed"], "true")
+
+    def test_error_releases_the_key(self):
+        failing = idempotency.idempotent(lambda request: "tok1", scope="test")(
+            lambda request: HttpResponse("payment failed", status=502)
+        )
+        self.assertEqual(failing(self.request()).status_code, 502)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.view(self.request()).status_code, 201)
+
+
+# ======================================================
+# ANONYMOUS CART MERGE ON LOGIN
+# ======================================================
+@override_settings(CACHES=LOCMEM_CACHE)
+class AnonymousCartMergeTests(TestCase):
+    """The first request after login folds the cookie cart into CartItem and drops the cookie."""
+
+    def setUp(self):
+        cache.clear()
+        self.customer = CustomUser.objects.create_user(username="customer", email="customer@example.com", password="x")
+        self.kurta = Product.objects.create(name="Kurta", price=Decimal("100.00"))
+        self.saree = Product.objects.create(name="Saree", price=Decimal("900.00"))
+        self.kurta_m = ProductVariant.objects.create(product=self.kurta, sku="KURTA-M", variant_options={"size": "M"})
+        self.saree_red = ProductVariant.objects.create(product=self.saree, sku="SAREE-R", variant_options={"color": "Red"})
+
+    def request(self, entries, user=None):
+        request = RequestFactory().get("/")
+        request.user = user or self.customer
+        request.COOKIES[anon_cart.COOKIE_NAME] = signing.dumps(entries, salt=anon_cart.COOKIE_SALT, compress=True)
+        return request
+
+    def run_middleware(self, request):
+        return AnonymousCartMiddleware(lambda request: HttpResponse("ok"))(request)
+
+    def lines(self):
+        return {
+            (item.product_id, item.variant_id): item.quantity
+            for item in CartItem.objects.filter(user=self.customer)
+        }
+
+    def test_merge_adds_to_existing_lines_and_creates_new_ones(self):
+        CartItem.objects.create(user=self.customer, product=self.kurta, quantity=2)
+        CartItem.objects.create(user=self.customer, product=self.kurta, variant=self.kurta_m, quantity=1)
+
+        self.run_middleware(self.request([
+            [self.kurta.pk, None, 3],
+            [self.kurta.pk, self.kurta_m.pk, 1],
+            [self.saree.pk, self.saree_red.pk, 2],
+        ]))
+
+        self.assertEqual(self.lines(), {
+            (self.kurta.pk, None): 5,
+            (self.kurta.pk, self.kurta_m.pk): 2,
+            (self.saree.pk, self.saree_red.pk): 2,
+        })
+
+    def test_unknown_products_and_mismatched_variants_are_dropped(self):
+        self.run_middleware(self.request([
+            [self.kurta.pk, None, 1],
+            [999999, None, 4],                          # product gone
+            [self.kurta.pk, 999999, 4],                 # variant gone
+            [self.kurta.pk, self.saree_red.pk, 4],      # variant of another product
+        ]))
+
+        self.assertEqual(self.lines(), {(self.kurta.pk, None): 1})
+
+    def test_cookie_is_cleared_and_badges_refreshed(self):
+        cache.set(badges.KEY_PREFIX + str(self.customer.pk), {"cart": 0})
+
+        response = self.run_middleware(self.request([[self.kurta.pk, None, 1]]))
+
+        cookie = response.cookies[anon_cart.COOKIE_NAME]
+        self.assertEqual((cookie.value, cookie["max-age"]), ("", 0))
+        self.assertIsNone(cache.get(badges.KEY_PREFIX + str(self.customer.pk)))
+
+    def test_cookie_with_nothing_to_merge_is_still_cleared(self):
+        response = self.run_middleware(self.request([[999999, None, 1]]))
+
+        self.assertEqual(response.cookies[anon_cart.COOKIE_NAME].value, "")
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_logged_out_visitor_keeps_the_cookie(self):
+        request = self.request([[self.kurta.pk, None, 1]], user=AnonymousUser())
+
+        response = self.run_middleware(request)
+
+        self.assertNotIn(anon_cart.COOKIE_NAME, response.cookies)
+        self.assertFalse(CartItem.objects.exists())
+
+
+# ======================================================
+# CLOUDINARY UPLOADS
+# ======================================================
+@override_settings(CACHES=LOCMEM_CACHE)
+class CloudinaryUploadTests(SimpleTestCase):
+    """Image uploads go through external.call("cloudinary", ...)."""
+
+    def setUp(self):
+        external.metrics.flush()
+        cache.clear()
+        external._breakers.pop("cloudinary", None)
+        self.sent = []
+
+        def api(action, params, file=None, timeout=None, **options):
+            self.sent.append((file.read(), timeout))
+            if len(self.sent) == 1 and self.fail_first:
+                try:
+                    raise NewConnectionError(None, "connection refused")
+                except NewConnectionError as exc:
+                    raise CloudinaryError(f"Unexpected error - {exc!r}")
+            return {"public_id": "img", "version": 1, "type": "upload", "resource_type": "image"}
+
+        self.fail_first = False
+        patcher = mock.patch("cloudinary.uploader.call_cacheable_api", side_effect=api)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        sleep = mock.patch("store.external.time.sleep")
+        sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def test_upload_gets_the_configured_timeout_and_is_measured(self):
+        cloudinary.uploader.upload(io.BytesIO(b"image"))
+
+        self.assertEqual(self.sent, [(b"image", 30)])
+        self.assertIn('external_call_seconds_count{service="cloudinary",op="upload"} 1', external.metrics_text())
+
+    def test_connect_failure_is_retried_from_the_start_of_the_file(self):
+        self.fail_first = True
+        cloudinary.uploader.upload_resource(io.BytesIO(b"image"))
+
+        self.assertEqual(self.sent, [(b"image", 30), (b"image", 30)])
+
+
+# ======================================================
+# ORDER ASSIGNMENT POLICY
+# ======================================================
+PlanOrder = namedtuple("PlanOrder", ["id", "postal_code"])
+ZONES = {"560001": "Central", "560002": "Central", "560100": "South", "560200": "North"}
+
+
+class AssignmentPlanTests(SimpleTestCase):
+    """assignment.plan() is pure: zones first, then lowest load, ties to the lowest rider id."""
+
+    def plan(self, orders, riders, loads=None):
+        pincodes = [PlanOrder(i, pincode) for i, pincode in enumerate(orders, start=1)]
+        result = assignment.plan(pincodes, riders, loads or {}, zone_of=lambda p: ZONES.get(p, ""))
+        return [rider_id for _, rider_id in result]
+
+    def test_zone_riders_take_their_zone(self):
+        riders = [assignment.Rider(1, ("Central",)), assignment.Rider(2, ("South",))]
+        self.assertEqual(self.plan(["560100", "560001", "560100"], riders), [2, 1, 2])
+
+    def test_least_loaded_rider_in_zone_wins(self):
+        riders = [assignment.Rider(1, ("Central",)), assignment.Rider(2, ("Central",))]
+        self.assertEqual(self.plan(["560001"], riders, {1: 3, 2: 1}), [2])
+
+    def test_new_orders_count_towards_load(self):
+        riders = [assignment.Rider(1, ("Central",)), assignment.Rider(2, ("Central",))]
+        self.assertEqual(self.plan(["560001"] * 4, riders, {1: 1}), [2, 1, 2, 1])
+
+    def test_ties_go_to_the_lowest_rider_id(self):
+        riders = [assignment.Rider(7, ("Central",)), assignment.Rider(3, ("Central",))]
+        self.assertEqual(self.plan(["560001", "560002"], riders), [3, 7])
+
+    def test_uncovered_zone_falls_back_to_riders_without_zones(self):
+        riders = [assignment.Rider(1, ("Central",)), assignment.Rider(2, ()), assignment.Rider(3, ())]
+        self.assertEqual(self.plan(["560200", "999999", "560001"], riders, {2: 2}), [3, 3, 1])
+
+    def test_uncovered_zone_without_generalists_uses_anyone(self):
+        riders = [assignment.Rider(1, ("Central",)), assignment.Rider(2, ("South",))]
+        self.assertEqual(self.plan(["560200", "560200"], riders, {1: 1}), [2, 1])
+
+    def test_no_riders_assigns_nothing(self):
+        self.assertEqual(self.plan(["560001"], []), [])
+
+    def test_plan_is_deterministic_and_leaves_loads_alone(self):
+        riders = [assignment.Rider(i, ("Central",) if i % 2 else ()) for i in range(1, 6)]
+        loads = {1: 2, 4: 1}
+        orders = ["560001", "560100", "560002", "560200"] * 5
+        first = self.plan(orders, riders, loads)
+        self.assertEqual(first, self.plan(orders, list(reversed(riders)), loads))
+        self.assertEqual(loads, {1: 2, 4: 1})
+
+
+# ======================================================
+# EMAILED OTPs
+# ======================================================
+@override_settings(
+    CACHES=LOCMEM_CACHE, OTP_TTL=600, OTP_MAX_ATTEMPTS=3, OTP_RESEND_SECONDS=60,
+    OTP_EMAIL_PER_HOUR=3, OTP_IP_PER_HOUR=4, OTP_TRUSTED_PROXIES=0,
+)
+class OTPTests(TestCase):
+    """Codes are single use, expire, die after too many guesses, and sends are throttled."""
+
+    SIGNUP = OTPChallenge.PURPOSE_SIGNUP
+    EMAIL = "new@example.com"
+
+    def setUp(self):
+        cache.clear()
+
+    def request(self, ip="203.0.113.7"):
+        return RequestFactory().post("/", REMOTE_ADDR=ip)
+
+    def issue(self, email=EMAIL, ip="203.0.113.7", **kwargs):
+        return otp.issue(self.SIGNUP, email, self.request(ip), **kwargs)
+
+    def end_cooldown(self, email=EMAIL):
+        cache.delete(f"{otp.KEY_PREFIX}cooldown:{self.SIGNUP}:{email}")
+
+    def wrong(self, code):
+        return f"{(int(code) + 1) % 10 ** 6:06d}"
+
+    def test_code_verifies_once(self):
+        code = self.issue(username="newbie", password="s3cret-pass")
+        challenge = otp.verify(self.SIGNUP, " New@Example.com ", code)
+        self.assertEqual(challenge.username, "newbie")
+        self.assertTrue(check_password("s3cret-pass", challenge.password_hash))
+        with self.assertRaises(otp.Expired):
+            otp.verify(self.SIGNUP, self.EMAIL, code)
+
+    def test_expired_code_is_rejected(self):
+        code = self.issue()
+        OTPChallenge.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        with self.assertRaises(otp.Expired):
+            otp.verify(self.SIGNUP, self.EMAIL, code)
+        self.assertEqual(otp.sweep(), 1)
+
+    def test_attempt_limit_burns_the_code(self):
+        code = self.issue()
+        for _ in range(2):
+            with self.assertRaises(otp.InvalidCode):
+                otp.verify(self.SIGNUP, self.EMAIL, self.wrong(code))
+        with self.assertRaises(otp.Expired):
+            otp.verify(self.SIGNUP, self.EMAIL, self.wrong(code))
+        self.assertFalse(OTPChallenge.objects.exists())
+        with self.assertRaises(otp.Expired):
+            otp.verify(self.SIGNUP, self.EMAIL, code)
+
+    @mock.patch("store.otp.secrets.randbelow", side_effect=[111111, 222222])
+    def test_resend_within_cooldown_is_throttled(self, randbelow):
+        first = self.issue()
+        with self.assertRaises(otp.Throttled):
+            self.issue()
+        self.end_cooldown()
+        second = self.issue()
+
+        self.assertEqual((first, second), ("111111", "222222"))
+        self.assertEqual(OTPChallenge.objects.count(), 1)
+        with self.assertRaises(otp.InvalidCode):
+            otp.verify(self.SIGNUP, self.EMAIL, first)
+        otp.verify(self.SIGNUP, self.EMAIL, second)
+
+    def test_hourly_cap_per_email(self):
+        for _ in range(3):
+            self.issue()
+            self.end_cooldown()
+        with self.assertRaises(otp.Throttled):
+            self.issue()
+
+    def test_hourly_cap_per_ip(self):
+        for i in range(4):
+            self.issue(email=f"user{i}@example.com")
+        with self.assertRaises(otp.Throttled):
+            self.issue(email="user9@example.com")
+        self.issue(email="user9@example.com", ip="198.51.100.1")
+
+
+# ======================================================
+# DAILY SALES ROLLUP
+# ======================================================
+@override_settings(CACHES=LOCMEM_CACHE, AUTO_ASSIGN_ORDERS=False, QUERY_BUDGET_ENABLED=False)
+class DailyStatsTests(TestCase):
+    """The admin dashboard's rollup numbers follow orders through place, cancel and refund."""
+
+    def setUp(self):
+        cache.clear()
+        self.customer = CustomUser.objects.create_user(username="customer", email="customer@example.com", password="x")
+        self.staff = CustomUser.objects.create_user(username="staff", email="staff@example.com", password="x", is_staff=True)
+        self.product = Product.objects.create(name="Kurta", price=Decimal("100.00"))
+
+    def place(self, quantity, payment_method="COD", paid=False, payment_id=None):
+        """Create an order and its lines in one transaction, like checkout does."""
+        with self.captureOnCommitCallbacks(execute=True) as callbacks, transaction.atomic():
+            order = Order.objects.create(
+                user=self.customer, full_name="Test Customer", address="1 Market Road", city="Town",
+                postal_code="560001", phone_number="9876543210", payment_method=payment_method,
+                paid=paid, payment_id=payment_id, delivery_fee=Decimal("30.00"),
+            )
+            OrderItem.objects.create(order=order, product=self.product, quantity=quantity, price=self.product.price)
+            order.save()
+        refreshes = [c for c in callbacks if getattr(c, "stats_day", None)]
+        self.assertEqual(len(refreshes), 1, "one rollup refresh per transaction")
+        return order
+
+    def dashboard(self):
+        self.client.force_login(self.staff)
+        session = self.client.session
+        session["admin_verified"] = True
+        session.save()
+        context = self.client.get(reverse("admin_dashboard")).context
+        today = context["trend"][-1]
+        return {
+            "orders": context["total_orders"],
+            "revenue": context["revenue"],
+            "pending": context["pending_orders"],
+            "delivered": context["delivered_orders"],
+            "cancellations": today["cancellations"],
+            "prepaid": today["prepaid_orders"],
+        }
+
+    def test_dashboard_follows_place_cancel_and_refund(self):
+        cod = self.place(2)
+        prepaid = self.place(1, payment_method="card/upi", paid=True, payment_id="pay_stats1")
+        self.assertEqual(self.dashboard(), {
+            "orders": 2, "revenue": Decimal("130.00"), "pending": 2, "delivered": 0,
+            "cancellations": 0, "prepaid": 1,
+        })
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cod.set_status("Delivered")
+            cod.paid = True
+            cod.save()
+            prepaid.set_status("Cancelled")
+        self.assertEqual(self.dashboard(), {
+            "orders": 2, "revenue": Decimal("360.00"), "pending": 0, "delivered": 1,
+            "cancellations": 1, "prepaid": 1,
+        })
+
+        with self.captureOnCommitCallbacks(execute=True):
+            payment_service.mark_refund_processed("pay_stats1", "rfnd_stats1")
+        prepaid.refresh_from_db()
+        self.assertTrue(prepaid.refunded)
+        self.assertEqual(self.dashboard()["cancellations"], 1)
+
+        stats = OrderDailyStats.objects.get()
+        self.assertEqual((stats.orders, stats.items, stats.cod_orders), (2, 2, 1))
+
+    def test_deleting_the_last_order_drops_the_day(self):
+        order = self.place(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            order.delete()
+        self.assertFalse(OrderDailyStats.objects.exists())
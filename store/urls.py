@@ -32,6 +32,10 @@ urlpatterns = [
     path('cart/add/<int:product_id>/<int:variation_id>/', views.add_to_cart, name='add_to_cart_variation'),
     path('cart/remove/<int:item_id>/', views.remove_from_cart, name='remove_from_cart'),
     path('update-cart/<int:item_id>/', views.update_cart_quantity, name='update_cart_quantity'),
+    path('cart/bulk-update/', views.cart_bulk_update, name='cart_bulk_update'),
+    path('badges/', views.badge_counts, name='badge_counts'),
+    path('metrics/', views.metrics_view, name='metrics'),
+    path('metrics/queries/', views.query_stats_view, name='query_stats'),
 
 
     # ================================
@@ -52,14 +56,19 @@ urlpatterns = [
     path('buy-now/<int:product_id>/<int:variation_id>/', views.buy_now, name='buy_now_variation'),
     path("razorpay/create/", views.razorpay_create_order, name="razorpay_create_order"),
     path("razorpay/verify/", views.payment_verify_view, name="razorpay_verify"),
+    path("razorpay/webhook/", views.razorpay_webhook, name="razorpay_webhook"),
     path("cod-order/", views.cod_order_view, name="cod_order"),
+    path("pincode/check/", views.pincode_check, name="pincode_check"),
 
 
     # ================================
     # ORDERS (CUSTOMER)
     # ================================
     path('my-orders/', views.my_orders_view, name='my_orders'),
+    path('my-orders/<int:order_id>/items/', views.my_order_items, name='my_order_items'),
     path('track-order/<int:order_id>/', views.track_order_view, name='track_order'),
+    path('track-order/<int:order_id>/changes/', views.order_status_changes, name='order_status_changes'),
+    path('track-order/<int:order_id>/stream/', views.order_status_stream, name='order_status_stream'),
     path('order/<int:order_id>/cancel/', views.cancel_order, name='cancel_order'),
 
 
@@ -105,6 +114,10 @@ urlpatterns = [
     # DELIVERY PANEL
     # ================================
     path('delivery-dashboard/', views.delivery_dashboard, name='delivery_dashboard'),
+    path('delivery/changes/', views.delivery_changes, name='delivery_changes'),
+    path('delivery/stream/', views.delivery_stream, name='delivery_stream'),
+    path('delivery/route-sheet/', views.delivery_route_sheet, name='delivery_route_sheet'),
+    path('delivery/route-sheet.json', views.delivery_route_manifest, name='delivery_route_manifest'),
     path('delivery/order/<int:order_id>/', views.delivery_order_detail, name='delivery_order_detail'),
     path('delivery-verify/', views.delivery_verify, name='delivery_verify'),
     path('delivery/order/<int:order_id>/update-status/', 
@@ -6,6 +6,7 @@ from django.http import JsonResponse
 from django.core.paginator import Paginator
 from django.contrib.auth import get_user_model
 from django.utils import timezone
+from django.db.models import Sum
 from datetime import timedelta
 
 from store.email_service import send_brevo_email  # keep your existing email helper
@@ -23,6 +24,8 @@ from store.models import (
     Review,
     DeliveryProfile,
     BusinessNameAndLogo,
+    OrderDailyStats,
+    OrderStatusEvent,
 )
 
 User = get_user_model()
@@ -85,24 +88,44 @@ def admin_dashboard_view(request):
     paginator = Paginator(orders_qs, 10)
     orders_page = paginator.get_page(page)
 
-    # Stats
-    total_orders = Order.objects.count()
+    # Stats — order numbers come from the daily rollup, not the orders table
+    totals = OrderDailyStats.objects.aggregate(
+        total_orders=Sum("orders"),
+        revenue=Sum("revenue"),
+        pending_orders=Sum("pending"),
+        delivered_orders=Sum("delivered"),
+    )
+    total_orders = totals["total_orders"] or 0
+    pending_orders = totals["pending_orders"] or 0
+    delivered_orders = totals["delivered_orders"] or 0
+    revenue = totals["revenue"] or 0
+
     total_users = CustomUser.objects.count()
     total_products = Product.objects.count()
     total_categories = Category.objects.count()
-    pending_orders = Order.objects.filter(order_status="Pending pickup").count()
-    delivered_orders = Order.objects.filter(order_status="Delivered").count()
-
-
 
     # low stock products (example: stock <=5)
     low_stock = ProductVariant.objects.filter(stock__lte=5).select_related('product')[:10]
 
-    # revenue (simple: sum of paid orders)
-    revenue = 0
-    paid_orders = Order.objects.filter(paid=True)
-    for o in paid_orders:
-        revenue += (o.total_amount() if hasattr(o, 'total_amount') else sum([it.price * it.quantity for it in o.items.all()]))
+    # last 14 days trend (missing days = no orders)
+    today = timezone.localdate()
+    since = today - timedelta(days=13)
+    by_day = {s.date: s for s in OrderDailyStats.objects.filter(date__gte=since)}
+    trend = []
+    for i in range(14):
+        day = since + timedelta(days=i)
+        stats = by_day.get(day)
+        trend.append({
+            "date": day,
+            "orders": stats.orders if stats else 0,
+            "revenue": stats.revenue if stats else 0,
+            "cancellations": stats.cancellations if stats else 0,
+            "cod_orders": stats.cod_orders if stats else 0,
+            "prepaid_orders": stats.prepaid_orders if stats else 0,
+        })
+    max_orders = max((t["orders"] for t in trend), default=0) or 1
+    for t in trend:
+        t["bar_pct"] = int(t["orders"] * 100 / max_orders)
 
     context = {
         'orders': orders_page,
@@ -115,6 +138,7 @@ def admin_dashboard_view(request):
         'search_query': q,
         'pending_orders': pending_orders,
         'delivered_orders': delivered_orders,
+        'trend': trend,
     }
     return render(request, 'dashboard.html', context)
 
@@ -180,13 +204,12 @@ def admin_update_order_status(request, order_id):
 
     # Basic validation - ensure provided status is in choices
     allowed_statuses = [choice[0] for choice in Order._meta.get_field('order_status').choices]
-    if new_status and new_status in allowed_statuses:
-        order.order_status = new_status
+    status = new_status if new_status and new_status in allowed_statuses else order.order_status
 
     if paid_flag is not None:
         order.paid = (paid_flag == 'True' or paid_flag == 'true' or paid_flag == '1')
 
-    order.save()
+    order.set_status(status, by=request.user, source=OrderStatusEvent.SOURCE_ADMIN_PANEL)
 
     # send notifications for important transitions
     notifications = {
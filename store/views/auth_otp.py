@@ -7,17 +7,18 @@ from django.db.models import Avg, Count
 from django.views.decorators.http import require_POST
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required, user_passes_test
-import random, json
+import json
 
 # Import all models
 from store.models import (
     CustomUser, 
     CartItem, 
+    OTPChallenge,
 )
 from store.forms import ReviewForm
+from store import otp as otp_store
 
 User = get_user_model()
-otp_storage = {}
 
 
 
@@ -57,12 +58,16 @@ def request_otp_view(request):
         # ------------------------------------------
         # 2️⃣ NEW USER → OTP REQUIRED
         # ------------------------------------------
-        otp = str(random.randint(100000, 999999))
-        otp_storage[email] = {
-            "otp": otp,
-            "username": username,
-            "password": password
-        }
+        try:
+            otp = otp_store.issue(
+                OTPChallenge.PURPOSE_SIGNUP, email, request,
+                username=username, password=password,
+            )
+        except otp_store.Throttled as e:
+            messages.error(request, str(e))
+            if request.session.get("pending_email") == email:
+                return redirect("verify_otp")
+            return redirect("/")
 
         # Send OTP via Brevo
         try:
@@ -105,62 +110,61 @@ def verify_otp_view(request):
         # -----------------------------------------------------
         if otp_mode == "reset":
             email = request.session.get("reset_email")
-            correct_otp = request.session.get("reset_otp")
 
-            if not email or not correct_otp:
+            if not email:
                 messages.error(request, "OTP expired or invalid. Please try again.")
                 return redirect("forgot_password")
 
-            if str(entered_otp) == str(correct_otp):
-                # Clear OTP from session
-                request.session.pop("reset_otp", None)
-                request.session["otp_mode"] = None
+            try:
+                otp_store.verify(OTPChallenge.PURPOSE_RESET, email, entered_otp)
+            except otp_store.InvalidCode as e:
+                messages.error(request, str(e))
+                return redirect("verify_otp")
+            except otp_store.Expired as e:
+                messages.error(request, str(e))
+                return redirect("forgot_password")
 
-                # Redirect to new password page
-                messages.success(request, "OTP verified! Please set your new password.")
-                return redirect("new_password")
+            request.session["reset_verified"] = True
+            request.session["otp_mode"] = None
 
-            else:
-                messages.error(request, "Incorrect OTP. Please try again.")
-                return redirect("verify_otp")
+            # Redirect to new password page
+            messages.success(request, "OTP verified! Please set your new password.")
+            return redirect("new_password")
 
         # -----------------------------------------------------
         # 🔹 NORMAL LOGIN / SIGNUP OTP LOGIC
         # -----------------------------------------------------
         email = request.session.get("pending_email")
-        data = otp_storage.get(email)
 
-        if not data:
-            messages.error(request, "OTP expired or invalid. Please request again.")
+        try:
+            challenge = otp_store.verify(OTPChallenge.PURPOSE_SIGNUP, email, entered_otp)
+        except otp_store.InvalidCode as e:
+            messages.error(request, str(e))
+            return redirect("verify_otp")
+        except otp_store.Expired as e:
+            messages.error(request, str(e))
             return redirect("request_otp")
 
-        if data["otp"] == entered_otp:
-            username = data["username"]
-            password = data["password"]
+        user, created = CustomUser.objects.get_or_create(
+            email=email,
+            defaults={"username": challenge.username}
+        )
 
-            user, created = CustomUser.objects.get_or_create(
-                email=email,
-                defaults={"username": username}
-            )
-
-            user.set_password(password)
-            user.is_verified = True
-            user.save()
-
-            login(request, user)
-            request.session.set_expiry(60 * 60 * 24 * 15)   # 15 days
+        # already hashed when the OTP was issued
+        user.password = challenge.password_hash
+        user.is_verified = True
+        user.save()
 
-            messages.success(
-                request,
-                f"Welcome back, {user.username}!"
-                if not created else f"Account created successfully for {user.username}!"
-            )
+        login(request, user)
+        request.session.set_expiry(60 * 60 * 24 * 15)   # 15 days
+        request.session.pop("pending_email", None)
 
-            otp_storage.pop(email, None)
-            return redirect("/")
-        else:
-            messages.error(request, "Invalid OTP. Please try again.")
-            return redirect("verify_otp")
+        messages.success(
+            request,
+            f"Welcome back, {user.username}!"
+            if not created else f"Account created successfully for {user.username}!"
+        )
+        return redirect("/")
 
     return render(request, "verify_otp.html")
 
@@ -182,10 +186,14 @@ def forgot_password(request):
             return redirect("forgot_password")
 
         # Generate OTP
-        otp = random.randint(100000, 999999)
+        try:
+            otp = otp_store.issue(OTPChallenge.PURPOSE_RESET, email, request)
+        except otp_store.Throttled as e:
+            messages.error(request, str(e))
+            return redirect("forgot_password")
 
         request.session["reset_email"] = email
-        request.session["reset_otp"] = str(otp)
+        request.session["reset_verified"] = False
         request.session["otp_mode"] = "reset"
 
         # Send OTP using Brevo
@@ -197,7 +205,7 @@ def forgot_password(request):
                 <h2>Reset Password Request</h2>
                 <p>Your OTP for resetting your password is:</p>
                 <h1>{otp}</h1>
-                <p>This OTP is valid for 10 minutes.</p>
+                <p>This OTP is valid for {otp_store.ttl() // 60} minutes.</p>
             </div>
         """
         text = f"Your reset OTP is {otp}"
@@ -214,7 +222,7 @@ def forgot_password(request):
 def new_password(request):
     reset_email = request.session.get("reset_email")
 
-    if not reset_email:
+    if not reset_email or not request.session.get("reset_verified"):
         messages.error(request, "Unauthorized access.")
         return redirect("forgot_password")
 
@@ -232,7 +240,7 @@ def new_password(request):
         user.save()
 
         # Clear session
-        for key in ["reset_email", "reset_otp", "otp_mode"]:
+        for key in ["reset_email", "reset_verified", "otp_mode"]:
             request.session.pop(key, None)
 
         login(request, user)
@@ -8,46 +8,36 @@ from django.contrib.auth.decorators import login_required
 from django.db import transaction
 import json
 
+from store import anon_cart, badges, cart_service
 from store.models import Product, CartItem , ProductVariant
 
 
 # ===================================================================
 # 🛒 ADD TO CART (Dynamic Product System)
 # ===================================================================
-@login_required
-def add_to_cart(request, product_id):
-    product = get_object_or_404(Product, id=product_id)
-
+def add_to_cart(request, product_id, variation_id=None):
     # Check if a variant was selected
-    variant_id = request.POST.get("variant_id")
-    variant = None
+    variant_id = request.POST.get("variant_id") or variation_id
 
+    # one lookup validates both the product and the variant
     if variant_id:
-        variant = get_object_or_404(
-            ProductVariant,
-            id=variant_id,
-            product=product
-        )
-
-    # Check if item already exists in cart
-    existing = CartItem.objects.filter(
-        user=request.user,
-        product=product,
-        variant=variant
-    ).first()
-
-    if existing:
-        existing.quantity += 1
-        existing.save()
-        messages.success(request, "Quantity updated in your cart.")
+        variant = get_object_or_404(ProductVariant, id=variant_id, product_id=product_id)
+        variant_id = variant.id
     else:
-        CartItem.objects.create(
-            user=request.user,
-            product=product,
-            variant=variant,
-            quantity=1
-        )
+        get_object_or_404(Product.objects.only("id"), id=product_id)
+        variant_id = None
+
+    if not request.user.is_authenticated:
+        # logged-out visitors get a cookie cart, merged into CartItem on login
+        if anon_cart.get_cart(request).add(int(product_id), variant_id):
+            messages.success(request, "Item added to cart.")
+        else:
+            messages.warning(request, "Your cart is full. Please log in to add more items.")
+    elif cart_service.add(request.user, product_id, variant_id):
+        badges.invalidate(request)
         messages.success(request, "Item added to cart.")
+    else:
+        messages.success(request, "Quantity updated in your cart.")
 
     return redirect("view_cart")
 
@@ -55,24 +45,28 @@ def add_to_cart(request, product_id):
 # ===================================================================
 # 🛒 VIEW CART
 # ===================================================================
-@login_required
 def view_cart(request):
-    items = CartItem.objects.filter(user=request.user).select_related("product")
-
-    total = sum(item.total_price() for item in items)
+    if request.user.is_authenticated:
+        snapshot = cart_service.get_snapshot(request.user)
+    else:
+        snapshot = cart_service.get_snapshot(None, anonymous_cart=anon_cart.get_cart(request))
 
     return render(request, "cart.html", {
-        "items": items,
-        "total": total,
+        "items": snapshot.lines,
+        "total": snapshot.subtotal,
+        "item_count": snapshot.item_count,
     })
 
 
 # ===================================================================
 # ❌ REMOVE FROM CART
 # ===================================================================
-@login_required
 def remove_from_cart(request, item_id):
-    CartItem.objects.filter(id=item_id, user=request.user).delete()
+    if request.user.is_authenticated:
+        cart_service.remove(request.user, item_id)
+        badges.invalidate(request)
+    else:
+        anon_cart.get_cart(request).remove(item_id)
     messages.success(request, "Item removed from cart.")
     return redirect("view_cart")
 
@@ -81,7 +75,6 @@ def remove_from_cart(request, item_id):
 # 🔄 UPDATE QUANTITY (AJAX)
 # ===================================================================
 @require_POST
-@login_required
 def update_cart_quantity(request, item_id):
     """Increase/decrease quantity dynamically using AJAX"""
 
@@ -89,21 +82,29 @@ def update_cart_quantity(request, item_id):
         data = json.loads(request.body)
         action = data.get("action")
 
-        item = CartItem.objects.get(id=item_id, user=request.user)
+        if not request.user.is_authenticated:
+            return _update_anonymous_quantity(request, item_id, action)
+
+        with transaction.atomic():
+            if action == "increase":
+                found = cart_service.change(request.user, item_id, 1)
+            elif action == "decrease":
+                found = cart_service.change(request.user, item_id, -1)
+            else:
+                return JsonResponse({"success": False, "error": "Unknown action."}, status=400)
 
-        if action == "increase":
-            item.quantity += 1
-        elif action == "decrease":
-            if item.quantity > 1:
-                item.quantity -= 1
+            if not found:
+                raise CartItem.DoesNotExist
 
-        item.save()
+            totals = cart_service.totals(request.user, item_id)
 
         return JsonResponse({
             "success": True,
             "item_id": item_id,
-            "quantity": item.quantity,
-            "item_total": item.total_price()
+            "quantity": totals["line_quantity"],
+            "item_total": totals["item_total"],
+            "cart_total": totals["cart_total"],
+            "cart_count": totals["cart_count"],
         })
 
     except CartItem.DoesNotExist:
@@ -112,19 +113,109 @@ def update_cart_quantity(request, item_id):
         return JsonResponse({"success": False, "error": str(e)}, status=400)
 
 
+def _update_anonymous_quantity(request, item_id, action):
+    deltas = {"increase": 1, "decrease": -1}
+    if action not in deltas:
+        return JsonResponse({"success": False, "error": "Unknown action."}, status=400)
+
+    cart = anon_cart.get_cart(request)
+    if not cart.change(item_id, deltas[action]):
+        return JsonResponse({"success": False, "error": "Item not found."}, status=404)
+
+    snapshot = cart_service.get_snapshot(None, anonymous_cart=cart)
+    line = next((l for l in snapshot if l.id == item_id), None)
+    return JsonResponse({
+        "success": True,
+        "item_id": item_id,
+        "quantity": line.quantity if line else 0,
+        "item_total": line.line_total if line else 0,
+        "cart_total": snapshot.subtotal,
+        "cart_count": snapshot.item_count,
+    })
+
+
 # ===================================================================
-# 🛍 BUY NOW (1-click Checkout)
+# 🧺 BULK UPDATE (AJAX)
 # ===================================================================
+@require_POST
 @login_required
-def buy_now(request, product_id):
+def cart_bulk_update(request):
+    """
+    Apply several line changes at once. Body:
+        {"lines": [{"product_id": 1, "variant_id": null, "quantity": 3},
+                   {"product_id": 2, "delta": -1}, ...]}
+    "quantity" sets the line (0 removes it), "delta" adds to it.
+    """
+    try:
+        data = json.loads(request.body)
+        changes = data.get("lines") or []
+        if not isinstance(changes, list):
+            raise ValueError("lines must be a list.")
+
+        parsed = []
+        for change in changes:
+            product_id = int(change["product_id"])
+            variant_id = int(change["variant_id"]) if change.get("variant_id") else None
+            if "quantity" in change:
+                parsed.append((product_id, variant_id, "set", int(change["quantity"])))
+            else:
+                parsed.append((product_id, variant_id, "add", int(change.get("delta", 1))))
+    except (ValueError, TypeError, KeyError) as e:
+        return JsonResponse({"success": False, "error": f"Invalid payload: {e}"}, status=400)
+
+    # validate every product / variant with two queries, not one per line
+    product_ids = {p for p, _, _, _ in parsed}
+    variant_ids = {v for _, v, _, _ in parsed if v}
+    known_products = set(Product.objects.filter(id__in=product_ids).values_list("id", flat=True))
+    known_variants = dict(
+        ProductVariant.objects.filter(id__in=variant_ids).values_list("id", "product_id")
+    )
+    for product_id, variant_id, _, _ in parsed:
+        if product_id not in known_products:
+            return JsonResponse({"success": False, "error": f"Product {product_id} not found."}, status=404)
+        if variant_id and known_variants.get(variant_id) != product_id:
+            return JsonResponse({"success": False, "error": f"Variant {variant_id} not found."}, status=404)
+
+    with transaction.atomic():
+        for product_id, variant_id, op, amount in parsed:
+            if op == "set":
+                cart_service.set_line(request.user, product_id, variant_id, amount)
+            elif amount > 0:
+                cart_service.add(request.user, product_id, variant_id, amount)
+            elif amount < 0:
+                cart_service.subtract(request.user, product_id, variant_id, -amount)
+
+        totals = cart_service.totals(request.user)
+        lines = cart_service.lines(request.user)
+
+    badges.invalidate(request)
+
+    return JsonResponse({
+        "success": True,
+        "lines": lines,
+        "cart_total": totals["cart_total"],
+        "cart_count": totals["cart_count"],
+    })
+
+
+# ===================================================================
+# 🛍 BUY NOW (1-click Checkout)
+# ===================================================================
+def buy_now(request, product_id, variation_id=None):
     product = get_object_or_404(Product, id=product_id)
 
-    variant_id = request.POST.get("variant_id")
+    variant_id = request.POST.get("variant_id") or variation_id
     variant = None
 
     if variant_id:
         variant = get_object_or_404(ProductVariant, id=variant_id, product=product)
 
+    if not request.user.is_authenticated:
+        # keep the item in the cookie cart; checkout sends them through login,
+        # and the cart is merged on the way back
+        anon_cart.get_cart(request).add(product.id, variant.id if variant else None)
+        return redirect("checkout")
+
     request.session["buy_now"] = {
         "product_id": product.id,
         "variant_id": variant.id if variant else None,
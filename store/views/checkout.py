@@ -2,7 +2,7 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.urls import reverse
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.db.models import Sum
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
@@ -16,11 +16,18 @@ from store.models import (
     BusinessNameAndLogo
 )
 
+import logging
 import razorpay
 import os
+import uuid
 from dotenv import load_dotenv
 
 from decouple import config
+from decimal import Decimal
+from store import assignment, badges, cart_service, external, service_areas
+from store.site_settings import get_site_settings
+
+logger = logging.getLogger(__name__)
 
 # Razorpay client
 RAZORPAY_KEY_ID = config("RAZORPAY_KEY_ID_LIVE")
@@ -31,31 +38,20 @@ razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
 
 @login_required
 def checkout_view(request):
-    business = BusinessNameAndLogo.objects.first()
-    allowed_pincodes = business.allowed_pincodes if business and business.allowed_pincodes else []
+    business = get_site_settings().business
 
     buy_now = request.session.get("buy_now")
-    items = CartItem.objects.filter(user=request.user)
-
-    if buy_now:
-        product = get_object_or_404(Product, id=buy_now["product_id"])
-        variant = None
-        if buy_now.get("variant_id"):
-            variant = ProductVariant.objects.filter(id=buy_now["variant_id"]).first()
-        price = variant.display_price() if variant else product.price
-        total = float(price)
-        context_items = [{
-            "product": product,
-            "variant": variant,
-            "quantity": 1,
-            "price": price,
-        }]
-    else:
-        if not items:
-            messages.warning(request, "Your cart is empty.")
-            return redirect("home")
-        total = sum(item.subtotal() for item in items)
-        context_items = items
+    snapshot = cart_service.get_snapshot(request.user, buy_now)
+
+    if not snapshot:
+        if buy_now:
+            request.session.pop("buy_now", None)
+            raise Http404("Product not found.")
+        messages.warning(request, "Your cart is empty.")
+        return redirect("home")
+
+    context_items = snapshot.lines
+    total = snapshot.subtotal
 
     if request.method == "POST":
         postal_code = request.POST.get("postal_code", "")
@@ -64,7 +60,8 @@ def checkout_view(request):
             messages.warning(request, "Please enter a valid postal code.")
             return render(request, "checkout.html", {"items": context_items, "total": total})
 
-        if postal_code not in allowed_pincodes:
+        area = service_areas.lookup(postal_code)
+        if area is None:
             messages.warning(request, "This pincode is not serviceable.")
             return render(request, "checkout.html", {"items": context_items, "total": total})
 
@@ -74,12 +71,15 @@ def checkout_view(request):
             return redirect("checkout")
 
         request.session["checkout_info"] = {
+            "token": uuid.uuid4().hex,   # idempotency key for placing this order
             "full_name": request.POST["full_name"],
             "address": request.POST["address"],
             "city": request.POST["city"],
             "postal_code": postal_code,
             "phone_number": phone_number,
-            "total": float(total),
+            "delivery_fee": float(area.fee),
+            "cod_allowed": area.cod_allowed,
+            "total": float(total + area.fee),
         }
 
         return redirect("payment")
@@ -98,10 +98,46 @@ def payment_view(request):
         messages.error(request, "Missing checkout information.")
         return redirect("checkout")
 
-    total = checkout_info["total"]
+    # re-price from the live cart so a change made after checkout is charged correctly
+    snapshot = cart_service.get_snapshot(request.user, request.session.get("buy_now"))
+    if not snapshot:
+        messages.warning(request, "Your cart is empty.")
+        return redirect("home")
+
+    total = float(snapshot.subtotal + Decimal(str(checkout_info.get("delivery_fee", 0))))
+    if total != checkout_info["total"]:
+        checkout_info["total"] = total
+        request.session["checkout_info"] = checkout_info
+
     return render(request, "payment.html", {
         "total": total,
-        "razorpay_key": RAZORPAY_KEY_ID
+        "subtotal": snapshot.subtotal,
+        "item_count": snapshot.item_count,
+        "delivery_fee": checkout_info.get("delivery_fee", 0),
+        "cod_allowed": checkout_info.get("cod_allowed", True),
+        "razorpay_key": RAZORPAY_KEY_ID,
+        "checkout_token": checkout_info.get("token", ""),
+    })
+
+
+# ======================
+# PINCODE CHECK (AJAX)
+# ======================
+def pincode_check(request):
+    """Instant serviceability check for the checkout form — no DB hit."""
+    pincode = request.GET.get("pincode", "")
+    area = service_areas.lookup(pincode)
+
+    if area is None:
+        return JsonResponse({"serviceable": False, "pincode": service_areas.normalize(pincode)})
+
+    return JsonResponse({
+        "serviceable": True,
+        "pincode": area.pincode,
+        "zone": area.zone,
+        "delivery_days": area.delivery_days,
+        "cod_allowed": area.cod_allowed,
+        "fee": float(area.fee),
     })
 
 
@@ -124,17 +160,20 @@ def razorpay_create_order(request):
         total = Decimal(str(checkout_info["total"]))
         total_paise = int(total * 100)
 
-        print("Creating Razorpay Order: ", total_paise)  # DEBUG
+        logger.debug("Creating Razorpay order for %s paise", total_paise)
 
         # ✔ Create Razorpay order successfully
-        razorpay_order = razorpay_client.order.create({
+        razorpay_order = external.call("razorpay", "order.create", razorpay_client.order.create, {
             "amount": total_paise,
             "currency": "INR",
             "payment_capture": 1,
             "notes": {"customer": request.user.username}
         })
 
-        print("Razorpay Order Created: ", razorpay_order)  # DEBUG
+        logger.debug("Razorpay order created: %s", razorpay_order["id"])
+
+        # Keep the checkout server-side so the webhook can finish the order
+        snapshot_checkout(request.user, razorpay_order["id"], checkout_info, request.session.get("buy_now"))
 
         return JsonResponse({
             "success": True,
@@ -144,7 +183,7 @@ def razorpay_create_order(request):
         })
 
     except Exception as e:
-        print("RAZORPAY ERROR (create order):", str(e))  # DEBUG LOGGING
+        logger.exception("Razorpay order create failed")
         return JsonResponse({"success": False, "error": str(e)})
 
 
@@ -153,8 +192,15 @@ def razorpay_create_order(request):
 # VERIFY PAYMENT + CREATE ORDER
 # ======================
 from decimal import Decimal
+import json
+from store.models import PendingPayment
+from store.payment_service import snapshot_checkout, finalize_payment, handle_razorpay_event, take_stock
+from store.idempotency import idempotent
+
+
 @csrf_exempt
 @login_required
+@idempotent(lambda request: request.POST.get("razorpay_order_id"), scope="rzp-verify")
 def payment_verify_view(request):
     if request.method != "POST":
         return JsonResponse({"success": False, "error": "Invalid request"}, status=400)
@@ -170,82 +216,83 @@ def payment_verify_view(request):
             "razorpay_payment_id": rp_payment_id,
             "razorpay_signature": rp_signature
         })
-        print("Signature Verified!")  # DEBUG
+    except Exception as e:
+        logger.warning("Razorpay signature check failed for %s: %s", rp_order_id, e)
+        return JsonResponse({"success": False, "error": "Signature verification failed"}, status=400)
 
-        # Confirm payment status from Razorpay server
-        payment_info = razorpay_client.payment.fetch(rp_payment_id)
-        print("Razorpay Payment Data:", payment_info) # DEBUG
+    # Signature check is a local HMAC, no Razorpay round trip here.
+    # Capture is automatic (payment_capture=1) and the payment.captured
+    # webhook finalizes the order if this tab never gets this far.
+    checkout_info = request.session.get("checkout_info")
+    if checkout_info and not PendingPayment.objects.filter(razorpay_order_id=rp_order_id).exists():
+        snapshot_checkout(request.user, rp_order_id, checkout_info, request.session.get("buy_now"))
+
+    order, created = finalize_payment(rp_order_id, rp_payment_id)
+    if order is None:
+        if PendingPayment.objects.filter(
+            razorpay_order_id=rp_order_id, status=PendingPayment.STATUS_MISMATCH
+        ).exists():
+            return JsonResponse({
+                "success": False,
+                "error": "Your cart changed during payment. We'll contact you about this payment.",
+            }, status=409)
+        return JsonResponse({"success": False, "error": "Unknown order"}, status=400)
+
+    request.session.pop("buy_now", None)
+    badges.invalidate(request)
+
+    if created:
+        send_prepaid_order_emails(request, order)
+
+    return JsonResponse({"success": True})
 
-        if payment_info.get("status") != "captured":
-            print("Payment not captured automatically, capturing now...") # DEBUG
-            razorpay_client.payment.capture(rp_payment_id, int(Decimal(str(request.session['checkout_info']['total'])) * 100))
 
-    except Exception as e:
-        print("Signature ERROR:", str(e)) # DEBUG
-        return JsonResponse({"success": False, "error": "Signature verification failed"})
+# ======================
+# RAZORPAY WEBHOOK
+# ======================
+@csrf_exempt
+def razorpay_webhook(request):
+    """
+    payment.captured / payment.failed / refund.processed from Razorpay.
+    Signed with RAZORPAY_WEBHOOK_SECRET; safe to receive more than once.
+    """
+    if request.method != "POST":
+        return JsonResponse({"success": False, "error": "Invalid request"}, status=400)
 
+    secret = settings.RAZORPAY_WEBHOOK_SECRET
+    if not secret:
+        return JsonResponse({"success": False, "error": "Webhook not configured"}, status=503)
 
-    buy_now = request.session.get("buy_now")
-    checkout_info = request.session.get("checkout_info")
-    cart_items = CartItem.objects.filter(user=request.user)
-    total = checkout_info["total"]
-
-    # Create order now only after success
-    order = Order.objects.create(
-        user=request.user,
-        full_name=checkout_info["full_name"],
-        address=checkout_info["address"],
-        city=checkout_info["city"],
-        postal_code=checkout_info["postal_code"],
-        phone_number=checkout_info["phone_number"],
-        payment_method="card/upi",
-        paid=True,
-        razorpay_order_id=rp_order_id,
-        payment_id=rp_payment_id,
-    )
+    body = request.body.decode("utf-8")
+    signature = request.headers.get("X-Razorpay-Signature", "")
 
-    items_for_email = []
-    admin_rows = []
+    try:
+        razorpay_client.utility.verify_webhook_signature(body, signature, secret)
+    except Exception:
+        return JsonResponse({"success": False, "error": "Invalid signature"}, status=400)
 
-    # BUY NOW
-    if buy_now:
-        product = get_object_or_404(Product, id=buy_now["product_id"])
-        variant = None
-        if buy_now.get("variant_id"):
-            variant = ProductVariant.objects.filter(id=buy_now["variant_id"]).first()
-
-        price = variant.display_price() if variant else product.price
-        OrderItem.objects.create(order=order, product=product, variant=variant, quantity=1, price=price)
-        if variant:
-            variant.stock -= 1
-            variant.save()
-        else:
-            product.available_stock -= 1
-            product.save()
-
-        items_for_email.append(f"- {product.name} (x1) — ₹{price}")
-        admin_rows.append(f"<tr><td>{product.name}</td><td>1</td><td>₹{price}</td></tr>")
+    try:
+        event = json.loads(body)
+    except ValueError:
+        return JsonResponse({"success": False, "error": "Invalid payload"}, status=400)
 
-        request.session.pop("buy_now", None)
+    order, created = handle_razorpay_event(event)
 
-    else:
-        for item in cart_items:
-            p = item.product
-            v = item.variant
-            price = v.display_price() if v else p.price
+    if created:
+        send_prepaid_order_emails(request, order)
 
-            OrderItem.objects.create(order=order, product=p, variant=v, quantity=item.quantity, price=price)
-            if v:
-                v.stock -= item.quantity
-                v.save()
-            else:
-                p.available_stock -= item.quantity
-                p.save()
+    return JsonResponse({"success": True})
 
-            items_for_email.append(f"- {p.name} (x{item.quantity}) — ₹{price}")
-            admin_rows.append(f"<tr><td>{p.name}</td><td>{item.quantity}</td><td>₹{price}</td></tr>")
 
-        cart_items.delete()
+def send_prepaid_order_emails(request, order):
+    """Admin, customer and (single) delivery boy emails for a paid order."""
+    items_for_email = []
+    admin_rows = []
+    total = order.total
+
+    for it in order.items.select_related("product"):
+        items_for_email.append(f"- {it.product.name} (x{it.quantity}) — ₹{it.price}")
+        admin_rows.append(f"<tr><td>{it.product.name}</td><td>{it.quantity}</td><td>₹{it.price}</td></tr>")
 
     # SEND EMAILS — your exact original logic
     from store.email_service import send_brevo_email
@@ -306,10 +353,10 @@ def payment_verify_view(request):
         try:
             send_brevo_email(to=admin_email, subject="New", html_content=admin_html, text_content="New order received.")
 
-        except Exception as e:
-            print("Brevo admin email error:", e)
+        except Exception:
+            logger.exception("Admin email failed for order %s", order.id)
     else:
-        print("ADMIN_EMAIL not set – skipping admin email")
+        logger.warning("ADMIN_EMAIL not set - skipping admin email")
 
     customer_items_html = "".join(
         [f"<li>{line}</li>" for line in items_for_email]
@@ -351,14 +398,14 @@ def payment_verify_view(request):
         </div>
     </div>
     """
-    customer_email = request.user.email
+    customer_email = order.user.email
     if customer_email:
         try:
             send_brevo_email(to=customer_email, subject=f"Order #{order.id} Successful!", html_content=customer_html, text_content="Order placed successfully.")
-        except Exception as e:
-            print("Brevo customer email error:", e)
+        except Exception:
+            logger.exception("Customer email failed for order %s", order.id)
     else:
-        print("Customer email missing – skipping customer email send")
+        logger.warning("Order %s has no customer email - skipping customer email", order.id)
 
 
     delivery_boys = CustomUser.objects.filter(is_delivery_boy=True)
@@ -408,10 +455,9 @@ def payment_verify_view(request):
                     html_content=html_content,
                     text_content=text_content
                 )
-            except Exception as e:
-                print("Delivery boy email error:", e)
+            except Exception:
+                logger.exception("Delivery email failed for order %s", order.id)
 
-    return JsonResponse({"success": True})
 
 
 
@@ -422,73 +468,73 @@ from django.contrib.auth.decorators import login_required
 from django.urls import reverse
 from store.models import Product, ProductVariant, CartItem, Order, OrderItem
 from django.conf import settings
+from django.db import transaction
+
+
+def _checkout_token(request):
+    """Token minted at checkout; the payment page echoes it back as ?token=."""
+    return request.GET.get("token") or (request.session.get("checkout_info") or {}).get("token")
 
 
 @login_required
+@idempotent(_checkout_token, scope="cod")
 def cod_order_view(request):
     checkout_info = request.session.get("checkout_info")
     if not checkout_info:
         messages.error(request, "Missing checkout data")
         return redirect("checkout")
 
-    buy_now = request.session.get("buy_now")
-    cart_items = CartItem.objects.filter(user=request.user)
-    total = checkout_info["total"]
-
-    # Create COD order
-    order = Order.objects.create(
-        user=request.user,
-        full_name=checkout_info["full_name"],
-        address=checkout_info["address"],
-        city=checkout_info["city"],
-        postal_code=checkout_info["postal_code"],
-        phone_number=checkout_info["phone_number"],
-        payment_method="COD",
-        paid=False
-    )
-
-    items_for_email = []
-
-    if buy_now:
-        product = get_object_or_404(Product, id=buy_now["product_id"])
-        variant = None
-        if buy_now.get("variant_id"):
-            variant = ProductVariant.objects.filter(id=buy_now["variant_id"]).first()
-
-        price = variant.display_price() if variant else product.price
-
-        OrderItem.objects.create(order=order, product=product, variant=variant, quantity=1, price=price)
-
-        # Stock update
-        if variant:
-            variant.stock -= 1
-            variant.save()
-        else:
-            product.available_stock -= 1
-            product.save()
-
-        items_for_email.append(f"- {product.name} (x1) — ₹{price}")
-
-        request.session.pop("buy_now", None)
+    if not checkout_info.get("cod_allowed", True):
+        messages.error(request, "Cash on Delivery is not available for this pincode.")
+        return redirect("payment")
 
-    else:
-        for item in cart_items:
+    buy_now = request.session.get("buy_now")
+    snapshot = cart_service.get_snapshot(request.user, buy_now)
+    if not snapshot:
+        messages.error(request, "Your cart is empty.")
+        return redirect("home")
+
+    # Create COD order (order, lines, stock and cart go through together)
+    with transaction.atomic():
+        order = Order.objects.create(
+            user=request.user,
+            full_name=checkout_info["full_name"],
+            address=checkout_info["address"],
+            city=checkout_info["city"],
+            postal_code=checkout_info["postal_code"],
+            phone_number=checkout_info["phone_number"],
+            delivery_fee=Decimal(str(checkout_info.get("delivery_fee", 0))),
+            payment_method="COD",
+            paid=False
+        )
+
+        items_for_email = []
+        order_items = []
+
+        for item in snapshot:
             p = item.product
             v = item.variant
-            price = v.display_price() if v else p.price
+            price = item.price
 
-            OrderItem.objects.create(order=order, product=p, variant=v, quantity=item.quantity, price=price)
+            order_items.append(OrderItem(order=order, product=p, variant=v, quantity=item.quantity, price=price))
 
-            if v:
-                v.stock -= item.quantity
-                v.save()
-            else:
-                p.available_stock -= item.quantity
-                p.save()
+            # Stock update
+            take_stock(p, v, item.quantity)
 
             items_for_email.append(f"- {p.name} (x{item.quantity}) — ₹{price}")
 
-        cart_items.delete()
+        if not snapshot.is_buy_now:
+            CartItem.objects.filter(id__in=[item.id for item in snapshot]).delete()
+            transaction.on_commit(lambda: badges.invalidate(request))
+
+        # One insert for all lines, then store subtotal/item_count/total
+        OrderItem.objects.bulk_create(order_items)
+        order.recalculate_totals()
+        assignment.assign_new_order(order)
+
+    if snapshot.is_buy_now:
+        request.session.pop("buy_now", None)
+    total = order.total
 
     # ======================
     # ✉ SEND EMAIL — Amazon Style
@@ -607,8 +653,8 @@ def cod_order_view(request):
                     html_content=html_content,
                     text_content=text_content
                 )
-            except Exception as e:
-                print("Delivery boy email error:", e)
+            except Exception:
+                logger.exception("Delivery email failed for order %s", order.id)
 
 
     if customer_email:
@@ -619,8 +665,8 @@ def cod_order_view(request):
                 html_content=customer_html,
                 text_content=f"Your order #{order.id} has been successfully placed!"
             )
-        except Exception as e:
-            print("Customer email error:", e)
+        except Exception:
+            logger.exception("Customer email failed for order %s", order.id)
 
     # Admin email notification
     if admin_email:
@@ -631,8 +677,8 @@ def cod_order_view(request):
                 html_content=f"<p>COD Order #{order.id} placed by {order.full_name}</p>",
                 text_content="A new order has been received in Devki Mart."
             )
-        except Exception as e:
-            print("Admin email error:", e)
+        except Exception:
+            logger.exception("Admin email failed for order %s", order.id)
 
     # Clear only checkout session
     request.session.pop("checkout_info", None)
@@ -1,9 +1,17 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.conf import settings
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import etag
+from asgiref.sync import sync_to_async
+import functools
+
+from django.db.models import Prefetch
+
+from store import delivery_stats, order_feed, route_sheets
 
 from store.models import (
     CustomUser,
@@ -11,7 +19,9 @@ from store.models import (
     ProductVariant,
     Order,
     OrderItem,
+    OrderStatusEvent,
     DeliveryProfile,
+    ProductImage,
 )
 
 # ======================================================
@@ -82,14 +92,8 @@ def delivery_verify(request):
 
 @secure_delivery
 def delivery_dashboard(request):
-    delivery_count = CustomUser.objects.filter(is_delivery_boy=True).count()
-
-    # Case 1: Only one delivery boy → show ALL orders
-    if delivery_count == 1:
-        orders = Order.objects.all().order_by("-created_at")
-    else:
-        # Case 2: Multiple delivery boys → show assigned orders
-        orders = Order.objects.filter(assigned_to=request.user).order_by("-created_at")
+    # One delivery boy → ALL orders, several → only assigned ones (cached staff count)
+    orders = delivery_stats.orders_for(request.user).order_by("-created_at")
 
     # Filters
     name_q = request.GET.get("name") or ""
@@ -101,25 +105,74 @@ def delivery_dashboard(request):
     if date_q:
         orders = orders.filter(created_at__date=date_q)
 
+    # All counters + the paginator total in one aggregate
+    counters = delivery_stats.dashboard_counters(orders)
+
     # Pagination
     from django.core.paginator import Paginator
-    paginator = Paginator(orders, 5)
+    paginator = Paginator(orders.select_related("user"), 5)
+    paginator.count = counters["total"]      # skip the paginator's own COUNT(*)
     page_number = request.GET.get("page")
     page_obj = paginator.get_page(page_number)
 
-    today = timezone.now().date()
-
     return render(request, "delievery_dashboard.html", {
         "page_obj": page_obj,
         "orders": page_obj,
         "name_q": name_q,
         "date_q": date_q,
-        "today_deliveries": orders.filter(created_at__date=today).count(),
-        "delivered_today": orders.filter(created_at__date=today, order_status="Delivered").count(),
-        "pending_deliveries": orders.filter(order_status="Pending pickup").count(),
+        "today_deliveries": counters["today"],
+        "delivered_today": counters["delivered_today"],
+        "pending_deliveries": counters["pending"],
+        # live updates resume from the newest status event at render time
+        "status_cursor": OrderStatusEvent.objects.order_by("-id").values_list("id", flat=True).first() or 0,
+        "live_stream": order_feed.streams_enabled(),
+    })
+
+
+# ======================================================
+# LIVE UPDATES (dashboard)
+# ======================================================
+def _delivery_changes_etag(request):
+    channel = order_feed.delivery_channel(delivery_stats.scope(request.user))
+    return f"{order_feed.version(channel)}-{order_feed.parse_cursor(request.GET.get('since'))}"
+
+
+@secure_delivery
+@etag(_delivery_changes_etag)
+def delivery_changes(request):
+    """Polling fallback for the dashboard stream; If-None-Match gets a 304 while nothing changed."""
+    since = order_feed.parse_cursor(request.GET.get("since"))
+    events = [e.as_dict() for e in order_feed.delivery_events(delivery_stats.scope(request.user), since)]
+
+    return JsonResponse({
+        "events": events,
+        "cursor": events[-1]["id"] if events else since,
     })
 
 
+async def delivery_stream(request):
+    """
+    Server-Sent Events for the delivery dashboard: status changes on the
+    rider's orders, plus "refresh" when orders are assigned or placed.
+    Same checks as secure_delivery, done without blocking the event loop.
+    """
+    user = await request.auser()
+    if not user.is_authenticated or not (user.is_delivery_boy or user.is_staff):
+        return HttpResponseForbidden("Not allowed")
+    if request.COOKIES.get("delivery_tab_verified") != "yes" or not await request.session.aget("delivery_verified", False):
+        return HttpResponseForbidden("Delivery panel not verified")
+    if not order_feed.streams_enabled():
+        return HttpResponse(status=204)      # EventSource stops; the page polls instead
+
+    scope = await sync_to_async(delivery_stats.scope)(user)
+    cursor = order_feed.parse_cursor(request.headers.get("Last-Event-ID") or request.GET.get("since"))
+    return order_feed.sse_response(order_feed.stream(
+        order_feed.delivery_channel(scope),
+        functools.partial(order_feed.delivery_events, scope),
+        cursor,
+    ))
+
+
 # ======================================================
 # ORDER DETAILS
 # ======================================================
@@ -127,14 +180,12 @@ def delivery_dashboard(request):
 @secure_delivery
 def delivery_order_detail(request, order_id):
 
-    delivery_count = CustomUser.objects.filter(is_delivery_boy=True).count()
+    order = get_object_or_404(delivery_stats.orders_for(request.user), id=order_id)
 
-    if delivery_count == 1:
-        order = get_object_or_404(Order, id=order_id)
-    else:
-        order = get_object_or_404(Order, id=order_id, assigned_to=request.user)
-
-    raw_items = order.items.select_related("product", "variant")
+    # items + products + variants, then all their images: two queries in total
+    raw_items = order.items.select_related("product", "variant").prefetch_related(
+        Prefetch("product__images", queryset=ProductImage.objects.only("id", "product_id", "image", "order"))
+    )
 
     items_for_template = []
 
@@ -142,25 +193,8 @@ def delivery_order_detail(request, order_id):
         product = it.product
         variant = it.variant
 
-        # 🔥 Final Cloudinary-Safe Image Logic
-        if variant:   # Try product primary image first
-            if product.main_image:
-                image_url = product.main_image.url
-            elif product.images.exists():
-                image_url = product.images.first().image.url
-            else:
-                image_url = "/static/images/no-image.png"
-
-        else:
-            if product.main_image:
-                image_url = product.main_image.url
-            elif product.images.exists():
-                image_url = product.images.first().image.url
-            else:
-                image_url = "/static/images/no-image.png"
-
-        # Debug log
-        
+        # 🔥 Cloudinary-safe image: main image, else first gallery image (prefetched)
+        image_url = product.get_primary_image_url() or route_sheets.NO_IMAGE
 
         items_for_template.append({
             "product_obj": product,
@@ -177,6 +211,32 @@ def delivery_order_detail(request, order_id):
     })
 
 
+# ======================================================
+# ROUTE SHEET (all open orders, grouped by pincode)
+# ======================================================
+def _route_sheet_etag(request, *args, **kwargs):
+    return route_sheets.etag(request.user)
+
+
+@secure_delivery
+@cache_control(private=True, max_age=0, must_revalidate=True)
+@etag(_route_sheet_etag)
+def delivery_route_sheet(request):
+    """Printable / mobile page of every open stop; 304 while nothing on it changed."""
+    return render(request, "delievery_route_sheet.html", {"sheet": route_sheets.build(request.user)})
+
+
+@secure_delivery
+@cache_control(private=True, max_age=300, stale_if_error=86400)
+@etag(_route_sheet_etag)
+def delivery_route_manifest(request):
+    """
+    Compact JSON of the same sheet. The route page keeps the last copy in
+    localStorage, and the browser may serve it for a day when offline.
+    """
+    return JsonResponse(route_sheets.manifest(route_sheets.build(request.user)))
+
+
 # ======================================================
 # UPDATE ORDER STATUS
 # ======================================================
@@ -193,13 +253,11 @@ def delivery_update_order_status(request, order_id):
     if not new_status:
         return redirect("delivery_dashboard")
 
-    order.order_status = new_status
-    order.save()
+    order.set_status(new_status, by=request.user, source=OrderStatusEvent.SOURCE_DELIVERY)
 
-    # get business name from DB
-    from store.models import BusinessNameAndLogo
-    business = BusinessNameAndLogo.objects.first()
-    Storename = business.business_name if business else "New way online"
+    # business name (cached site settings)
+    from store.site_settings import get_site_settings
+    Storename = get_site_settings().business_name or "New way online"
 
     # Messages for customer
     messages_map = {
@@ -288,42 +346,142 @@ def delivery_update_payment_status(request, order_id):
 # ======================================================
 # DELIVERY HISTORY
 # ======================================================
-from django.db.models import Q
+from datetime import date, datetime, time, timedelta
 
-@secure_delivery
-def delivery_order_history(request):
+from django.db.models import Count, Q, Sum
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from store import order_history
 
-    # Base queryset: Only delivered orders for this delivery boy
-    orders = Order.objects.filter(
-        assigned_to=request.user,
-        order_status="Delivered"
-    ).order_by("-created_at")
+HISTORY_PAGE_SIZE = 25
+HISTORY_CSV_CHUNK = 2000
+
+
+def _day_start(value):
+    try:
+        return timezone.make_aware(datetime.combine(date.fromisoformat(value), time.min))
+    except ValueError:
+        return None
+
+
+def _history_orders(request):
+    """The rider's delivered orders with the request's filters; returns (queryset, filters)."""
+    orders = Order.objects.filter(assigned_to=request.user, order_status="Delivered")
 
-    # ---- FILTERS ----
     q = request.GET.get("q", "").strip()     # name or email
-    date_q = request.GET.get("date", "").strip()  # date
+    date_from = request.GET.get("from", "").strip() or request.GET.get("date", "").strip()
+    date_to = request.GET.get("to", "").strip() or request.GET.get("date", "").strip()
 
     if q:
-        orders = orders.filter(
-            Q(full_name__icontains=q) |
-            Q(user__email__icontains=q)
-        )
+        orders = orders.filter(Q(full_name__icontains=q) | Q(user__email__icontains=q))
 
+    # created_at ranges (not __date) so the (assigned_to, created_at) index is used;
+    # unparseable dates are ignored
+    start, end = _day_start(date_from), _day_start(date_to)
+    if start:
+        orders = orders.filter(created_at__gte=start)
+    if end:
+        orders = orders.filter(created_at__lt=end + timedelta(days=1))
 
-    if date_q:
-        orders = orders.filter(created_at__date=date_q)
+    return orders, {"q": q, "date_from": date_from, "date_to": date_to}
 
-    # ---- TOTAL REVENUE ----
-    total_revenue = sum(order.total_amount() for order in orders if order.paid)
+
+@secure_delivery
+def delivery_order_history(request):
+    orders, filters = _history_orders(request)
+
+    if request.GET.get("format") == "csv":
+        return _history_csv(request, orders)
+
+    # ---- TOTALS (one aggregate over the filtered history) ----
+    totals = orders.aggregate(
+        delivered=Count("id"),
+        revenue=Sum("total", filter=Q(paid=True)),
+    )
+
+    # ---- PAGE (keyset on created_at, id — newest first) ----
+    page = orders.only("id", "full_name", "payment_method", "paid", "total", "created_at").order_by("-created_at", "-id")
+    position = order_history.decode_cursor(request.GET.get("after", ""))
+    if position:
+        created_at, order_id = position
+        page = page.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=order_id))
+    page = list(page[:HISTORY_PAGE_SIZE + 1])
+    next_cursor = order_history.encode_cursor(page[HISTORY_PAGE_SIZE - 1]) if len(page) > HISTORY_PAGE_SIZE else None
 
     return render(request, "delievery_history_partial.html", {
-        "orders": orders,
-        "total_revenue": total_revenue,
-        "q": q,
-        "date_q": date_q,
+        "orders": page[:HISTORY_PAGE_SIZE],
+        "next_cursor": next_cursor,
+        "is_first_page": position is None,
+        "total_revenue": totals["revenue"] or 0,
+        "delivered_count": totals["delivered"],
+        **filters,
     })
 
 
+class _Echo:
+    """csv.writer target that hands each row straight back."""
+
+    def write(self, value):
+        return value
+
+
+def _history_csv(request, orders):
+    """
+    Streamed CSV of the filtered history, fetched HISTORY_CSV_CHUNK rows at
+    a time (keyset on created_at, id like the page view). Under ASGI the
+    body has to be an async iterator - Django would otherwise collect a
+    sync one into a list first - so each chunk is fetched via sync_to_async.
+    """
+    import csv
+
+    rows = (
+        orders.order_by("-created_at", "-id")
+        .values_list("id", "created_at", "full_name", "user__email", "city", "postal_code",
+                     "payment_method", "paid", "total")
+    )
+    writer = csv.writer(_Echo())
+    header = ["Order ID", "Date", "Customer", "Email", "City", "Pincode", "Payment", "Paid", "Total"]
+
+    def fetch_after(last):
+        chunk = rows
+        if last is not None:
+            order_id, created_at = last[0], last[1]
+            chunk = chunk.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=order_id))
+        return list(chunk[:HISTORY_CSV_CHUNK])
+
+    def csv_rows(chunk):
+        return "".join(
+            writer.writerow([
+                order_id, timezone.localtime(created_at).strftime("%Y-%m-%d %H:%M"),
+                name, email, city, pincode, method, "Yes" if paid else "No", total,
+            ])
+            for order_id, created_at, name, email, city, pincode, method, paid, total in chunk
+        )
+
+    if isinstance(request, ASGIRequest):
+        async def generate():
+            yield writer.writerow(header)
+            chunk = await sync_to_async(fetch_after)(None)
+            while chunk:
+                yield csv_rows(chunk)
+                if len(chunk) < HISTORY_CSV_CHUNK:
+                    break
+                chunk = await sync_to_async(fetch_after)(chunk[-1])
+    else:
+        def generate():
+            yield writer.writerow(header)
+            chunk = fetch_after(None)
+            while chunk:
+                yield csv_rows(chunk)
+                if len(chunk) < HISTORY_CSV_CHUNK:
+                    break
+                chunk = fetch_after(chunk[-1])
+
+    response = StreamingHttpResponse(generate(), content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="delivery-history-{timezone.localdate():%Y%m%d}.csv"'
+    return response
+
+
 
 # ======================================================
 # DELIVERY PROFILE
@@ -1,8 +1,10 @@
 # views/home.py
 from django.shortcuts import render
-from django.db.models import Q, Prefetch, Avg
+from django.db.models import Q, Prefetch, Avg, Count, F, Window
+from django.db.models.functions import Coalesce, RowNumber
 from django.utils import timezone
 from django.conf import settings
+from store.site_settings import get_business
 
 # Import models with graceful fallback — supports both new dynamic system
 # (Category, Product, ProductImage, ProductVariant) and legacy models
@@ -117,7 +119,7 @@ def home(request):
 
     PER_CATEGORY_LIMIT = getattr(settings, "HOME_PRODUCTS_PER_CATEGORY", 500)
 
-    business_info = BusinessNameAndLogo.objects.first()
+    business_info = get_business()
 
     products_by_category = {}
     categories_list = []
@@ -130,9 +132,10 @@ def home(request):
         # --- FIX AVG RATING ERROR ---
         products_qs = Product.objects.all().select_related("category").prefetch_related("images")
 
-        # Correct avg rating annotation
+        # Correct avg rating annotation (+ review count for the cards)
         products_qs = products_qs.annotate(
-            avg_rating=Avg("reviews__rating")
+            avg_rating=Avg("reviews__rating"),
+            num_reviews=Count("reviews"),
         )
 
         # Search filter
@@ -151,37 +154,54 @@ def home(request):
         # ------------------------------------------
 
         # --- FIX PARENT–CHILD CATEGORY GROUPING ---
-        parent_categories = Category.objects.filter(parent__isnull=True).order_by("id")
-
-        parent_categories_list = []      # For TOP NAV only
-        category_sections = []           # ONLY parents
-        products_by_category = {}
-
-        for parent in parent_categories:
-
-            parent_categories_list.append(parent)
-            category_sections.append(parent)
-
-            # Collect child category IDs + SLUGS
-            child_ids = list(parent.children.values_list("id", flat=True))
-            child_slugs = list(parent.children.values_list("slug", flat=True))
-
-            # ---------------------------------------------------
-            # 🔥 FIX: Subcategory filtering MUST only apply here
-            # ---------------------------------------------------
-            if category_filter and category_filter in child_slugs:
-                # User clicked a subcategory → show only that child category
-                parent_products = products_qs.filter(
-                    category__slug=category_filter
-                ).order_by("-avg_rating", "-created_at")[:PER_CATEGORY_LIMIT]
-            else:
-                # Default → show parent + child products
-                parent_products = products_qs.filter(
-                    Q(category=parent) | Q(category_id__in=child_ids)
-                ).order_by("-avg_rating", "-created_at")[:PER_CATEGORY_LIMIT]
-
-            products_by_category[parent.slug] = parent_products
+        parent_categories = list(
+            Category.objects.filter(parent__isnull=True).order_by("id").prefetch_related("children")
+        )
+        parent_ids = [parent.id for parent in parent_categories]
+
+        parent_categories_list = list(parent_categories)     # For TOP NAV only
+        category_sections = list(parent_categories)          # ONLY parents
+        products_by_category = {parent.slug: [] for parent in parent_categories}
+
+        # ---------------------------------------------------
+        # 🔥 FIX: Subcategory filtering MUST only apply to its own parent
+        # ---------------------------------------------------
+        in_sections = Q(category_id__in=parent_ids) | Q(category__parent_id__in=parent_ids)
+        filtered_parent = next(
+            (
+                parent for parent in parent_categories
+                if category_filter and any(child.slug == category_filter for child in parent.children.all())
+            ),
+            None,
+        )
+        if filtered_parent:
+            # User clicked a subcategory → that section shows only the child category
+            in_sections = (
+                in_sections
+                & ~Q(category_id=filtered_parent.id)
+                & ~Q(category__parent_id=filtered_parent.id)
+            ) | Q(category__slug=category_filter)
+
+        # One query for every section: each product belongs to its parent
+        # category's section, ranked (best rated, newest) within it
+        section = Coalesce("category__parent_id", "category_id")
+        ranked_products = (
+            products_qs.filter(in_sections)
+            .annotate(
+                section_id=section,
+                section_rank=Window(
+                    RowNumber(),
+                    partition_by=[section],
+                    order_by=[F("avg_rating").desc(), F("created_at").desc()],
+                ),
+            )
+            .filter(section_rank__lte=PER_CATEGORY_LIMIT)
+            .order_by("section_id", "section_rank")
+        )
 
+        slug_by_id = {parent.id: parent.slug for parent in parent_categories}
+        for product in ranked_products:
+            products_by_category[slug_by_id[product.section_id]].append(product)
 
             # Latest 6 products (newest first)
         latest_products = (
@@ -5,7 +5,7 @@ from django.conf import settings
 from django.contrib.auth import login, get_user_model, logout
 from django.db.models import Avg, Count
 from django.views.decorators.http import require_POST
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from django.contrib.auth.decorators import login_required, user_passes_test
 import random, json
 
@@ -14,13 +14,15 @@ from store.models import (
     CustomUser,BusinessNameAndLogo
 )
 from store.forms import ReviewForm
+from store.site_settings import get_business
+from store import badges, external, query_budget
 
 User = get_user_model()
 
 
 
 def contact(request):
-    business = BusinessNameAndLogo.objects.first()
+    business = get_business()
     if request.method == "POST":
         name = request.POST.get("name")
         email = request.POST.get("email")
@@ -50,4 +52,34 @@ def contact(request):
 
     return render(request, "contact.html", {
         "business": business
-    })
\ No newline at end of file
+    })
+
+# ===================================================================
+# 🔢 NAV BADGE COUNTS (AJAX)
+# ===================================================================
+def badge_counts(request):
+    """Cart / wishlist counts for client-side badge refresh."""
+    return JsonResponse(badges.get_counts(request))
+
+
+# ===================================================================
+# 📈 METRICS (Prometheus text format)
+# ===================================================================
+def metrics_view(request):
+    """External-call latency / errors. Staff session or `Authorization: Bearer <METRICS_TOKEN>`."""
+    token = settings.METRICS_TOKEN
+    bearer = request.headers.get("Authorization", "")
+    if not (request.user.is_staff or (token and bearer == f"Bearer {token}")):
+        return HttpResponseForbidden("Forbidden")
+
+    return HttpResponse(external.metrics_text(), content_type="text/plain; version=0.0.4")
+
+
+def query_stats_view(request):
+    """Per-view query counts / duplicates from store.query_budget (staff only). POST ?reset=1 clears them."""
+    if not request.user.is_staff:
+        return HttpResponseForbidden("Forbidden")
+
+    if request.method == "POST" and request.GET.get("reset"):
+        query_budget.reset()
+    return JsonResponse(query_budget.stats())
@@ -1,9 +1,15 @@
 # store/views/orders.py
+import functools
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Sum, F
-from store.models import Order, OrderItem, Product, ProductVariant
+from django.http import Http404, HttpResponse, JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import etag
+from store import order_feed, order_history
+from store.models import Order, OrderItem, OrderStatusEvent, Product, ProductVariant
 
 
 # ======================================================
@@ -12,22 +18,30 @@ from store.models import Order, OrderItem, Product, ProductVariant
 @login_required
 def my_orders_view(request):
     """
-    Show all orders for the logged-in user.
-    Optimized for dynamic product system.
+    Order history, one summary card per order, keyset-paginated.
+    ?after=<cursor> gives the next page; with ?partial=1 only the cards
+    are rendered (appended by the "Load more" button).
     """
-    orders = (
-        Order.objects.filter(user=request.user)
-        .select_related("assigned_to")
-        .order_by("-created_at")
-        .prefetch_related(
-            "items",
-            "items__product",
-            "items__variant",
-            "items__product__images",
-        )
+    orders, next_cursor = order_history.summaries(request.user, cursor=request.GET.get("after"))
+
+    context = {"orders": orders, "next_cursor": next_cursor}
+    if request.GET.get("partial"):
+        return render(request, "my_orders_partial.html", context)
+    return render(request, "my_orders.html", context)
+
+
+@login_required
+def my_order_items(request, order_id):
+    """Item lines for one order - loaded when its card is expanded."""
+    order = get_object_or_404(
+        Order.objects.only("id", "user_id", "order_status"), id=order_id, user=request.user
     )
+    items = order_history.item_details(order)
+    if order.order_status == "Delivered":
+        for item in items:
+            item["review_url"] = reverse("submit_review", args=[order.id, item["product_id"]])
 
-    return render(request, "my_orders.html", {"orders": orders})
+    return JsonResponse({"order_id": order.id, "status": order.order_status, "items": items})
 
 
 # ======================================================
@@ -48,7 +62,7 @@ def track_order_view(request, order_id):
         user=request.user
     )
 
-    subtotal = sum(item.total_price() for item in order.items.all())
+    subtotal = order.subtotal
 
 
     # Expected delivery
@@ -66,17 +80,24 @@ def track_order_view(request, order_id):
     # -----------------------
     # SEND STEPS TO TEMPLATE
     # -----------------------
+    # when each status was (last) reached, from the status history
+    events = list(order.status_events.only("id", "order_id", "to_status", "created_at"))
+    reached_at = {event.to_status: event.created_at for event in events}
+
     steps = [
-    {"label": "Order Placed", "completed": True},
+    {"label": "Order Placed", "completed": True, "at": order.created_at},
 
     # Step 2: Packed (completed AFTER order leaves pending)
-    {"label": "Packed", "completed": order.order_status in ["Out for delivery", "Delivered"]},
+    {"label": "Packed", "completed": order.order_status in ["Out for delivery", "Delivered"],
+     "at": reached_at.get("Out for delivery")},
 
     # Step 3: Out for delivery
-    {"label": "Out for delivery", "completed": order.order_status in ["Out for delivery", "Delivered"]},
+    {"label": "Out for delivery", "completed": order.order_status in ["Out for delivery", "Delivered"],
+     "at": reached_at.get("Out for delivery")},
 
     # Step 4: Delivered
-    {"label": "Delivered", "completed": order.order_status == "Delivered"},
+    {"label": "Delivered", "completed": order.order_status == "Delivered",
+     "at": reached_at.get("Delivered")},
 ]
 
 
@@ -85,89 +106,96 @@ def track_order_view(request, order_id):
         "subtotal": subtotal,
         "expected_delivery": expected_delivery,
         "steps": steps,        # <<<<<<==== FIX
+        "events": events,
+        "status_cursor": events[-1].id if events else 0,
+        "live_stream": order_feed.streams_enabled(),
+    })
+
+
+def _order_changes_etag(request, order_id):
+    channel = order_feed.order_channel(order_id)
+    return f"{order_feed.version(channel)}-{order_feed.parse_cursor(request.GET.get('since'))}"
+
+
+@login_required
+@etag(_order_changes_etag)
+def order_status_changes(request, order_id):
+    """
+    Status events after ?since=<event id> for one of the user's orders.
+    Polling fallback for browsers without EventSource: send the ETag back
+    as If-None-Match and an unchanged order answers 304.
+    """
+    order = get_object_or_404(
+        Order.objects.only("id", "user_id", "order_status"), id=order_id, user=request.user
+    )
+    since = order_feed.parse_cursor(request.GET.get("since"))
+
+    events = [event.as_dict() for event in order_feed.order_events(order.id, since)]
+    return JsonResponse({
+        "order_id": order.id,
+        "status": order.order_status,
+        "events": events,
+        "cursor": events[-1]["id"] if events else since,
     })
 
 
+@login_required
+async def order_status_stream(request, order_id):
+    """Server-Sent Events for one of the user's orders (see store/order_feed.py)."""
+    user = await request.auser()
+    if not await Order.objects.filter(id=order_id, user=user).aexists():
+        raise Http404("Order not found")
+    if not order_feed.streams_enabled():
+        return HttpResponse(status=204)      # EventSource stops; the page polls instead
+
+    cursor = order_feed.parse_cursor(request.headers.get("Last-Event-ID") or request.GET.get("since"))
+    return order_feed.sse_response(order_feed.stream(
+        order_feed.order_channel(order_id),
+        functools.partial(order_feed.order_events, order_id),
+        cursor,
+    ))
+
+
 # ======================================================
 # CANCEL ORDER
 # ======================================================
 
 
 from django.conf import settings
-import razorpay
-from decouple import config
+from django.db import transaction
+from store import refund_service
 from store.email_service import send_brevo_email  # 👈 already used in your project
 
-razorpay_client = razorpay.Client(
-    auth=(
-        config("RAZORPAY_KEY_ID_TEST"),
-        config("RAZORPAY_KEY_SECRET_TEST")
-    )
-)
-
 
 @login_required
 def cancel_order(request, order_id):
-    order = get_object_or_404(Order, id=order_id, user=request.user)
+    with transaction.atomic():
+        order = get_object_or_404(
+            Order.objects.select_for_update(of=("self",)).select_related("user"),
+            id=order_id, user=request.user,
+        )
 
-    # ❌ Cannot cancel if not pending pickup
-    if order.order_status != "Pending pickup":
-        messages.error(request, "This order cannot be cancelled now.")
-        return redirect("track_order", order_id=order.id)
+        # ❌ Cannot cancel if not pending pickup
+        if order.order_status != "Pending pickup":
+            messages.error(request, "This order cannot be cancelled now.")
+            return redirect("track_order", order_id=order.id)
 
-    # 🔥 Online Payment Refund
-    if order.paid and order.payment_method != "COD":
-        try:
-            refund = razorpay_client.payment.refund(order.payment_id, {
-                "amount": int(order.total_amount() * 100),  # paise
-                "speed": "normal"
-            })
-
-            order.refund_id = refund.get("id")
-            order.refunded = True
-
-            # 📩 Cancellation & Refund Email (Customer)
-            customer_email = order.user.email
-            if customer_email:
-                html_msg = f"""
-                <div style='font-family:Arial;padding:20px;background:#fff7e6;'>
-                    <h2 style='color:#d9534f;'>Order Cancelled — #{order.id}</h2>
-                    <p>Hello <strong>{order.full_name}</strong>,</p>
-                    <p>Your prepaid order has been successfully cancelled.</p>
-                    <p>Refund of <strong>₹{order.total_amount()}</strong> has been initiated.</p>
-                    <p>It will be credited back to your original payment method within
-                    <strong>2–7 working days</strong> by Razorpay.</p>
-                    <p>Thank you for shopping with us!</p>
-                </div>
-                """
-
-                text_msg = (
-                    f"Order #{order.id} cancelled.\n"
-                    f"Refund ₹{order.total_amount()} initiated and will be credited within 2–7 working days."
-                )
-
-                send_brevo_email(
-                    to=customer_email,
-                    subject=f"Order Cancelled — #{order.id}",
-                    html_content=html_msg,
-                    text_content=text_msg,
-                )
+        # 🔥 Online Payment Refund — queued, `manage.py process_refunds` submits it
+        is_prepaid = order.paid and order.payment_method != "COD"
+        if is_prepaid:
+            refund_service.queue_refund(order)
 
-        except Exception as e:
-            print("Refund Error:", e)
-            messages.error(request, "Refund failed! Contact support.")
-            return redirect("track_order", order_id=order.id)
+        # 💾 Now update order status (+ status history row, same transaction)
+        order.set_status("Cancelled", by=request.user, source=OrderStatusEvent.SOURCE_CUSTOMER)
 
-    # 💾 Now update order status
-    order.order_status = "Cancelled"
-    order.save()
+    total = order.total
 
     # 📩 NEW: Cancellation Email to Admin (for ALL cancellations: COD + Online)
     admin_email = getattr(settings, "ADMIN_EMAIL", None)
     if admin_email:
-        if order.paid and order.payment_method != "COD":
-            refund_line_html = f"<p>Refund of <strong>₹{order.total_amount()}</strong> has been initiated via Razorpay.</p>"
-            refund_line_text = f"Refund ₹{order.total_amount()} has been initiated via Razorpay."
+        if is_prepaid:
+            refund_line_html = f"<p>Refund of <strong>₹{total}</strong> has been queued via Razorpay.</p>"
+            refund_line_text = f"Refund ₹{total} has been queued via Razorpay."
         else:
             refund_line_html = "<p>This was a Cash On Delivery order. No refund is required.</p>"
             refund_line_text = "COD order cancelled. No refund required."
@@ -202,5 +230,8 @@ def cancel_order(request, order_id):
         except Exception as e:
             print("Admin cancel email error:", e)
 
-    messages.success(request, "Order cancelled successfully.")
+    if is_prepaid:
+        messages.success(request, f"Order cancelled successfully. Your refund of ₹{total} will be initiated shortly.")
+    else:
+        messages.success(request, "Order cancelled successfully.")
     return redirect("track_order", order_id=order.id)
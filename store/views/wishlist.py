@@ -4,6 +4,7 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 
+from store import badges
 from store.models import Product, WishlistItem
 
 
@@ -26,6 +27,7 @@ def add_to_wishlist(request, product_id):
             user=request.user,
             product=product
         )
+        badges.invalidate(request)
         messages.success(request, "Added to wishlist ❤️")
 
     return redirect("view_wishlist")
@@ -36,8 +38,8 @@ def add_to_wishlist(request, product_id):
 # ===================================================================
 @login_required
 def view_wishlist(request):
-    items = WishlistItem.objects.filter(user=request.user).select_related("product")
-    count = items.count()
+    items = list(WishlistItem.objects.filter(user=request.user).select_related("product"))
+    count = len(items)
 
     return render(request, "wishlist.html", {
         "items": items,
@@ -51,5 +53,6 @@ def view_wishlist(request):
 @login_required
 def remove_from_wishlist(request, item_id):
     WishlistItem.objects.filter(id=item_id, user=request.user).delete()
+    badges.invalidate(request)
     messages.success(request, "Removed from wishlist.")
     return redirect("view_wishlist")